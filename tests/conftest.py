@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# text_to_vois — одиночный скрипт в корне репозитория, не пакет
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+RATE = 8000  # Окно 80 сэмплов, запас у края 240, затухание 40
+
+
+def _speech(before, loud, after, level=0.5):
+    return np.concatenate([np.zeros(before), np.full(loud, level), np.zeros(after)]).astype(np.float32)
+
+
+def test_trim_keeps_padding_around_speech():
+    audio = tts.trim_silence(_speech(8000, 800, 8000), RATE)
+    pad = RATE * tts.TRIM_PAD_MS // 1000
+    assert len(audio) == 800 + 2 * pad
+    assert audio[0] == 0 and audio[-1] == 0
+    assert np.all(audio[pad + 40:pad + 760] == np.float32(0.5))  # Середина не тронута затуханием
+
+
+def test_trim_fades_edges_of_speech_without_silence():
+    audio = tts.trim_silence(_speech(0, 800, 0), RATE)
+    assert len(audio) == 800
+    assert audio[0] == 0 and audio[-1] == 0 and audio[400] == np.float32(0.5)
+
+
+@pytest.mark.parametrize("audio", [
+    np.zeros(RATE, dtype=np.float32),
+    np.full(RATE, 1e-4, dtype=np.float32),  # -80 dBFS — тише порога
+])
+def test_all_silent_chunk_trimmed_to_zero(audio):
+    assert len(tts.trim_silence(audio, RATE)) == 0
+
+
+def test_chunk_shorter_than_frame_is_kept():
+    audio = np.zeros(10, dtype=np.float32)
+    assert len(tts.trim_silence(audio, RATE)) == 10
+
+
+def test_prepare_segment_without_trim(monkeypatch):
+    monkeypatch.setattr(tts, 'TRIM_SILENCE', False)
+    assert len(tts.prepare_segment(np.zeros(RATE), RATE)) == RATE
+
+
+@pytest.mark.parametrize("text, paragraph_end, expected", [
+    ("Конец предложения.", False, tts.PAUSE_SENTENCE_MS),
+    ("Вопрос?", False, tts.PAUSE_SENTENCE_MS),
+    ("Многоточие…", False, tts.PAUSE_SENTENCE_MS),
+    ("Длинное предложение разрезано,", False, tts.PAUSE_COMMA_MS),
+    ("Перед тире —", False, tts.PAUSE_COMMA_MS),
+    ("Без знака", False, 0),
+    ("Без знака", True, tts.PAUSE_PARAGRAPH_MS),
+    ("Конец абзаца.", True, tts.PAUSE_PARAGRAPH_MS),
+])
+def test_pause_after(text, paragraph_end, expected):
+    assert tts.pause_after(text, paragraph_end) == expected
+
+
+def test_assemble_places_pauses_between_segments():
+    segments = [np.full(100, 1.0, dtype=np.float32), np.zeros(0, dtype=np.float32),
+                np.full(50, 2.0, dtype=np.float32)]
+    audio = tts.assemble_audio(segments, [10, 5, 1000], RATE)  # После последнего паузы нет
+    assert len(audio) == 100 + 80 + 40 + 50
+    assert np.all(audio[:100] == 1.0)
+    assert np.all(audio[100:220] == 0.0)
+    assert np.all(audio[220:] == 2.0)
+
+
+def test_assemble_empty():
+    assert len(tts.assemble_audio([], [], RATE)) == 0
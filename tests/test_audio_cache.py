@@ -0,0 +1,51 @@
+import pytest
+
+import text_to_vois as tts
+
+
+@pytest.mark.parametrize("first, second, shared", [
+    ('baseline', 'baseline', True),
+    ('baseline', 'threads', True),   # Потоки и inference_mode звук не меняют
+    ('baseline', 'int8', False),
+    ('baseline', 'compile', False),
+    ('int8', 'compile', False),
+])
+def test_key_depends_on_audio_changing_profile(tmp_path, first, second, shared):
+    a = tts.AudioCache("model", tmp_path, profile=first)
+    b = tts.AudioCache("model", tmp_path, profile=second)
+    assert (a.key("Привет.", 'xenia', 24000) == b.key("Привет.", 'xenia', 24000)) is shared
+
+
+def test_key_follows_current_profile(tmp_path, monkeypatch):
+    baseline = tts.AudioCache("model", tmp_path).key("Привет.", 'xenia', 24000)
+    monkeypatch.setattr(tts, 'INFERENCE_PROFILE', 'int8')
+    assert tts.AudioCache("model", tmp_path).key("Привет.", 'xenia', 24000) != baseline
+
+
+def _entry(cache_dir, name, size, mtime):
+    path = cache_dir / name[:2] / f"{name}.wav"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    tts.os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_size_is_persisted_instead_of_rescanned(tmp_path, monkeypatch):
+    _entry(tmp_path, "aa1", 100, 1)
+    _entry(tmp_path, "bb2", 50, 2)
+    assert tts.AudioCache("model", tmp_path).total_bytes == 150
+
+    def glob(self, pattern):
+        raise AssertionError("кэш не должен обходиться заново")
+
+    monkeypatch.setattr(tts.Path, 'glob', glob)
+    assert tts.AudioCache("model", tmp_path).total_bytes == 150
+
+
+def test_evict_removes_oldest_and_updates_persisted_size(tmp_path):
+    old = _entry(tmp_path, "aa1", 100, 1)
+    new = _entry(tmp_path, "bb2", 100, 2)
+    cache = tts.AudioCache("model", tmp_path, max_bytes=150)
+    cache.evict()
+    assert not old.exists() and new.exists()
+    assert tts.AudioCache("model", tmp_path).total_bytes == 100
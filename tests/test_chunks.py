@@ -0,0 +1,46 @@
+import pytest
+
+import text_to_vois as tts
+
+
+@pytest.mark.parametrize("fragments, target, expected", [
+    # Целые предложения склеиваются, пока чанк не длиннее target
+    (["Раз.", "Два.", "Три."], 9, ["Раз. Два.", "Три."]),
+    (["Раз.", "Два.", "Три."], 100, ["Раз. Два. Три."]),
+    # 0 — по одному предложению
+    (["Раз.", "Два.", "Три."], 0, ["Раз.", "Два.", "Три."]),
+    # Граница чанка — только конец предложения, обрывки по запятым склеиваются
+    (["Первая часть,", "вторая часть.", "Ещё."], 0, ["Первая часть, вторая часть.", "Ещё."]),
+    (["Хвост без точки"], 0, ["Хвост без точки"]),
+    (["", "Раз.", ""], 0, ["Раз."]),
+])
+def test_target_chars(fragments, target, expected):
+    assert tts.plan_chunks(fragments, target_chars=target, max_chars=100) == expected
+
+
+def test_target_is_capped_by_max_chars():
+    assert tts.plan_chunks(["Раз.", "Два."], target_chars=1000, max_chars=6) == ["Раз.", "Два."]
+
+
+@pytest.mark.parametrize("fragments, expected", [
+    # Предложение длиннее max_chars режется по границам фрагментов (запятые, тире)
+    (["ааа ааа,", "ббб ббб,", "вв."], ["ааа ааа,", "ббб ббб,", "вв."]),
+    (["аа,", "бб,", "вв,", "гг."], ["аа, бб,", "вв, гг."]),
+    # Фрагмент длиннее max_chars — по пробелам, слово длиннее max_chars — на куски
+    (["один два три четыре пять."], ["один два", "три четыре", "пять."]),
+    (["а" * 25 + "."], ["а" * 10, "а" * 10, "а" * 5 + "."]),
+])
+def test_sentence_longer_than_max_chars(fragments, expected):
+    chunks = tts.plan_chunks(fragments, target_chars=0, max_chars=10)
+    assert chunks == expected
+    assert all(len(chunk) <= 10 for chunk in chunks)
+
+
+def test_default_limits(monkeypatch):
+    monkeypatch.setattr(tts, 'CHUNK_TARGET_CHARS', 0)
+    assert tts.plan_chunks(["Раз.", "Два."]) == ["Раз.", "Два."]
+
+    sentence = "слово " * (tts.SILERO_MAX_CHARS // 3)
+    chunks = tts.plan_chunks([sentence.strip() + "."])
+    assert len(chunks) > 1 and all(len(chunk) <= tts.SILERO_MAX_CHARS for chunk in chunks)
+    assert " ".join(chunks) == sentence.strip() + "."
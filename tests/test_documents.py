@@ -0,0 +1,215 @@
+import random
+import struct
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import text_to_vois as tts
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+END_OF_CHAIN = 0xFFFFFFFE
+FREE = 0xFFFFFFFF
+FAT_SECTOR = 0xFFFFFFFD
+SECTOR = 512
+MINI_SECTOR = 64
+
+
+def _chain(fat, sectors):
+    for current, following in zip(sectors, sectors[1:] + [END_OF_CHAIN]):
+        fat[current] = following
+
+
+def build_ole(streams: dict, seed: int = 0) -> bytes:
+    """Составной файл OLE: потоки от 4096 байт — в секторах FAT, меньше — в мини-потоке (miniFAT).
+
+    Секторы каждой цепочки перемешаны, чтобы чтение шло по таблицам, а не подряд.
+    """
+    rng = random.Random(seed)
+    big = {name: data for name, data in streams.items() if len(data) >= 4096}
+    small = {name: data for name, data in streams.items() if len(data) < 4096}
+
+    # Мини-поток: мини-секторы маленьких потоков вперемешку
+    mini_count = sum(-(-len(data) // MINI_SECTOR) for data in small.values())
+    mini_order = list(range(mini_count))
+    rng.shuffle(mini_order)
+    minifat = [FREE] * mini_count
+    mini_stream = bytearray(mini_count * MINI_SECTOR)
+    mini_start = {}
+    for name, data in small.items():
+        count = -(-len(data) // MINI_SECTOR)
+        sectors, mini_order = mini_order[:count], mini_order[count:]
+        _chain(minifat, sectors)
+        mini_start[name] = sectors[0]
+        for k, sector in enumerate(sectors):
+            piece = data[k * MINI_SECTOR:(k + 1) * MINI_SECTOR]
+            mini_stream[sector * MINI_SECTOR:sector * MINI_SECTOR + len(piece)] = piece
+
+    names = list(streams)
+    directory = bytearray()
+
+    def entry(name, kind, left, right, child, start, size):
+        encoded = name.encode('utf-16-le') + b'\0\0'
+        return (encoded.ljust(64, b'\0') + struct.pack('<HBB', len(encoded), kind, 1)
+                + struct.pack('<3I', left, right, child) + bytes(16 + 4 + 16)
+                + struct.pack('<II', start, size) + bytes(4))
+
+    # Содержимое обычных секторов: FAT (сектор 0), каталог, miniFAT, мини-поток, большие потоки
+    payloads = {}
+    minifat_bytes = struct.pack(f'<{len(minifat)}I', *minifat)
+    payloads['<minifat>'] = minifat_bytes.ljust(-(-len(minifat_bytes) // SECTOR) * SECTOR, b'\xff')
+    payloads['<mini>'] = bytes(mini_stream)
+    payloads.update(big)
+    count = 1 + 1 + sum(-(-len(data) // SECTOR) for data in payloads.values())
+    order = list(range(2, count))
+    rng.shuffle(order)
+    fat = [FREE] * (SECTOR // 4)
+    fat[0] = FAT_SECTOR
+    fat[1] = END_OF_CHAIN  # Каталог — один сектор
+    image = {}
+    start = {}
+    for name, data in payloads.items():
+        n = -(-len(data) // SECTOR)
+        sectors, order = order[:n], order[n:]
+        _chain(fat, sectors)
+        start[name] = sectors[0]
+        for k, sector in enumerate(sectors):
+            image[sector] = data[k * SECTOR:(k + 1) * SECTOR].ljust(SECTOR, b'\0')
+
+    # Каталог: корень, его ребёнок — первый поток, остальные — правые соседи
+    directory += entry("Root Entry", 5, FREE, FREE, 1, start['<mini>'], len(mini_stream))
+    for sid, name in enumerate(names, 1):
+        data = streams[name]
+        first = mini_start[name] if name in small else start[name]
+        directory += entry(name, 2, FREE, sid + 1 if sid < len(names) else FREE, FREE, first, len(data))
+    image[1] = bytes(directory).ljust(SECTOR, b'\0')
+    image[0] = struct.pack(f'<{len(fat)}I', *fat)
+
+    header = bytearray(SECTOR)
+    header[:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    struct.pack_into('<HHHH', header, 0x18, 0x3E, 3, 0xFFFE, 9)
+    struct.pack_into('<H', header, 0x20, 6)
+    struct.pack_into('<II', header, 0x2C, 1, 1)  # Один сектор FAT, каталог в секторе 1
+    struct.pack_into('<5I', header, 0x38, 4096, start['<minifat>'], 1, END_OF_CHAIN, 0)
+    struct.pack_into('<109I', header, 0x4C, 0, *([FREE] * 108))
+    return bytes(header) + b''.join(image[k] for k in range(count))
+
+
+def build_doc(pieces, ccp_text: int) -> bytes:
+    """.doc Word 97 с таблицей фрагментов: pieces — [(текст, сжатый ли фрагмент)]"""
+    word = bytearray(5000)  # Больше 4096 байт — поток в секторах FAT
+    struct.pack_into('<HH', word, 0, 0xA5EC, 0xC1)
+    struct.pack_into('<H', word, 0x0A, 0x0200)  # Таблица — в потоке 1Table
+    struct.pack_into('<H', word, 32, 14)
+    pos = 32 + 2 + 14 * 2
+    struct.pack_into('<H', word, pos, 22)
+    struct.pack_into('<i', word, pos + 2 + 3 * 4, ccp_text)
+    fib_fc_lcb = pos + 2 + 22 * 4 + 2
+    struct.pack_into('<H', word, fib_fc_lcb - 2, 93)
+
+    cps = [0]
+    pcds = b''
+    offset = 1024
+    for text, compressed in pieces:
+        data = text.encode('cp1252' if compressed else 'utf-16-le')
+        word[offset:offset + len(data)] = data
+        fc = (offset * 2) | 0x40000000 if compressed else offset
+        pcds += struct.pack('<HIH', 0, fc, 0)
+        cps.append(cps[-1] + len(text))
+        offset += len(data) + 16
+    plc = struct.pack(f'<{len(cps)}I', *cps) + pcds
+    # Перед таблицей фрагментов — блок свойств (Prc), который разбор должен пропустить
+    clx = b'\x01' + struct.pack('<H', 3) + b'abc' + b'\x02' + struct.pack('<I', len(plc)) + plc
+    table = bytes(200) + clx
+    struct.pack_into('<II', word, fib_fc_lcb + 33 * 8, 200, len(clx))
+    return build_ole({'WordDocument': bytes(word), '1Table': table})
+
+
+def test_ole_reads_fat_and_minifat_chains():
+    big = bytes(range(256)) * 20 + b'tail'
+    small = b'mini stream ' * 30
+    ole = tts.OleFile(build_ole({'Big': big, 'Small': small}, seed=3))
+    assert ole.read('Big') == big
+    assert ole.read('Small') == small
+    with pytest.raises(ValueError):
+        ole.read('Missing')
+
+
+def test_doc_compressed_and_unicode_pieces(tmp_path):
+    pieces = [
+        ("Plain text.\r", True),
+        ("Привет, \x13 PAGE \\* MERGEFORMAT \x14 1\x15 мир!\r", False),
+        ("Link: \x13 HYPERLINK \"http://example.com\" \x14site\x15.\r", True),
+        ("Сноска после основного текста\r", False),
+    ]
+    ccp_text = sum(len(text) for text, _ in pieces[:3])
+    path = tmp_path / "sample.doc"
+    path.write_bytes(build_doc(pieces, ccp_text))
+
+    assert tts._extract_doc_binary(path) == ["Plain text.", "Привет,  1 мир!", "Link: site.", ""]
+    assert tts.extract_paragraphs(path, use_cache=False) == [
+        ("Plain text.", 0), ("Привет,  1 мир!", 0), ("Link: site.", 0)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("без полей", "без полей"),
+    ("до \x13 PAGE \x145\x15 после", "до 5 после"),
+    ("\x13 REF a \x13 SEQ \x142\x15 \x14итог\x15", "итог"),  # Вложенное поле в коде внешнего
+    ("\x13 TOC без результата\x15текст", "текст"),
+])
+def test_strip_doc_fields(text, expected):
+    assert tts._strip_doc_fields(text) == expected
+
+
+def test_rtf_fixture():
+    assert tts.extract_paragraphs(FIXTURES / "sample.rtf", use_cache=False) == [
+        ("Глава первая", 1),
+        ("Обычный текст cp1251.", 0),
+        ("Привет, мир!", 0),  # \uN с заменой ? и группа \uc2 с двумя заменами
+        ("Ссылка: link text — «цитата».", 0),  # Без fldinst, сноски и неизвестной группы \*
+    ]
+
+
+@pytest.mark.parametrize("body, expected", [
+    (r"\u1040?\u1041?", "АБ"),
+    (r"{\uc0\u1040\u1041}", "АБ"),
+    (r"{\uc2\u1040xy\u1041\'e1\'e1}z", "АБz"),
+    (r"{\fonttbl{\f0 Arial;}}{\*\shppict picture}{\pict 0a0b}текст".encode('cp1251').decode('latin-1'), "текст"),
+    (r"\{a\}\\", "{a}\\"),
+])
+def test_rtf_unicode_and_skipped_groups(tmp_path, body, expected):
+    path = tmp_path / "snippet.rtf"
+    path.write_bytes((r"{\rtf1\ansi\ansicpg1251 " + body + "}").encode('latin-1'))
+    assert tts._extract_rtf(path) == [(expected, 0)]
+
+
+def test_odt_fixture(tmp_path):
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+        'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0">'
+        '<office:body><office:text>'
+        '<text:tracked-changes><text:changed-region><text:p>удалённое</text:p></text:changed-region>'
+        '</text:tracked-changes>'
+        '<text:h text:outline-level="2">Глава вторая</text:h>'
+        '<text:p>Один<text:s text:c="3"/>два<text:tab/>три'
+        '<text:note><text:note-body><text:p>сноска</text:p></text:note-body></text:note>'
+        '<office:annotation><text:p>примечание</text:p></office:annotation>'
+        ' <text:span>жирный <text:span>вложенный</text:span></text:span>.</text:p>'
+        '<table:table><table:table-row><table:table-cell><text:p>Ячейка</text:p></table:table-cell>'
+        '</table:table-row></table:table>'
+        '<text:p>Строка<text:line-break/>перенос</text:p>'
+        '</office:text></office:body></office:document-content>'
+    )
+    path = tmp_path / "sample.odt"
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr('mimetype', 'application/vnd.oasis.opendocument.text')
+        z.writestr('content.xml', content)
+    assert tts._extract_odt(path) == [
+        ("Глава вторая", 2),
+        ("Один   два\tтри жирный вложенный.", 0),
+        ("Ячейка", 0),
+        ("Строка\nперенос", 0),
+    ]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+RATE = 8000
+
+
+def _tone(seconds=0.5, freq=440.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def test_audio_distance_identical():
+    distance = tts.audio_distance(_tone(), _tone(), RATE)
+    assert distance['length_diff'] == 0
+    assert 'snr_db' not in distance  # Побитовое совпадение
+    assert distance['spectral_db'] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_audio_distance_noise_and_length():
+    rng = np.random.default_rng(0)
+    noisy = _tone() + rng.normal(0, 0.005, len(_tone())).astype(np.float32)
+    distance = tts.audio_distance(_tone(), noisy, RATE)
+    assert 30 < distance['snr_db'] < 50
+    assert distance['spectral_db'] <= tts.QUALITY_MAX_SPECTRAL_DB
+
+    distance = tts.audio_distance(_tone(), _tone(0.6), RATE)
+    assert distance['length_diff'] == pytest.approx(0.2)
+    assert 'snr_db' not in distance  # SNR считается только при равной длине
+
+
+def test_set_inference_profile(monkeypatch):
+    monkeypatch.setattr(tts, 'INFERENCE_PROFILE', 'baseline')
+    monkeypatch.setenv(tts.INFERENCE_PROFILE_ENV, 'baseline')
+    monkeypatch.setattr(tts.model_manager, '_model', object())
+    with pytest.raises(ValueError, match="Неизвестный профиль"):
+        tts.set_inference_profile('turbo')
+    assert tts.model_manager.loaded
+
+    tts.set_inference_profile('baseline')  # Тот же профиль — модель не выгружается
+    assert tts.model_manager.loaded
+    tts.set_inference_profile('int8')
+    assert tts.INFERENCE_PROFILE == 'int8' and tts.os.environ[tts.INFERENCE_PROFILE_ENV] == 'int8'
+    assert not tts.model_manager.loaded  # Следующая задача загрузит модель с новым профилем
+
+
+class StubModel:
+    def apply_tts(self, text, speaker, sample_rate, put_accent=True, put_yo=True):
+        return np.tile(_tone(0.01), len(text))
+
+
+def test_tune_inference_compares_profiles_to_baseline():
+    pytest.importorskip('torch')
+    profiles = ['inference', 'int8']
+    results = tts.tune_inference(profiles, texts=["Раз.", "Два три."], sample_rate=RATE, loader=StubModel)
+    assert profiles == ['inference', 'int8']  # Список вызывающего не меняется
+    assert [row['profile'] for row in results] == ['baseline', 'inference', 'int8']
+    assert all(row['acceptable'] for row in results)
+    assert results[0]['speedup'] == 1.0
+    assert 'int8' in results[2]['skipped']  # В заглушке нет nn.Module — квантовать нечего
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import text_to_vois as tts
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = tts.Metrics()
+    for seconds in (0.0005, 0.02, 0.02, 3.0, 100.0):
+        metrics.observe('apply_tts', seconds)
+    hist = metrics.histograms['apply_tts']
+    bounds = dict(zip(tts.METRICS_BUCKETS, hist['buckets']))
+    assert bounds[0.001] == 1 and bounds[0.01] == 1 and bounds[0.05] == 3
+    assert bounds[5.0] == 4 and bounds[60.0] == 4  # 100 с — только в +Inf
+    assert hist['count'] == 5 and hist['sum'] == pytest.approx(103.0405)
+    assert metrics.snapshot() == {'apply_tts': pytest.approx(103.0405)}
+
+
+def test_prometheus_text():
+    metrics = tts.Metrics()
+    metrics.observe('encode', 0.2)
+    metrics.inc('tts_jobs_total')
+    metrics.inc('tts_jobs_total')
+    lines = metrics.prometheus().splitlines()
+    assert "# TYPE tts_stage_seconds histogram" in lines
+    assert 'tts_stage_seconds_bucket{stage="encode",le="0.1"} 0' in lines
+    assert 'tts_stage_seconds_bucket{stage="encode",le="0.5"} 1' in lines
+    assert 'tts_stage_seconds_bucket{stage="encode",le="+Inf"} 1' in lines
+    assert 'tts_stage_seconds_sum{stage="encode"} 0.200000' in lines
+    assert 'tts_stage_seconds_count{stage="encode"} 1' in lines
+    assert "tts_jobs_total 2" in lines
+
+
+def test_span_timed_and_jsonl(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = tts.Metrics(str(path))
+
+    @metrics.timed('split')
+    def split():
+        return 42
+
+    assert split() == 42
+    with pytest.raises(RuntimeError):
+        with metrics.span('normalize', chars=7):
+            raise RuntimeError("сбой")  # Время блока учитывается и при ошибке
+    metrics.set_jsonl(None)
+    metrics.observe('read', 0.1)  # Уже не пишется в файл
+
+    records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [record['stage'] for record in records] == ['split', 'normalize']
+    assert records[1]['chars'] == 7
+    assert set(metrics.histograms) == {'split', 'normalize', 'read'}
+
+
+def test_stage_breakdown_groups_by_kind():
+    before = {'apply_tts': 1.0, 'encode': 0.5}
+    after = {'apply_tts': 4.0, 'model_load': 1.0, 'encode': 1.5, 'cache_read': 0.5, 'custom': 0.25}
+    kinds = tts.stage_breakdown(before, after, wall=10.0)
+    assert kinds == {'модель': 4.0, 'ffmpeg': 1.0, 'диск': 0.5, 'custom': 0.25, 'прочее': 4.25}
@@ -0,0 +1,90 @@
+import pytest
+
+import text_to_vois as tts
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Числа
+    ("0", "ноль"),
+    ("21 книга", "двадцать одна книга"),
+    ("1 000 000", "один миллион"),
+    ("1900", "тысяча девятьсот"),
+    ("2024", "две тысячи двадцать четыре"),
+    ("007", "ноль ноль семь"),
+    ("-5", "минус пять"),
+    ("2,5", "две целых пять десятых"),
+    ("Python 3.11", "Пайтон три точка одиннадцать"),
+    ("2-й", "второй"),
+    ("3-го", "третьего"),
+    # Дроби
+    ("1/2", "одна вторая"),
+    ("3/4", "три четвёртых"),
+    ("21/100", "двадцать одна сотая"),
+    ("1/2 кг", "одна вторая килограмма"),
+    ("дом 5/2", "дом пять дробь два"),
+])
+def test_numbers(text, expected):
+    assert tts.normalize_text(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12.03.2024", "двенадцатое марта две тысячи двадцать четвёртого года"),
+    ("1 мая", "первое мая"),
+    ("в 1990 году", "в тысяча девятьсот девяностом году"),
+    ("2020 год", "две тысячи двадцатый год"),
+    ("90-е годы", "девяностые годы"),
+    ("в 10:05", "в десять ноль пять"),
+    ("в 7:00", "в семь ноль ноль"),
+])
+def test_dates_and_time(text, expected):
+    assert tts.normalize_text(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("50%", "пятьдесят процентов"),
+    ("2,5 кг", "две целых пять десятых килограмма"),
+    ("1 т", "одна тонна"),
+    ("$5", "пять долларов"),
+    ("5 млн руб. в год", "пять миллионов рублей в год"),
+    ("200 г муки", "двести граммов муки"),
+    ("1 г соли", "один грамм соли"),
+    ("5 г. сахара", "пять граммов сахара"),
+    ("3 г. вещества", "три грамма вещества"),
+    # «г.» после числа — год
+    ("5 г. назад", "пять лет назад"),
+    ("500 г. назад", "пятьсот лет назад"),
+    ("Через 3 г. он вернулся.", "Через три года он вернулся."),
+    ("Это было 2 г. спустя", "Это было два года спустя"),
+])
+def test_units(text, expected):
+    assert tts.normalize_text(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("т.е.", "то есть."),
+    ("и т.д., и т. п.", "и так далее, и тому подобное."),
+    ("см. рис. 3", "смотри рисунок три"),
+    # С большой буквы в начале предложения
+    ("См. выше", "Смотри выше"),
+    ("Т.к. поздно", "Так как поздно"),
+    # Перед именем и названием точка не становится концом предложения
+    ("г. Москва, ул. Ленина", "город Москва, улица Ленина"),
+    ("им. Ломоносова", "имени Ломоносова"),
+    ("проф. Иванов и акад. Петров", "профессор Иванов и академик Петров"),
+    ("пр. Мира", "проспект Мира"),
+    # Конец предложения — только в конце текста или строки
+    ("и т.д. Потом", "и так далее Потом"),
+    ("и т.д.\nПотом", "и так далее.\nПотом"),
+    ("чай и пр.", "чай и прочее."),
+    # Инициалы не трогаем
+    ("Т.Н. Иванова", "Т.Н. Иванова"),
+    ("Г. Иванов", "Г. Иванов"),
+    ("в 2020 г.", "в две тысячи двадцатого года"),
+])
+def test_abbreviations(text, expected):
+    assert tts.normalize_text(text) == expected
+
+
+def test_latin():
+    assert tts.normalize_text("API") == "эй-пи-ай"
+    assert tts.normalize_text("GitHub") == "Гитхаб"
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import pytest
+
+import text_to_vois as tts
+
+
+@pytest.mark.parametrize("spec, sample_rate, expected", [
+    ("mp3", 48000, ('mp3', 'libmp3lame', '.mp3', '192k')),
+    ("mp3", 8000, ('mp3', 'libmp3lame', '.mp3', '32k')),
+    ("opus", 22050, ('opus', 'libopus', '.opus', '24k')),  # Битрейт ближайшей частоты
+    (" Opus:16K ", 24000, ('opus', 'libopus', '.opus', '16k')),
+    ("aac:128", 48000, ('aac', 'aac', '.m4a', '128')),
+])
+def test_parse_output_format(spec, sample_rate, expected):
+    assert tts.parse_output_format(spec, sample_rate) == expected
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("wav", "Неизвестный формат"),
+    ("mp3:fast", "Неверный битрейт"),
+    ("opus:24kbps", "Неверный битрейт"),
+])
+def test_invalid_output_format(spec, message):
+    with pytest.raises(ValueError, match=message):
+        tts.parse_output_format(spec, 24000)
+
+
+@pytest.mark.parametrize("preset, sample_rate, formats, expected", [
+    (None, None, None, (48000, ['mp3'])),
+    ('audiobook', None, None, (24000, ['mp3', 'opus'])),
+    ('phone', None, None, (8000, ['opus'])),
+    ('phone', 24000, None, (24000, ['opus'])),    # Явная частота важнее пресета
+    ('audiobook', None, ['ogg'], (24000, ['ogg'])),
+])
+def test_resolve_output_profile(preset, sample_rate, formats, expected):
+    assert tts.resolve_output_profile(preset, sample_rate, formats) == expected
+
+
+def test_resolve_output_profile_rejects_bad_format_early():
+    with pytest.raises(ValueError):
+        tts.resolve_output_profile('studio', formats=['mp3', 'flac'])
+
+
+@pytest.mark.parametrize("formats, expected", [
+    (None, [("book.mp3", 'libmp3lame', '64k')]),
+    (['mp3', 'opus'], [("book.mp3", 'libmp3lame', '64k'), ("book.opus", 'libopus', '24k')]),
+    # Повтор расширения — к имени добавляется битрейт, одинаковые копии не дублируются
+    (['mp3:64k', 'mp3:192k', 'mp3:64k'], [("book_64k.mp3", 'libmp3lame', '64k'),
+                                           ("book_192k.mp3", 'libmp3lame', '192k')]),
+    (['aac'], [("book.m4a", 'aac', '48k')]),
+])
+def test_output_renditions(tmp_path, formats, expected):
+    renditions = tts.output_renditions(tmp_path / "book.mp3", formats, 24000)
+    assert renditions == [(tmp_path / name, codec, bitrate) for name, codec, bitrate in expected]
+    assert all(isinstance(path, Path) for path, _, _ in renditions)
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+RATE = 8000
+
+
+class StubModel:
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = []
+
+    def apply_tts(self, text, speaker, sample_rate, put_accent=True, put_yo=True):
+        self.calls.append(text)
+        if any(word in text.lower() for word in self.broken):
+            raise RuntimeError(f"модель не справилась: {text}")
+        return np.full(len(text) * 100, 0.5, dtype=np.float32)
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    monkeypatch.setattr(tts, 'TRIM_SILENCE', False)
+    monkeypatch.setattr(tts, 'SYNTH_DEDUP', False)
+    monkeypatch.setattr(tts, 'CHUNK_TARGET_CHARS', 0)
+    monkeypatch.setattr(tts, 'NORMALIZE_TEXT', False)
+    path = tmp_path / "book.txt"
+    path.write_text("\n\n".join(f"Абзац номер {k}." for k in range(10)), encoding='utf-8')
+    return path
+
+
+def test_stream_interleaves_pauses(book, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel())
+    stats = {}
+    pieces = list(tts.stream_audio(book, sample_rate=RATE, use_cache=False, stats=stats))
+    pause = RATE * tts.PAUSE_PARAGRAPH_MS // 1000
+    assert [len(piece) for piece in pieces] == [len("Абзац номер 0.") * 100, pause] * 9 + [len("Абзац номер 0.") * 100]
+    assert stats['chunks'] == 10 and stats['time_to_first_audio'] >= 0
+    assert stats['audio_seconds'] == pytest.approx(sum(len(piece) for piece in pieces) / RATE)
+
+
+def test_prefetch_is_bounded_and_stops_with_listener(book, monkeypatch):
+    model = StubModel()
+    monkeypatch.setattr(tts.model_manager, '_model', model)
+    stream = tts.stream_audio(book, sample_rate=RATE, prefetch=2, use_cache=False)
+    next(stream)
+    time.sleep(0.3)
+    # Отдан 1 чанк, 2 ждут в очереди, ещё один озвучен и ждёт места
+    assert len(model.calls) <= 4
+    stream.close()  # Слушатель ушёл — поток озвучки завершается
+    calls = len(model.calls)
+    time.sleep(0.3)
+    assert len(model.calls) == calls < 10
+
+
+def test_model_error_reaches_listener(book, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel(broken={'номер 3'}))
+    stats = {}
+    with pytest.raises(RuntimeError, match="номер 3"):
+        for _ in tts.stream_audio(book, sample_rate=RATE, use_cache=False, stats=stats):
+            pass
+    assert stats['chunks'] == 3
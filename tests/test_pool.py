@@ -0,0 +1,64 @@
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+
+class StubModel:
+    def __init__(self):
+        self.broken = set()
+
+    def apply_tts(self, text, speaker, sample_rate, put_accent=True, put_yo=True):
+        if any(word in text.lower() for word in self.broken):
+            raise RuntimeError(f"модель не справилась: {text}")
+        return np.full(len(text) * 100, 0.5, dtype=np.float32)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Пул на потоках вместо процессов: та же очередь пакетов, но модель-заглушка видна воркерам"""
+    def executor(max_workers, mp_context=None, initializer=None, initargs=()):
+        return concurrent.futures.ThreadPoolExecutor(max_workers)  # initializer настраивает torch — не нужен
+
+    model = StubModel()
+    monkeypatch.setattr(tts.model_manager, '_model', model)
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', executor)
+    return model
+
+
+def test_run_returns_every_batch(model):
+    texts = ["раз.", "два.", "три длиннее.", "четыре."]
+    pool = tts.SynthesisPool(workers=2, threads_per_worker=1)
+    try:
+        results = list(pool.run([[0, 1], [2], [3]], texts, ['xenia'] * 4, 8000))
+    finally:
+        pool.close()
+    assert sorted(indices for indices, _, _ in results) == [[0, 1], [2], [3]]
+    for indices, audios, error in results:
+        assert error is None
+        assert [len(audio) for audio in audios] == [len(texts[i]) * 100 for i in indices]
+    assert sum(count for count, _ in pool.stats.values()) == 4
+
+
+def test_run_reports_partial_batch(model):
+    model.broken = {'два'}
+    pool = tts.SynthesisPool(workers=1, threads_per_worker=1)
+    try:
+        (indices, audios, error), = pool.run([[0, 1, 2]], ["раз.", "два.", "три."], ['xenia'] * 3, 8000)
+        assert pool.run_one("четыре.", 'xenia', 8000).shape == (700,)
+    finally:
+        pool.close()
+    assert indices == [0, 1, 2] and audios is None
+    assert isinstance(error, tts.PartialBatchError)
+    assert list(error.errors) == [1]
+    assert error.audios[1] is None and len(error.audios[0]) == len(error.audios[2]) == 400
+
+
+def test_iter_synthesized_audio_with_pool_matches_local(model):
+    texts = ["раз.", "два.", "три.", "четыре длинное.", "пять."]
+    local = dict(tts.iter_synthesized_audio(texts, 'xenia', 8000))
+    pooled = dict(tts.iter_synthesized_audio(texts, 'xenia', 8000, workers=2, threads=1))
+    assert list(pooled) == list(range(len(texts)))
+    assert all(np.array_equal(local[i], pooled[i]) for i in local)
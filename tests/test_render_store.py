@@ -0,0 +1,49 @@
+import numpy as np
+
+import text_to_vois as tts
+
+
+def _audio(n, value):
+    return np.full(n, value, dtype=np.float32)
+
+
+def test_empty_chunk_survives_compaction(tmp_path):
+    store = tts.RenderStore(tmp_path, 48000)
+    store.add("старый один", _audio(30000, 0.1))
+    store.add("старый два", _audio(30000, 0.2))
+    store.commit()
+
+    # Пустой чанк (тишина, обрезанная до нуля) получает то же смещение, что и следующий за ним
+    store = tts.RenderStore(tmp_path, 48000)
+    assert store.load() == 2
+    store.add("тишина", _audio(0, 0.0))
+    store.add("новый один", _audio(28800, 0.3))
+    store.add("новый два", _audio(4800, 0.4))
+    store.commit()
+    assert store.generation == 2  # Устаревшее аудио больше половины — спул переписан
+
+    store = tts.RenderStore(tmp_path, 48000)
+    assert store.load() == 3
+    assert len(store.read(store.lookup("тишина"))) == 0
+    for text, n, value in [("новый один", 28800, 0.3), ("новый два", 4800, 0.4)]:
+        audio = store.read(store.lookup(text))
+        assert len(audio) == n
+        assert np.all(audio == np.float32(value))
+    assert store.lookup("старый один") is None
+    assert [p.name for p in tmp_path.glob("audio-*.f32")] == ["audio-2.f32"]
+
+
+def test_interrupted_render_keeps_previous_index(tmp_path):
+    store = tts.RenderStore(tmp_path, 48000)
+    store.add("один", _audio(100, 0.5))
+    store.commit()
+
+    store = tts.RenderStore(tmp_path, 48000)
+    store.load()
+    store.add("два", _audio(100, 0.6))
+    store.close()  # Без commit: индекс остаётся от прошлой озвучки
+
+    store = tts.RenderStore(tmp_path, 48000)
+    assert store.load() == 1
+    assert store.lookup("два") is None
+    assert np.all(store.read(store.lookup("один")) == np.float32(0.5))
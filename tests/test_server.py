@@ -0,0 +1,119 @@
+import http.client
+import json
+import threading
+
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+
+class StubModel:
+    def apply_tts(self, text, speaker, sample_rate, put_accent=True, put_yo=True):
+        if 'сломанный' in text.lower():
+            raise RuntimeError("модель не справилась")
+        return np.full(len(text) * 10, 0.5, dtype=np.float32)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    servers = []
+
+    def start(window_ms=0):
+        server = tts.make_server("127.0.0.1", 0, window_ms=window_ms)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.batcher.close()
+        server.server_close()
+
+
+def _request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, data
+
+
+def test_synthesize_wav(server, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel())
+    status, data = _request(server(), "POST", "/synthesize?format=pcm", "Привет.".encode('utf-8'))
+    assert status == 200 and len(data) > 0
+
+
+def test_oversized_body_rejected_before_reading(server, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel())
+    connection = http.client.HTTPConnection(*server().server_address[:2], timeout=10)
+    # Заголовок обещает огромное тело, но само тело не отправляется: сервер отвечает, не дожидаясь его
+    connection.putrequest("POST", "/synthesize")
+    connection.putheader("Content-Length", str(tts.SERVER_MAX_BODY_BYTES + 1))
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 413
+    assert 'error' in json.loads(response.read())
+    connection.close()
+
+
+def test_invalid_request_rejected_before_planning(server, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel())
+
+    def plan_document(*args, **kwargs):
+        raise AssertionError("текст не должен разбираться")
+
+    monkeypatch.setattr(tts, 'plan_document', plan_document)
+    srv = server()
+    for params in ({'text': "а" * (tts.SERVER_MAX_TEXT_CHARS + 1)},
+                   {'text': "Привет.", 'speaker': "nobody"},
+                   {'text': "Привет.", 'sample_rate': 12345}):
+        status, data = _request(srv, "POST", "/synthesize", json.dumps(params).encode('utf-8'),
+                                {'Content-Type': "application/json"})
+        assert status == 400, params
+
+
+def test_model_load_failure_returns_503(server, monkeypatch):
+    def broken():
+        raise RuntimeError("нет файла модели")
+
+    monkeypatch.setattr(tts.model_manager, 'get', broken)
+    srv = server()
+    for _ in range(2):  # И ждавший загрузки, и следующий запрос
+        status, data = _request(srv, "POST", "/synthesize", "Привет.".encode('utf-8'))
+        assert status == 503
+        assert "нет файла модели" in json.loads(data)['error']
+    status, _ = _request(srv, "GET", "/health")
+    assert status == 503
+
+
+def test_failed_sentence_does_not_fail_neighbours_in_batch(server, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel())
+    srv = server(window_ms=500)  # Окно с запасом: оба запроса попадают в один пакет
+    results = {}
+
+    def client(name, text):
+        results[name] = _request(srv, "POST", "/synthesize?format=pcm", text.encode('utf-8'))
+
+    threads = [threading.Thread(target=client, args=args)
+               for args in (("bad", "Сломанный текст."), ("good", "Хороший текст."))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert srv.batcher.batches == 1
+    assert results["bad"][0] == 500
+    assert results["good"][0] == 200 and len(results["good"][1]) > 0
+
+
+def test_metrics_endpoint(server, monkeypatch):
+    monkeypatch.setattr(tts.model_manager, '_model', StubModel())
+    srv = server()
+    assert _request(srv, "POST", "/synthesize?format=pcm", "Привет.".encode('utf-8'))[0] == 200
+    status, data = _request(srv, "GET", "/metrics")
+    assert status == 200
+    lines = data.decode('utf-8').splitlines()
+    assert any(line.startswith('tts_stage_seconds_count{stage="apply_tts"}') for line in lines)
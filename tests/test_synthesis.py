@@ -0,0 +1,212 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+
+class StubModel:
+    """apply_tts без пакетного режима: аудио длиной в текст, падает на предложениях со словом broken"""
+
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.calls = []
+
+    def apply_tts(self, text, speaker, sample_rate, put_accent=True, put_yo=True):
+        self.calls.append(text)
+        if any(word in text.lower() for word in self.broken):
+            raise RuntimeError(f"модель не справилась: {text}")
+        return np.full(len(text) * 100, 0.5, dtype=np.float32)
+
+
+class StubEncoder:
+    """FFmpegStreamEncoder без ffmpeg: считает сэмплы и создаёт пустой файл"""
+
+    def __init__(self, output, sample_rate, bitrate="192k", codec="libmp3lame", renditions=()):
+        self.output = Path(output)
+        self.sample_rate = sample_rate
+        self.samples = 0
+
+    @property
+    def duration(self):
+        return self.samples / self.sample_rate
+
+    def write(self, audio):
+        self.samples += len(audio)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.output.write_bytes(b"")
+        return False
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = StubModel()
+    monkeypatch.setattr(tts.model_manager, '_model', model)
+    monkeypatch.setattr(tts, 'FFmpegStreamEncoder', StubEncoder)
+    monkeypatch.setattr(tts, 'SKIP_FAILED_CHUNKS', True)
+    monkeypatch.setattr(tts, 'SYNTH_DEDUP', False)
+    return model
+
+
+def test_failed_batch_retries_only_missing_items(model):
+    model.broken = {'три'}
+    texts = ["раз.", "два.", "три.", "четыре.", "пять.", "шесть."]
+    failures = []
+    audios = dict(tts.iter_synthesized_audio(texts, 'xenia', 8000,
+                                             on_failure=lambda i, text, e: failures.append(i)))
+
+    assert len(model.calls) == len(texts)  # Упавшее предложение не повторяется, готовые — тоже
+    assert failures == [2]
+    assert len(audios[2]) == 0
+    assert [len(audios[i]) for i in (0, 1, 3, 4, 5)] == [len(texts[i]) * 100 for i in (0, 1, 3, 4, 5)]
+
+
+def test_failed_batch_call_retries_items_one_by_one(model, monkeypatch):
+    def batch_fails(model, texts, speaker, sample_rate, mode=None):
+        if len(texts) > 1:
+            raise RuntimeError("пакет не прошёл")
+        return [model.apply_tts(text=texts[0], speaker=speaker, sample_rate=sample_rate)]
+
+    monkeypatch.setattr(tts, 'synthesize_batch', batch_fails)
+    audios = dict(tts.iter_synthesized_audio(["раз.", "два."], 'xenia', 8000, on_failure=lambda *args: None))
+    assert model.calls == ["раз.", "два."]
+    assert all(len(audio) for audio in audios.values())
+
+
+def test_partial_batch_error_survives_pickle():
+    import pickle
+
+    error = pickle.loads(pickle.dumps(tts.PartialBatchError([np.zeros(3), None], {1: RuntimeError("сбой")})))
+    assert error.audios[1] is None and len(error.audios[0]) == 3
+    assert str(error.errors[1]) == "сбой"
+
+
+def test_resume_resynthesizes_only_failed_chunks(model, tmp_path):
+    source = tmp_path / "book.txt"
+    source.write_text("\n\n".join(f"Абзац номер {word}." for word in
+                                  ("один", "два", "три", "четыре", "пять")), encoding='utf-8')
+    output = tmp_path / "book.mp3"
+    model.broken = {'два', 'четыре'}
+    stats = {}
+    tts.synthesize_file(source, output=output, sample_rate=8000, use_cache=False, resume=True,
+                        timings=[], stats=stats)
+    assert [failure['index'] for failure in stats['failed']] == [1, 3]
+
+    model.broken = set()
+    model.calls = []
+    stats = {}
+    tts.synthesize_file(source, output=output, sample_rate=8000, use_cache=False, resume=True,
+                        timings=[], stats=stats)
+    assert len(model.calls) == 2
+    assert all('два' in text or 'четыре' in text for text in model.calls)
+    assert stats['synthesized'] == 2 and stats['failed'] == []
+    assert not tts.job_work_dir(source, tts.DEFAULT_SPEAKER).exists()  # Журнал убран после полной озвучки
+
+
+def test_manifest_replaces_resynthesized_entry(tmp_path):
+    manifest = tts.ResumeManifest(tmp_path, 8000)
+    manifest.load()
+    manifest.open()
+    manifest.append(0, "раз", np.full(10, 0.1, dtype=np.float32))
+    manifest.append(1, "два", np.zeros(0, dtype=np.float32), failed="RuntimeError: сбой")
+    manifest.append(2, "три", np.full(30, 0.3, dtype=np.float32))
+    manifest.close()
+
+    manifest = tts.ResumeManifest(tmp_path, 8000)
+    assert manifest.load() == 2
+    manifest.open()
+    assert manifest.matches(0, "раз") and manifest.matches(2, "три")
+    assert not manifest.matches(1, "два")
+    manifest.append(1, "два", np.full(20, 0.2, dtype=np.float32))
+    manifest.close()
+
+    manifest = tts.ResumeManifest(tmp_path, 8000)
+    assert manifest.load() == 3
+    for k, text, n, value in [(0, "раз", 10, 0.1), (1, "два", 20, 0.2), (2, "три", 30, 0.3)]:
+        assert manifest.matches(k, text)
+        audio = manifest.read(k)
+        assert len(audio) == n and np.all(audio == np.float32(value))
+
+
+class BatchStubModel(StubModel):
+    """apply_tts с пакетным режимом (параметр texts)"""
+
+    def apply_tts(self, text=None, texts=None, speaker='xenia', sample_rate=8000, put_accent=True, put_yo=True):
+        if texts is None:
+            return super().apply_tts(text, speaker, sample_rate)
+        self.calls.append(texts)
+        return [np.full(len(t) * 100, 0.5, dtype=np.float32) for t in texts]
+
+
+def test_batch_mode_uses_one_call_per_batch():
+    model = BatchStubModel()
+    audios = tts.synthesize_batch(model, ["раз.", "два."], 'xenia', 8000)
+    assert model.calls == [["раз.", "два."]]
+    assert [len(audio) for audio in audios] == [400, 400]
+
+    model.calls = []
+    tts.synthesize_batch(model, ["раз.", "два."], 'xenia', 8000, mode='off')
+    assert model.calls == ["раз.", "два."]
+
+
+def test_benchmark_batching_compares_modes():
+    rates = tts.benchmark_batching(BatchStubModel(), ["раз.", "два.", "три."], 'xenia', 8000)
+    assert set(rates) == {'off', 'auto'}
+    assert all(rate > 0 for rate in rates.values())
+
+
+def test_benchmark_batching_without_batch_support_makes_same_calls():
+    model = StubModel()
+    rates = tts.benchmark_batching(model, ["раз.", "два.", "три."], 'xenia', 8000)
+    assert set(rates) == {'off', 'auto'}
+    assert model.calls == ["раз.", "два.", "три."] * 2  # По вызову на предложение в обоих режимах
+
+
+def test_stats_count_only_model_work(model, monkeypatch, tmp_path):
+    monkeypatch.setattr(tts, 'SYNTH_DEDUP', True)
+    source = tmp_path / "book.txt"
+    source.write_text("\n\n".join(["Повтор.", "Один.", "Повтор.", "Сломанный.", "Повтор."]), encoding='utf-8')
+    model.broken = {'сломанный'}
+    stats = {}
+    tts.synthesize_file(source, output=tmp_path / "book.mp3", sample_rate=8000, use_cache=False,
+                        timings=[], stats=stats)
+    assert stats['sentences'] == 5
+    assert stats['synthesized'] == 2 == len(model.calls) - 1  # Упавший вызов не считается
+    assert stats['deduplicated'] == 2 and stats['cached'] == 0
+    assert len(stats['failed']) == 1
+
+
+def test_scan_directory_skips_failure_reports(tmp_path):
+    (tmp_path / "book.txt").write_text("Текст.", encoding='utf-8')
+    report = tts.write_failure_report(tmp_path / "book_xenia.mp3", tmp_path / "book.txt", {0: ("Текст.", "сбой")})
+    assert report.exists()
+    assert tts.scan_directory(tmp_path) == [tmp_path / "book.txt"]
+
+
+def test_directory_manifest_skips_done_files_and_resumes_failed(model, tmp_path):
+    (tmp_path / "good.txt").write_text("Первый абзац.\n\nВторой абзац.", encoding='utf-8')
+    (tmp_path / "bad.txt").write_text("Целый абзац.\n\nСломанный абзац.", encoding='utf-8')
+    options = {'sample_rate': 8000, 'use_cache': False, 'timings': []}
+    model.broken = {'сломанный'}
+    results = tts.synthesize_directory(tmp_path, **options)
+    assert set(results) == {tmp_path / "good.txt", tmp_path / "bad.txt"}
+    manifest = tts._load_batch_manifest(tmp_path / tts.BATCH_MANIFEST_NAME)
+    assert list(manifest) == ["good.txt"]  # Файл с пропусками в манифест папки не попадает
+
+    # Готовый файл пропускается, у недоозвученного повторяется только упавший чанк
+    model.broken = set()
+    model.calls = []
+    results = tts.synthesize_directory(tmp_path, **options)
+    assert model.calls == ["Сломанный абзац."]
+    assert results[tmp_path / "good.txt"] == tmp_path / manifest["good.txt"]['output']
+    assert set(tts._load_batch_manifest(tmp_path / tts.BATCH_MANIFEST_NAME)) == {"good.txt", "bad.txt"}
+
+    # Другая частота — озвучиваем заново
+    model.calls = []
+    tts.synthesize_directory(tmp_path, **{**options, 'sample_rate': 24000})
+    assert len(model.calls) == 4
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import text_to_vois as tts
+
+
+@pytest.mark.parametrize("paragraph, expected", [
+    ("Первое. Второе! Третье?", ["Первое.", "Второе!", "Третье?"]),
+    ("Город г. Москва, ул. Ленина, д. 5. Дальше.", ["Город г. Москва, ул. Ленина, д. 5.", "Дальше."]),
+    ("А. С. Пушкин писал. См. выше.", ["А. С. Пушкин писал.", "См. выше."]),
+    ("«Привет», — сказал он. — Пока.", ["«Привет», — сказал он.", "— Пока."]),
+    ("Цена 2.5 рубля. 12.03.2024 — дата.", ["Цена 2.5 рубля.", "12.03.2024 — дата."]),
+])
+def test_split_source_sentences(paragraph, expected):
+    assert tts.split_source_sentences(paragraph) == expected
+
+
+def test_chunks_carry_source_sentences():
+    paragraph = "В 2020 г. было 25 кг снега. Это правда! Конец."
+    planned = tts.plan_paragraph_sentences(paragraph, 200, normalize=tts.normalize_text)
+    assert len(planned) == 1
+    chunk, parts = planned[0]
+    assert "двадцать пять килограммов" in chunk
+    assert [text for _, text, _ in parts] == ["В 2020 г. было 25 кг снега.", "Это правда!", "Конец."]
+    assert sum(chars for _, _, chars in parts) == len(chunk) + 1
+
+    # С CHUNK_TARGET_CHARS = 0 — по чанку на предложение
+    planned = tts.plan_paragraph_sentences(paragraph, 0, normalize=tts.normalize_text)
+    assert [[text for _, text, _ in parts] for _, parts in planned] == [
+        ["В 2020 г. было 25 кг снега."], ["Это правда!"], ["Конец."]]
+
+
+def test_plan_document_sentences_match_chunks():
+    sentences = []
+    chunks, ends = tts.plan_document("Раз. Два.\n\nТри.", 0, normalize=False, sentences=sentences)
+    assert chunks == ["Раз.", "Два.", "Три."]
+    assert ends == {1, 2}
+    assert [[text for _, text, _ in parts] for parts in sentences] == [["Раз."], ["Два."], ["Три."]]
+
+
+def test_timing_index_splits_chunk_by_sentences(tmp_path):
+    output = tmp_path / "book.mp3"
+    with tts.TimingIndex(output, 1000, ['json', 'srt']) as timing:
+        # Два предложения в одном чанке: 1000 сэмплов делятся 3:1 по символам
+        timing.add(0, 0, 1000, [(0, "Первое  предложение.", 30), (1, "Второе.", 10)], chapter=(1, "Глава"))
+        # Предложение, разрезанное на два чанка, — один сегмент
+        timing.add(1, 1500, 2000, [(2, "Длинное предложение.", 10)])
+        timing.add(2, 2200, 2600, [(2, "Длинное предложение.", 5), (3, "Последнее.", 5)])
+    index = json.loads((tmp_path / "book.timings.json").read_text(encoding='utf-8'))
+    assert [(s['start'], s['end'], s['text'], s['chunk']) for s in index['segments']] == [
+        (0.0, 0.75, "Первое предложение.", 0),
+        (0.75, 1.0, "Второе.", 0),
+        (1.5, 2.4, "Длинное предложение.", 1),
+        (2.4, 2.6, "Последнее.", 2),
+    ]
+    assert index['duration'] == 2.6
+    assert index['chapters'] == [{'index': 0, 'start': 0.0, 'end': 2.6, 'level': 1, 'title': "Глава"}]
+    assert (tmp_path / "book.srt").read_text(encoding='utf-8').count(" --> ") == 4
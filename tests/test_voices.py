@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pytest
+
+import text_to_vois as tts
+
+
+@pytest.mark.parametrize("paragraphs, expected", [
+    # Метка меняет голос до следующей метки, [-] возвращает голос озвучки
+    (["Начало.", "[baya] Реплика.", "Дальше.", "[-] Снова.", "Конец."],
+     [("Начало.", None), ("Реплика.", 'baya'), ("Дальше.", 'baya'), ("Снова.", None), ("Конец.", None)]),
+    (["[ AIDAR ]Громко."], [("Громко.", 'aidar')]),
+    # Неизвестный голос — не метка: текст остаётся как есть, голос не меняется
+    (["[eugene] Раз.", "[nobody] Два.", "[см. приложение] Три."],
+     [("Раз.", 'eugene'), ("[nobody] Два.", 'eugene'), ("[см. приложение] Три.", 'eugene')]),
+    (["Текст [baya] в середине."], [("Текст [baya] в середине.", None)]),
+])
+def test_voice_tags(paragraphs, expected):
+    markup = tts.VoiceMarkup()
+    assert [markup.apply(paragraph) for paragraph in paragraphs] == expected
+
+
+def test_roles():
+    markup = tts.VoiceMarkup({'автор': 'aidar', 'мария петровна': 'baya'})
+    assert markup.apply("Мария Петровна: Здравствуйте.") == ("Здравствуйте.", 'baya')
+    assert markup.apply("Автор — Она ушла.") == ("Она ушла.", 'aidar')
+    assert markup.apply("Мария: не роль.") == ("Мария: не роль.", None)
+    # Роль в метке работает как голос
+    assert markup.apply("[Автор] Дальше.") == ("Дальше.", 'aidar')
+    assert markup.apply("Ещё.") == ("Ещё.", 'aidar')
+
+
+def test_load_voice_map(tmp_path):
+    book = tmp_path / "Книга.txt"
+    assert tts.load_voice_map(book) == {}
+    tts.voice_map_path(book).write_text(json.dumps({" Автор ": "aidar", "Мария": "baya"}, ensure_ascii=False),
+                                        encoding='utf-8-sig')
+    assert tts.voice_map_path(book).name == "Книга.voices.json"
+    assert tts.load_voice_map(book) == {'автор': 'aidar', 'мария': 'baya'}
+
+
+@pytest.mark.parametrize("content, message", [
+    ('{"Автор": "nobody"}', "неизвестный голос"),
+    ('["aidar"]', "ожидается словарь"),
+    ('{"Автор": ', "ошибка в JSON"),
+])
+def test_load_voice_map_errors(tmp_path, content, message):
+    book = tmp_path / "book.txt"
+    tts.voice_map_path(book).write_text(content, encoding='utf-8')
+    with pytest.raises(ValueError, match=message):
+        tts.load_voice_map(book)
+
+
+def test_document_voices_from_sidecar(tmp_path):
+    book = tmp_path / "book.txt"
+    book.write_text("Вступление.\n\nМария: Привет.\n\n[eugene] Ответ.\n\n[-] Конец.", encoding='utf-8')
+    tts.voice_map_path(book).write_text('{"Мария": "baya"}', encoding='utf-8')
+    document = tts.DocumentStream(book, target_chars=0, normalize=False, voices=True)
+    assert [(chunk, voice) for chunk, _, voice in document.voiced_chunks()] == [
+        ("Вступление.", None), ("Привет.", 'baya'), ("Ответ.", 'eugene'), ("Конец.", None)]
+    assert document.voice_chunks == {'baya': 1, 'eugene': 1}
+
+
+class VoiceBatchModel:
+    """Пакетный apply_tts, который запоминает голос каждого вызова"""
+
+    def __init__(self):
+        self.calls = []
+
+    def apply_tts(self, text=None, texts=None, speaker='xenia', sample_rate=8000, put_accent=True, put_yo=True):
+        self.calls.append((speaker, texts))
+        return [np.full(len(t), len(speaker), dtype=np.float32) for t in texts]
+
+
+def test_batches_are_built_per_voice(monkeypatch):
+    model = VoiceBatchModel()
+    monkeypatch.setattr(tts.model_manager, '_model', model)
+    items = ["Раз.", ("Два.", 'baya'), "Три.", ("Четыре.", 'baya'), ("Пять.", None)]
+    audios = list(tts.iter_synthesized_audio(items, 'xenia', 8000))
+
+    assert sorted(model.calls) == [('baya', ["Два.", "Четыре."]), ('xenia', ["Раз.", "Три.", "Пять."])]
+    # Порядок на выходе — исходный, у каждого предложения аудио своего голоса
+    assert [i for i, _ in audios] == [0, 1, 2, 3, 4]
+    assert [audio[0] for _, audio in audios] == [len('xenia'), len('baya'), len('xenia'), len('baya'), len('xenia')]
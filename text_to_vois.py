@@ -1,27 +1,50 @@
 # text_to_vois.py
 # Полный скрипт для озвучки текста через Silero TTS (v5_ru) с GUI
-# Работает с .txt, .docx, .doc → вывод в MP3 рядом с исходником
+# Работает с .txt, .docx, .doc, .rtf, .odt → вывод в MP3 рядом с исходником
+#
+# Можно использовать и без GUI:
+#   python text_to_vois.py synth книга.txt --speaker xenia
+#   from text_to_vois import synthesize_file
+# Тяжёлые зависимости (torch, tkinter, ffmpeg) подключаются только при первом обращении.
 
 import os
 import re
 import sys
+import time
+import queue
 import shutil
+import json
+import codecs
+import hashlib
+import inspect
 import logging
+import functools
 import subprocess
-import urllib.request
+import threading
+import collections
+import itertools
+import contextlib
+import multiprocessing
 from pathlib import Path
-from typing import List
+from typing import List, Dict, Set, Tuple, Callable, Iterable, Iterator
 from datetime import datetime
 
-# === Импорт tkinter для GUI ===
-try:
-    import tkinter as tk
-    from tkinter import filedialog, ttk, messagebox, scrolledtext
-except ImportError:
-    print("tkinter не найден. Убедитесь, что вы используете стандартный Python.")
-    sys.exit(1)
+logger = logging.getLogger("text_to_vois")
+
+# === Импорт tkinter для GUI (только при запуске GUI) ===
+tk = filedialog = ttk = messagebox = scrolledtext = None
+
+def import_tkinter():
+    """Подключаем tkinter по требованию — библиотеке и CLI он не нужен"""
+    global tk, filedialog, ttk, messagebox, scrolledtext
+    try:
+        import tkinter as tk
+        from tkinter import filedialog, ttk, messagebox, scrolledtext
+    except ImportError:
+        print("tkinter не найден. Убедитесь, что вы используете стандартный Python.")
+        sys.exit(1)
 
-# === Настройка логирования СРАЗУ ===
+# === Настройка логирования ===
 def setup_logging():
     """Создаем лог-файл в папке со скриптом"""
     if getattr(sys, 'frozen', False):
@@ -32,21 +55,168 @@ def setup_logging():
         log_dir = Path(__file__).parent
 
     log_file = log_dir / "text_to_vois.log"
+    # Процессы пула синтеза дописывают в общий лог, а не перезаписывают его
+    mode = 'a' if multiprocessing.parent_process() is not None else 'w'
 
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s | %(levelname)s | %(message)s',
         handlers=[
-            logging.FileHandler(log_file, encoding='utf-8', mode='w'),
+            logging.FileHandler(log_file, encoding='utf-8', mode=mode),
             logging.StreamHandler(sys.stdout)
         ]
     )
-    return logging.getLogger()
+    return logger
+
+# === Метрики и профилирование ===
+# Время каждого этапа (чтение, разбивка, загрузка модели, вызовы apply_tts, запись на диск, кодирование)
+# копится в гистограммах. Отчёт — строки JSON (по одной на отрезок) или текст в формате Prometheus.
+# Процессы пула и пакетной обработки пишут свои строки JSON в тот же файл: путь передаётся через окружение.
+METRICS_JSONL_ENV = "TTS_METRICS_JSONL"
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+PROFILE_TOP = 25  # Сколько самых тяжёлых функций показать в логе после профилирования
+
+# К чему относится этап — по этому видно, во что упёрлась задача
+STAGE_KINDS = {
+    'model_load': 'модель', 'apply_tts': 'модель', 'pool_wait': 'модель (пул процессов)',
+    'read': 'диск', 'cache_read': 'диск', 'cache_write': 'диск', 'journal_read': 'диск', 'journal_write': 'диск',
+    'encode': 'ffmpeg', 'encode_finish': 'ffmpeg',
+    'split': 'текст', 'normalize': 'текст', 'assemble': 'аудио',
+}
+
+class Metrics:
+    """Гистограммы времени этапов и счётчики; потокобезопасно"""
+
+    def __init__(self, jsonl_path: str = None):
+        self._lock = threading.Lock()
+        self.histograms = {}  # этап → {'buckets': [...], 'sum': сек, 'count': n}
+        self.counters = {}
+        self._jsonl_path = jsonl_path
+        self._jsonl = None
+
+    def set_jsonl(self, path):
+        """Писать каждый отрезок строкой JSON в файл path (None — не писать)"""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+            self._jsonl = None
+            self._jsonl_path = str(path) if path else None
+
+    def observe(self, stage: str, seconds: float, **fields):
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = {'buckets': [0] * len(METRICS_BUCKETS), 'sum': 0.0, 'count': 0}
+            for k, bound in enumerate(METRICS_BUCKETS):
+                if seconds <= bound:
+                    hist['buckets'][k] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+            if self._jsonl_path:
+                if self._jsonl is None:
+                    self._jsonl = open(self._jsonl_path, 'a', encoding='utf-8', buffering=1)
+                record = {'ts': round(time.time(), 6), 'pid': os.getpid(), 'stage': stage,
+                          'seconds': round(seconds, 6), **fields}
+                self._jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    @contextlib.contextmanager
+    def span(self, stage: str, **fields):
+        """Замеряем время блока: with metrics.span('encode'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **fields)
+
+    def timed(self, stage: str):
+        """То же для функции целиком — декоратор"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, float]:
+        """Суммарное время по этапам на текущий момент"""
+        with self._lock:
+            return {stage: hist['sum'] for stage, hist in self.histograms.items()}
 
-logger = setup_logging()
-logger.info("=" * 60)
-logger.info("ЗАПУСК ПРОГРАММЫ")
-logger.info("=" * 60)
+    def prometheus(self) -> str:
+        """Текст в формате Prometheus (для textfile-коллектора или HTTP-ответа)"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP tts_stage_seconds Время этапов конвейера озвучки")
+            lines.append("# TYPE tts_stage_seconds histogram")
+            for stage, hist in sorted(self.histograms.items()):
+                for bound, count in zip(METRICS_BUCKETS, hist['buckets']):
+                    lines.append(f'tts_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'tts_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'tts_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+                lines.append(f'tts_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.prometheus(), encoding='utf-8')
+        os.replace(tmp, path)
+
+metrics = Metrics(os.environ.get(METRICS_JSONL_ENV))
+
+def enable_metrics_jsonl(path: Path):
+    """Включаем запись отрезков в JSON lines — и в этом процессе, и в дочерних"""
+    os.environ[METRICS_JSONL_ENV] = str(path)
+    metrics.set_jsonl(path)
+
+def stage_breakdown(before: Dict[str, float], after: Dict[str, float], wall: float) -> Dict[str, float]:
+    """Время по видам работы между двумя снимками metrics.snapshot()"""
+    kinds = {}
+    for stage, total in after.items():
+        kind = STAGE_KINDS.get(stage, stage)
+        kinds[kind] = kinds.get(kind, 0.0) + total - before.get(stage, 0.0)
+    kinds['прочее'] = max(0.0, wall - sum(kinds.values()))
+    return kinds
+
+@contextlib.contextmanager
+def profile_job(mode: str, output: Path):
+    """Профилируем блок: mode='cprofile' → output.prof, mode='torch' → output.trace.json (Chrome trace)"""
+    output = Path(output)
+    if mode == 'cprofile':
+        import io
+        import pstats
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = output.with_suffix('.prof')
+            profiler.dump_stats(str(path))
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            logger.info(f"Профиль cProfile сохранён: {path}\n{report.getvalue()}")
+    elif mode == 'torch':
+        from torch.profiler import profile, ProfilerActivity
+
+        with profile(activities=[ProfilerActivity.CPU]) as prof:
+            yield
+        path = output.with_suffix('.trace.json')
+        prof.export_chrome_trace(str(path))
+        table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=PROFILE_TOP)
+        logger.info(f"Профиль torch сохранён: {path}\n{table}")
+    else:
+        raise ValueError(f"Неизвестный режим профилирования: {mode}")
 
 # === Поиск ffmpeg ===
 def find_ffmpeg():
@@ -71,128 +241,145 @@ def find_ffmpeg():
 
     return None
 
-FFMPEG_PATH = find_ffmpeg()
+FFMPEG_PATH = None  # Заполняется get_ffmpeg_path() при первой конвертации
 
-if not FFMPEG_PATH:
-    logger.critical("❌ ffmpeg.exe не найден!")
-    logger.critical("Скачайте: https://www.gyan.dev/ffmpeg/builds/")
-    logger.critical("Распакуйте и добавьте в PATH или положите в C:\\ffmpeg\\bin\\")
-    print("\n" + "=" * 60)
-    print("⚠️  ОШИБКА: ffmpeg не найден!")
-    print("=" * 60)
-    print("\nИнструкция:")
-    print("1. Скачайте: https://www.gyan.dev/ffmpeg/builds/")
-    print("2. Распакуйте архив")
-    print("3. Скопируйте папку bin в C:\\ffmpeg\\bin\\")
-    print("   (должен быть файл C:\\ffmpeg\\bin\\ffmpeg.exe)")
-    print("\nИли добавьте ffmpeg в PATH системы")
-    print("=" * 60)
-    input("\nНажмите Enter для выхода...")
-    sys.exit(1)
+def get_ffmpeg_path() -> str:
+    """Находим и проверяем ffmpeg при первом обращении"""
+    global FFMPEG_PATH
+    if FFMPEG_PATH is not None:
+        return FFMPEG_PATH
 
-# Проверим работоспособность
-try:
-    result = subprocess.run(
-        [FFMPEG_PATH, "-version"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        timeout=5,
-        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-    )
+    path = find_ffmpeg()
+    if not path:
+        raise RuntimeError("ffmpeg не найден! Скачайте: https://www.gyan.dev/ffmpeg/builds/")
+
+    # Проверим работоспособность
+    try:
+        result = subprocess.run(
+            [path, "-version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=5,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        )
+    except Exception as e:
+        raise RuntimeError(f"ffmpeg не запускается: {e}")
     if result.returncode != 0:
-        raise Exception(f"ffmpeg вернул код {result.returncode}")
+        raise RuntimeError(f"ffmpeg не запускается: ffmpeg вернул код {result.returncode}")
     logger.info("✅ ffmpeg работает корректно")
-except Exception as e:
-    logger.critical(f"❌ ffmpeg не запускается: {e}")
-    print("\n⚠️  ffmpeg найден, но не работает!")
-    print(f"Ошибка: {e}")
+
+    FFMPEG_PATH = path
+    return FFMPEG_PATH
+
+def ensure_ffmpeg_or_exit():
+    """Для GUI: при отсутствии ffmpeg показываем инструкцию и выходим"""
+    try:
+        get_ffmpeg_path()
+        return
+    except RuntimeError as e:
+        error = e
+
+    logger.critical(f"❌ {error}")
+    if find_ffmpeg() is None:
+        logger.critical("Распакуйте и добавьте в PATH или положите в C:\\ffmpeg\\bin\\")
+        print("\n" + "=" * 60)
+        print("⚠️  ОШИБКА: ffmpeg не найден!")
+        print("=" * 60)
+        print("\nИнструкция:")
+        print("1. Скачайте: https://www.gyan.dev/ffmpeg/builds/")
+        print("2. Распакуйте архив")
+        print("3. Скопируйте папку bin в C:\\ffmpeg\\bin\\")
+        print("   (должен быть файл C:\\ffmpeg\\bin\\ffmpeg.exe)")
+        print("\nИли добавьте ffmpeg в PATH системы")
+        print("=" * 60)
+    else:
+        print("\n⚠️  ffmpeg найден, но не работает!")
+        print(f"Ошибка: {error}")
     input("\nНажмите Enter для выхода...")
     sys.exit(1)
 
-# === Импорты с проверкой ===
-logger.info("Проверка зависимостей...")
-missing_packages = []
+# === Проверка зависимостей ===
+def check_dependencies() -> List[str]:
+    """Проверяем библиотеки и возвращаем список отсутствующих пакетов"""
+    logger.info("Проверка зависимостей...")
+    missing_packages = []
 
-try:
-    import torch
-    logger.info("✅ torch")
-except ImportError:
-    missing_packages.append("torch")
-    logger.error("❌ torch не установлен")
-
-# Проверяем pydub отдельно
-try:
-    from pydub import AudioSegment
-    # Устанавливаем путь к ffmpeg ДО использования AudioSegment
-    AudioSegment.converter = FFMPEG_PATH
-    logger.info("✅ pydub (импорт и настройка ffmpeg успешны)")
-except ImportError as e:
-    if "pydub" in str(e):
-        missing_packages.append("pydub")
-        logger.error("❌ pydub не установлен")
-    else:
-        # Ошибка при импорте другого модуля внутри pydub
+    try:
+        import torch
+        logger.info("✅ torch")
+    except ImportError:
+        missing_packages.append("torch")
+        logger.error("❌ torch не установлен")
+
+    # Проверяем pydub отдельно
+    try:
+        from pydub import AudioSegment
+        # Устанавливаем путь к ffmpeg ДО использования AudioSegment
+        if FFMPEG_PATH:
+            AudioSegment.converter = FFMPEG_PATH
+        logger.info("✅ pydub (импорт и настройка ffmpeg успешны)")
+    except ImportError as e:
+        if "pydub" in str(e):
+            missing_packages.append("pydub")
+            logger.error("❌ pydub не установлен")
+        else:
+            # Ошибка при импорте другого модуля внутри pydub
+            logger.error(f"❌ pydub импортирован, но ошибка при настройке: {e}")
+            # Если ошибка связана с audioop, pydub установлен, но не может работать без ffmpeg
+            # Но мы уже установили ffmpeg, значит, это внутренняя проблема pydub
+            logger.info("✅ pydub (импорт успешен, возможна ошибка при использовании из-за отсутствия audioop)")
+    except Exception as e:
         logger.error(f"❌ pydub импортирован, но ошибка при настройке: {e}")
-        # Если ошибка связана с audioop, pydub установлен, но не может работать без ffmpeg
-        # Но мы уже установили ffmpeg, значит, это внутренняя проблема pydub
-        logger.info("✅ pydub (импорт успешен, возможна ошибка при использовании из-за отсутствия audioop)")
-except ModuleNotFoundError as e:
-    if "audioop" in str(e):
-        logger.error(f"❌ pydub импортирован, но не может найти 'audioop': {e}")
-        logger.error("   Это известная проблема в Python 3.13. Убедитесь, что ffmpeg установлен и указан в AudioSegment.converter.")
-        logger.info("✅ pydub (импорт успешен, но возможна ошибка при использовании из-за отсутствия audioop)")
-    else:
-        missing_packages.append("pydub")
-        logger.error(f"❌ pydub импортирован, но ошибка: {e}")
-except Exception as e:
-    logger.error(f"❌ pydub импортирован, но ошибка при настройке: {e}")
-    # Если ошибка связана с audioop, pydub всё равно может работать с ffmpeg
-    if "audioop" not in str(e):
-        missing_packages.append("pydub")
-
-try:
-    from tqdm import tqdm
-    logger.info("✅ tqdm")
-except ImportError:
-    missing_packages.append("tqdm")
-    logger.error("❌ tqdm не установлен")
-
-try:
-    import soundfile as sf
-    logger.info("✅ soundfile")
-except ImportError:
-    missing_packages.append("soundfile")
-    logger.error("❌ soundfile не установлен")
-
-try:
-    from docx import Document
-    logger.info("✅ python-docx")
-except ImportError:
-    missing_packages.append("python-docx")
-    logger.error("❌ python-docx не установлен")
+        # Если ошибка связана с audioop, pydub всё равно может работать с ffmpeg
+        if "audioop" not in str(e):
+            missing_packages.append("pydub")
 
-try:
-    import win32com.client
-    logger.info("✅ pywin32")
-except ImportError:
-    missing_packages.append("pywin32")
-    logger.error("❌ pywin32 не установлен")
+    try:
+        import tqdm
+        logger.info("✅ tqdm")
+    except ImportError:
+        missing_packages.append("tqdm")
+        logger.error("❌ tqdm не установлен")
 
-if missing_packages:
-    logger.critical(f"❌ Отсутствуют библиотеки: {', '.join(missing_packages)}")
-    print("\n" + "=" * 60)
-    print("⚠️  ОШИБКА: Не установлены зависимости!")
-    print("=" * 60)
-    print("\nВыполните в командной строке:")
-    print("pip install torch torchaudio pydub soundfile python-docx pywin32 tqdm scipy")
-    print("=" * 60)
-    input("\nНажмите Enter для выхода...")
-    sys.exit(1)
+    try:
+        import soundfile
+        logger.info("✅ soundfile")
+    except ImportError:
+        missing_packages.append("soundfile")
+        logger.error("❌ soundfile не установлен")
+
+    try:
+        import docx
+        logger.info("✅ python-docx")
+    except ImportError:
+        missing_packages.append("python-docx")
+        logger.error("❌ python-docx не установлен")
 
-logger.info("✅ Все зависимости установлены")
+    # pywin32 не обязателен: .doc читается без Word, Word COM — только запасной вариант на Windows
+    if sys.platform == "win32":
+        try:
+            import win32com.client
+            logger.info("✅ pywin32")
+        except ImportError:
+            logger.info("pywin32 не установлен — .doc читается без Microsoft Word")
+
+    return missing_packages
 
-# === Настройка pydub ===
-# Уже выполнено выше: AudioSegment.converter = FFMPEG_PATH
+def ensure_dependencies_or_exit():
+    """Для GUI: при отсутствии библиотек показываем инструкцию и выходим"""
+    missing_packages = check_dependencies()
+    if missing_packages:
+        logger.critical(f"❌ Отсутствуют библиотеки: {', '.join(missing_packages)}")
+        print("\n" + "=" * 60)
+        print("⚠️  ОШИБКА: Не установлены зависимости!")
+        print("=" * 60)
+        print("\nВыполните в командной строке:")
+        print("pip install torch torchaudio pydub soundfile python-docx tqdm scipy")
+        print("=" * 60)
+        input("\nНажмите Enter для выхода...")
+        sys.exit(1)
+
+    logger.info("✅ Все зависимости установлены")
 
 # === Голоса ===
 SPEAKERS_INFO = {
@@ -204,51 +391,471 @@ SPEAKERS_INFO = {
 }
 
 # === Чтение файлов ===
+TEXT_SAMPLE_BYTES = 64 * 1024  # По этому началу файла определяется кодировка
+
+def detect_encoding(file_path: Path) -> str:
+    """Определяем кодировку .txt по началу файла: UTF-8 (с BOM или без), иначе windows-1251"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(TEXT_SAMPLE_BYTES)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # final=False: образец мог оборваться посреди многобайтового символа
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1251'
+
 def read_txt(file_path: Path) -> str:
     """Читаем .txt с автоопределением кодировки"""
-    encodings = ['utf-8', 'windows-1251', 'cp1251']
-    for enc in encodings:
-        try:
-            with open(file_path, 'r', encoding=enc) as f:
-                text = f.read()
-                logger.info(f"Файл прочитан с кодировкой: {enc}")
-                return text
-        except UnicodeDecodeError:
-            continue
-    raise ValueError(f"Не удалось прочитать файл ни с одной из кодировок: {encodings}")
+    enc = detect_encoding(file_path)
+    with open(file_path, 'r', encoding=enc, errors='replace') as f:
+        text = f.read()
+    logger.info(f"Файл прочитан с кодировкой: {enc}")
+    return text
 
-def read_docx(file_path: Path) -> str:
-    """Читаем .docx"""
-    try:
-        doc = Document(file_path)
-        text = '\n'.join([para.text for para in doc.paragraphs])
-        logger.info(f"Прочитано параграфов: {len(doc.paragraphs)}")
+# === Извлечение текста из документов ===
+# .docx, .doc, .rtf и .odt читаются без Microsoft Word: .doc — встроенным разбором формата Word 97
+# (при неудаче — antiword, catdoc или LibreOffice, на Windows в последнюю очередь Word).
+# Извлечённые абзацы кэшируются по SHA-256 файла: повторный запуск не разбирает документ заново.
+EXTRACT_CACHE_ENABLED = True
+EXTRACT_CACHE_DIR = Path.home() / ".cache" / "silero" / "text_cache"
+EXTRACT_CACHE_VERSION = 3  # Меняется вместе с разбором — старые записи перестают совпадать
+DOC_CONVERTERS = ['antiword', 'catdoc', 'soffice']  # Внешние программы для .doc, если встроенный разбор не справился
+CONVERTER_TIMEOUT = 120  # секунд на один документ
+
+# Стили заголовков Word: «Heading 2», «Заголовок 2», «Title»
+_HEADING_STYLE_RE = re.compile(r'(?:heading|заголовок)\s*(\d)|^(?:title|название)$', re.IGNORECASE)
+
+def heading_level(style_name: str) -> int:
+    """Уровень заголовка по имени стиля абзаца; 0 — обычный абзац"""
+    m = _HEADING_STYLE_RE.search(style_name or '')
+    if m is None:
+        return 0
+    return int(m.group(1)) if m.group(1) else 1
+
+def _extract_docx(file_path: Path) -> List[Tuple[str, int]]:
+    from docx import Document
+
+    # Пустые параграфы отбрасывает extract_paragraphs — как и пустые строки других форматов
+    return [(para.text, heading_level(para.style.name if para.style is not None else ''))
+            for para in Document(file_path).paragraphs]
+
+class OleFile:
+    """Минимальное чтение составного файла OLE (контейнер .doc): потоки верхнего уровня по имени"""
+
+    def __init__(self, data: bytes):
+        import struct
+
+        if data[:8] != b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1':
+            raise ValueError("не файл OLE")
+        self.data = data
+        self.sector_size = 1 << struct.unpack_from('<H', data, 0x1E)[0]
+        self.mini_sector_size = 1 << struct.unpack_from('<H', data, 0x20)[0]
+        first_dir, = struct.unpack_from('<I', data, 0x30)
+        self.mini_cutoff, first_minifat, _, first_difat, num_difat = struct.unpack_from('<5I', data, 0x38)
+
+        # Таблица FAT: номера её секторов — в заголовке и в цепочке DIFAT
+        fat_sectors = [s for s in struct.unpack_from('<109I', data, 0x4C) if s < 0xFFFFFFFA]
+        per_sector = self.sector_size // 4
+        sector = first_difat
+        for _ in range(num_difat):
+            if sector >= 0xFFFFFFFA:
+                break
+            entries = struct.unpack_from(f'<{per_sector}I', self._sector(sector))
+            fat_sectors += [s for s in entries[:-1] if s < 0xFFFFFFFA]
+            sector = entries[-1]
+        self.fat = []
+        for s in fat_sectors:
+            self.fat += struct.unpack_from(f'<{per_sector}I', self._sector(s))
+
+        directory = self._chain(first_dir, self.sector_size)
+        self.entries = []
+        for offset in range(0, len(directory) - 127, 128):
+            name_len, kind = struct.unpack_from('<HB', directory, offset + 0x40)
+            left, right, child = struct.unpack_from('<3I', directory, offset + 0x44)
+            start, size = struct.unpack_from('<2I', directory, offset + 0x74)
+            name = directory[offset:offset + max(0, name_len - 2)].decode('utf-16-le', errors='replace')
+            self.entries.append((name, kind, left, right, child, start, size))
+        root = self.entries[0]
+        self.mini_stream = self._chain(root[5], self.sector_size)[:root[6]]
+        minifat = self._chain(first_minifat, self.sector_size) if first_minifat < 0xFFFFFFFA else b''
+        self.minifat = list(struct.unpack(f'<{len(minifat) // 4}I', minifat))
+
+    def _sector(self, sector: int) -> bytes:
+        offset = (sector + 1) * self.sector_size
+        return self.data[offset:offset + self.sector_size]
+
+    def _chain(self, start: int, size: int, fat: list = None, read=None) -> bytes:
+        fat = self.fat if fat is None else fat
+        read = read or self._sector
+        parts = []
+        sector = start
+        while sector < len(fat) and len(parts) <= len(fat):  # Второе условие — защита от зацикленной цепочки
+            parts.append(read(sector))
+            sector = fat[sector]
+        return b''.join(parts)
+
+    def _mini_sector(self, sector: int) -> bytes:
+        offset = sector * self.mini_sector_size
+        return self.mini_stream[offset:offset + self.mini_sector_size]
+
+    def root_streams(self) -> Dict[str, int]:
+        """Имя → номер записи каталога для потоков корня (потоки вложенных объектов не нужны)"""
+        streams = {}
+        todo = [self.entries[0][4]]
+        while todo:
+            sid = todo.pop()
+            if sid >= len(self.entries) or len(streams) > len(self.entries):
+                continue
+            name, kind, left, right = self.entries[sid][:4]
+            if kind == 2:
+                streams[name] = sid
+            todo += [left, right]
+        return streams
+
+    def read(self, name: str) -> bytes:
+        sid = self.root_streams().get(name)
+        if sid is None:
+            raise ValueError(f"нет потока {name}")
+        _, _, _, _, _, start, size = self.entries[sid]
+        if size < self.mini_cutoff:
+            return self._chain(start, self.mini_sector_size, self.minifat, self._mini_sector)[:size]
+        return self._chain(start, self.sector_size)[:size]
+
+# Служебные символы текста Word: 0x13/0x14/0x15 — начало, разделитель и конец поля
+# (читается только результат поля), остальные — переводы строк, ячейки таблиц и объекты
+_DOC_TEXT_TABLE = str.maketrans({
+    '\r': '\n', '\x0b': '\n', '\x0c': '\n', '\x07': '\n', '\x0e': '\n',
+    '\x1e': '-', '\x1f': None, '\x01': None, '\x02': None, '\x05': None, '\x08': None,
+})
+
+def _strip_doc_fields(text: str) -> str:
+    if '\x13' not in text:
         return text
-    except Exception as e:
-        logger.error(f"Ошибка чтения .docx: {e}")
-        raise
+    out = []
+    stack = []  # Для каждого открытого поля: идёт ли уже результат
+    for ch in text:
+        if ch == '\x13':
+            stack.append(False)
+        elif ch == '\x14' and stack:
+            stack[-1] = True
+        elif ch == '\x15' and stack:
+            stack.pop()
+        elif all(stack):
+            out.append(ch)
+    return ''.join(out)
+
+def _extract_doc_binary(file_path: Path) -> List[str]:
+    """Текст .doc (Word 97–2003) по таблице фрагментов (piece table) — без Word и внешних программ"""
+    import struct
+
+    with open(file_path, 'rb') as f:
+        ole = OleFile(f.read())
+    word = ole.read('WordDocument')
+    ident, nfib = struct.unpack_from('<HH', word, 0)
+    flags, = struct.unpack_from('<H', word, 0x0A)
+    if ident != 0xA5EC or nfib < 0xC1:
+        raise ValueError("формат старше Word 97")
+    if flags & 0x0100:
+        raise ValueError("документ зашифрован")
+    table = ole.read('1Table' if flags & 0x0200 else '0Table')
+
+    # FIB: после FibBase идут массивы переменной длины, их размеры записаны перед каждым
+    pos = 32
+    csw, = struct.unpack_from('<H', word, pos)
+    pos += 2 + csw * 2
+    cslw, = struct.unpack_from('<H', word, pos)
+    ccp_text, = struct.unpack_from('<i', word, pos + 2 + 3 * 4)  # Символов основного текста (без колонтитулов и сносок)
+    pos += 2 + cslw * 4 + 2
+    fc_clx, lcb_clx = struct.unpack_from('<II', word, pos + 33 * 8)
+    clx = table[fc_clx:fc_clx + lcb_clx]
+
+    # Clx: сначала блоки свойств (0x01), затем таблица фрагментов (0x02)
+    pos = 0
+    while pos < len(clx) and clx[pos] == 0x01:
+        cb, = struct.unpack_from('<H', clx, pos + 1)
+        pos += 3 + cb
+    if pos >= len(clx) or clx[pos] != 0x02:
+        raise ValueError("не найдена таблица фрагментов")
+    lcb, = struct.unpack_from('<I', clx, pos + 1)
+    plc = clx[pos + 5:pos + 5 + lcb]
+    count = (lcb - 4) // 12
+    cps = struct.unpack_from(f'<{count + 1}I', plc)
+
+    parts = []
+    for k in range(count):
+        start, end = cps[k], min(cps[k + 1], ccp_text)
+        if start >= end:
+            break
+        fc, = struct.unpack_from('<I', plc, (count + 1) * 4 + k * 8 + 2)
+        if fc & 0x40000000:
+            # Сжатый фрагмент: один байт на символ в cp1252
+            offset = (fc & 0x3FFFFFFF) // 2
+            parts.append(word[offset:offset + end - start].decode('cp1252', errors='replace'))
+        else:
+            parts.append(word[fc:fc + 2 * (end - start)].decode('utf-16-le', errors='replace'))
+    text = _strip_doc_fields(''.join(parts)).translate(_DOC_TEXT_TABLE)
+    return text.split('\n')
+
+def _extract_doc_converter(file_path: Path, converter: str) -> List[str]:
+    """Текст .doc внешней программой (antiword, catdoc или soffice из LibreOffice)"""
+    import tempfile
+
+    exe = shutil.which(converter)
+    if exe is None:
+        raise FileNotFoundError(f"{converter} не найден")
+    flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    if converter == 'soffice':
+        with tempfile.TemporaryDirectory() as tmp:
+            subprocess.run([exe, '--headless', '--convert-to', 'txt:Text (encoded):UTF8', '--outdir', tmp,
+                            str(file_path)], capture_output=True, timeout=CONVERTER_TIMEOUT, check=True,
+                           creationflags=flags)
+            text = (Path(tmp) / f"{file_path.stem}.txt").read_text(encoding='utf-8-sig')
+    else:
+        cmd = [exe, '-w', '0', '-m', 'UTF-8.txt'] if converter == 'antiword' else [exe, '-w', '-d', 'utf-8']
+        result = subprocess.run(cmd + [str(file_path)], capture_output=True, timeout=CONVERTER_TIMEOUT,
+                                check=True, creationflags=flags)
+        text = result.stdout.decode('utf-8', errors='replace')
+    return text.split('\n')
+
+def _extract_doc_word(file_path: Path) -> List[str]:
+    """Текст .doc через Word COM (только Windows с установленным Word)"""
+    import win32com.client
 
-def read_doc(file_path: Path) -> str:
-    """Читаем .doc через Word COM"""
-    logger.info("Открываем Word для чтения .doc...")
-    word = None
+    word = win32com.client.Dispatch("Word.Application")
     try:
-        word = win32com.client.Dispatch("Word.Application")
         word.Visible = False
-        doc = word.Documents.Open(str(file_path.absolute()))
+        doc = word.Documents.Open(str(file_path.absolute()), ReadOnly=True)
         text = doc.Content.Text
         doc.Close(False)
+    finally:
         word.Quit()
-        logger.info("Файл .doc прочитан успешно")
-        return text
-    except Exception as e:
-        logger.error(f"Ошибка чтения .doc: {e}")
-        if word:
-            try:
-                word.Quit()
-            except:
+    return text.translate(_DOC_TEXT_TABLE).split('\n')
+
+def _extract_doc(file_path: Path) -> List[str]:
+    backends = [('разбор Word 97', _extract_doc_binary)]
+    backends += [(name, functools.partial(_extract_doc_converter, converter=name)) for name in DOC_CONVERTERS]
+    if sys.platform == "win32":
+        backends.append(('Microsoft Word', _extract_doc_word))
+    errors = []
+    for name, extract in backends:
+        try:
+            paragraphs = extract(file_path)
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+            continue
+        logger.info(f"Файл .doc прочитан: {name}")
+        return paragraphs
+    raise ValueError(f"Не удалось открыть .doc: {'; '.join(errors)}")
+
+# Токены RTF: управляющее слово с параметром, \'hh, управляющий символ, скобка, перевод строки, текст
+_RTF_TOKEN_RE = re.compile(r"\\([a-zA-Z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-fA-F]{2})|\\([^a-zA-Z])|([{}])|[\r\n]+|([^\\{}\r\n]+)")
+# Группы, которые не читаются: шрифты, стили, сведения о документе, картинки, колонтитулы
+_RTF_SKIP_DESTINATIONS = {
+    'fonttbl', 'colortbl', 'stylesheet', 'info', 'pict', 'object', 'header', 'footer', 'headerl', 'headerr',
+    'headerf', 'footerl', 'footerr', 'footerf', 'footnote', 'annotation', 'listtable', 'listoverridetable',
+    'revtbl', 'rsidtbl', 'generator', 'xmlnstbl', 'themedata', 'colorschememapping', 'latentstyles',
+    'datastore', 'fldinst', 'filetbl', 'pgdsctbl', 'bkmkstart', 'bkmkend', 'fldtype',
+}
+_RTF_SPECIAL = {'par': '\n', 'line': '\n', 'sect': '\n', 'page': '\n', 'row': '\n', 'cell': '\n',
+                'tab': '\t', 'emdash': '—', 'endash': '–', 'bullet': '•', 'lquote': '‘', 'rquote': '’',
+                'ldblquote': '«', 'rdblquote': '»', '~': '\xa0', '_': '-', '-': ''}
+
+def _extract_rtf(file_path: Path) -> List[Tuple[str, int]]:
+    """Текст RTF: управляющие слова разбираются по спецификации, служебные группы пропускаются.
+
+    Уровень заголовка берётся из \\outlinelevel абзаца — так Word сохраняет стили заголовков.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read().decode('latin-1')
+    codepage = 'cp1252'
+    out = []
+    levels = []  # Уровень заголовка каждой законченной строки
+    level = 0
+    pending = bytearray()  # Байты \'hh: в многобайтовых кодировках символ занимает несколько
+    stack = []
+    skip = False  # Внутри пропускаемой группы
+    uc = 1        # Сколько символов после \uN — замена для старых читателей
+    to_skip = 0
+    star = False  # Только что был \*: неизвестная группа пропускается целиком
+
+    def flush():
+        if pending:
+            out.append(pending.decode(codepage, errors='replace'))
+            pending.clear()
+
+    for m in _RTF_TOKEN_RE.finditer(data):
+        word, param, hex_byte, symbol, brace, text = m.groups()
+        if hex_byte is None:
+            flush()
+        if brace == '{':
+            stack.append((skip, uc))
+            continue
+        if brace == '}':
+            skip, uc = stack.pop() if stack else (False, 1)
+            to_skip = 0
+            continue
+        if word is not None:
+            if star or word in _RTF_SKIP_DESTINATIONS:
+                skip = True
+            star = False
+            if word == 'ansicpg' and param:
+                codepage = f'cp{param}'
+                try:
+                    codecs.lookup(codepage)
+                except LookupError:
+                    codepage = 'cp1252'
+            elif word == 'uc' and param:
+                uc = int(param)
+            elif skip:
                 pass
-        raise ValueError(f"Не удалось открыть .doc: {e}\nУбедитесь, что установлен Microsoft Word.")
+            elif word == 'pard':
+                level = 0
+            elif word == 'outlinelevel' and param:
+                level = int(param) + 1 if int(param) < 9 else 0  # 9 — основной текст
+            elif word == 'u' and param:
+                out.append(chr(int(param) % 65536))
+                to_skip = uc
+            elif word in _RTF_SPECIAL:
+                out.append(_RTF_SPECIAL[word])
+                if _RTF_SPECIAL[word] == '\n':
+                    levels.append(level)
+            continue
+        if symbol is not None:
+            if symbol == '*':
+                star = True
+            elif not skip:
+                if to_skip:
+                    to_skip -= 1
+                elif symbol in _RTF_SPECIAL:
+                    out.append(_RTF_SPECIAL[symbol])
+                elif symbol in '\\{}':
+                    out.append(symbol)
+            continue
+        if skip:
+            continue
+        if hex_byte is not None:
+            if to_skip:
+                to_skip -= 1
+            else:
+                pending.append(int(hex_byte, 16))
+        elif text is not None:
+            if to_skip:
+                cut = min(to_skip, len(text))
+                to_skip -= cut
+                text = text[cut:]
+            if not text.isascii():
+                # Байты выше 0x7F без \'hh — тоже в кодировке документа
+                text = text.encode('latin-1').decode(codepage, errors='replace')
+            out.append(text)
+    flush()
+    return list(zip(''.join(out).split('\n'), levels + [level]))
+
+def _extract_odt(file_path: Path) -> List[Tuple[str, int]]:
+    """Текст .odt: абзацы и заголовки из content.xml (сноски и примечания не читаются)"""
+    import zipfile
+    import xml.etree.ElementTree as ET
+
+    text_ns = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+    office_ns = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+    skip = {f'{text_ns}note', f'{office_ns}annotation', f'{text_ns}tracked-changes'}
+
+    def inline(element, parts):
+        if element.text:
+            parts.append(element.text)
+        for child in element:
+            if child.tag == f'{text_ns}s':
+                parts.append(' ' * int(child.get(f'{text_ns}c', 1)))
+            elif child.tag == f'{text_ns}tab':
+                parts.append('\t')
+            elif child.tag == f'{text_ns}line-break':
+                parts.append('\n')
+            elif child.tag not in skip:
+                inline(child, parts)
+            if child.tail:
+                parts.append(child.tail)
+
+    with zipfile.ZipFile(file_path) as z:
+        root = ET.fromstring(z.read('content.xml'))
+    paragraphs = []
+    todo = [root]
+    while todo:
+        element = todo.pop()
+        if element.tag in (f'{text_ns}p', f'{text_ns}h'):
+            parts = []
+            inline(element, parts)
+            level = int(element.get(f'{text_ns}outline-level', 1)) if element.tag == f'{text_ns}h' else 0
+            paragraphs.append((''.join(parts), level))
+        elif element.tag not in skip:
+            todo.extend(reversed(element))
+    return paragraphs
+
+DOCUMENT_EXTRACTORS = {
+    '.docx': _extract_docx,
+    '.doc': _extract_doc,
+    '.rtf': _extract_rtf,
+    '.odt': _extract_odt,
+}
+
+_file_hash_memo = {}
+
+def get_file_hash(file_path: Path) -> str:
+    """SHA-256 содержимого файла; при тех же размере и mtime в этом запуске не пересчитывается"""
+    stat = file_path.stat()
+    memo_key = (str(file_path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hash_memo:
+        h = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        _file_hash_memo[memo_key] = h.hexdigest()
+    return _file_hash_memo[memo_key]
+
+def extract_paragraphs(file_path: Path, use_cache: bool = None) -> List[Tuple[str, int]]:
+    """Непустые абзацы документа (.docx, .doc, .rtf, .odt) с уровнем заголовка (0 — обычный абзац).
+
+    Разбор отдаёт строки или пары (текст, уровень). Результат кэшируется по хэшу файла.
+    """
+    file_path = Path(file_path)
+    ext = file_path.suffix.lower()
+    extract = DOCUMENT_EXTRACTORS.get(ext)
+    if extract is None:
+        raise ValueError(f"Неподдерживаемый формат: {ext}")
+    use_cache = EXTRACT_CACHE_ENABLED if use_cache is None else use_cache
+
+    entry = None
+    if use_cache:
+        entry = EXTRACT_CACHE_DIR / f"{get_file_hash(file_path)}_{EXTRACT_CACHE_VERSION}{ext}.json"
+        try:
+            with open(entry, 'r', encoding='utf-8') as f:
+                paragraphs = [(text, level) for text, level in json.load(f)['paragraphs']]
+            logger.info(f"Текст {file_path.name} взят из кэша извлечения")
+            return paragraphs
+        except (OSError, ValueError, KeyError):
+            pass
+
+    start = time.perf_counter()
+    try:
+        paragraphs = [(p.strip(), 0) if isinstance(p, str) else (p[0].strip(), p[1]) for p in extract(file_path)]
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка чтения {ext}: {e}")
+        raise ValueError(f"Не удалось прочитать {file_path.name}: {e}")
+    paragraphs = [(text, level) for text, level in paragraphs if text]
+    logger.info(f"Извлечено абзацев: {len(paragraphs)} за {time.perf_counter() - start:.2f} с")
+
+    if entry is not None:
+        try:
+            EXTRACT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'source': file_path.name, 'paragraphs': paragraphs}, f, ensure_ascii=False)
+            os.replace(tmp, entry)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить текст в кэш извлечения: {e}")
+    return paragraphs
 
 def read_text_file(file_path: Path) -> str:
     """Универсальный читатель"""
@@ -257,16 +864,461 @@ def read_text_file(file_path: Path) -> str:
 
     if ext == '.txt':
         return read_txt(file_path)
-    elif ext == '.docx':
-        return read_docx(file_path)
-    elif ext == '.doc':
-        return read_doc(file_path)
+    # Пустая строка между абзацами — граница абзаца для пауз при сборке аудио
+    return '\n\n'.join(text for text, _ in extract_paragraphs(file_path))
+
+# === Нормализация текста ===
+# Модель читает только слова: числа, даты, единицы, сокращения и латиницу она произносит с ошибками
+# или заметно медленнее. Перед разбивкой на предложения разворачиваем их в слова. Все выражения
+# компилируются один раз при импорте, а разбор отдельного слова (словарь ударений и ё, латиница)
+# кэшируется — повторяющиеся слова документа обрабатываются один раз.
+NORMALIZE_TEXT_ENV = "TTS_NORMALIZE"
+NORMALIZE_TEXT = os.environ.get(NORMALIZE_TEXT_ENV, '1') != '0'
+NORMALIZE_LATIN = True                    # Латиницу — кириллицей, короткие аббревиатуры — по буквам
+PRONUNCIATION_DICT_NAME = "tts_dictionary.txt"  # Рядом со скриптом: «слово=сл+ово» или «все=всё»
+WORD_CACHE_SIZE = 100_000
+
+_UNITS = ['ноль', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять', 'десять',
+          'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать', 'пятнадцать', 'шестнадцать',
+          'семнадцать', 'восемнадцать', 'девятнадцать']
+_TENS = ['', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят', 'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто']
+_HUNDREDS = ['', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот', 'шестьсот', 'семьсот', 'восемьсот', 'девятьсот']
+_GENDER_UNITS = {'f': {1: 'одна', 2: 'две'}, 'n': {1: 'одно'}}
+_SCALES = [
+    (10 ** 9, ('миллиард', 'миллиарда', 'миллиардов'), 'm', 'миллиардн'),
+    (10 ** 6, ('миллион', 'миллиона', 'миллионов'), 'm', 'миллионн'),
+    (10 ** 3, ('тысяча', 'тысячи', 'тысяч'), 'f', 'тысячн'),
+]
+
+# Основы порядковых числительных и родительный падеж для сложных («двухсотпятидесятитысячный»)
+_ORD_UNITS = ['нулев', 'перв', 'втор', 'трет', 'четвёрт', 'пят', 'шест', 'седьм', 'восьм', 'девят', 'десят',
+              'одиннадцат', 'двенадцат', 'тринадцат', 'четырнадцат', 'пятнадцат', 'шестнадцат',
+              'семнадцат', 'восемнадцат', 'девятнадцат']
+_ORD_TENS = ['', '', 'двадцат', 'тридцат', 'сороков', 'пятидесят', 'шестидесят', 'семидесят',
+             'восьмидесят', 'девяност']
+_ORD_HUNDREDS = ['', 'сот', 'двухсот', 'трёхсот', 'четырёхсот', 'пятисот', 'шестисот', 'семисот',
+                 'восьмисот', 'девятисот']
+_GEN_UNITS = ['', 'одно', 'двух', 'трёх', 'четырёх', 'пяти', 'шести', 'семи', 'восьми', 'девяти', 'десяти',
+              'одиннадцати', 'двенадцати', 'тринадцати', 'четырнадцати', 'пятнадцати', 'шестнадцати',
+              'семнадцати', 'восемнадцати', 'девятнадцати']
+_GEN_TENS = ['', '', 'двадцати', 'тридцати', 'сорока', 'пятидесяти', 'шестидесяти', 'семидесяти',
+             'восьмидесяти', 'девяноста']
+_STRESSED_ORD = {'нулев', 'втор', 'шест', 'седьм', 'восьм', 'сороков'}
+# Окончания порядкового: (обычная основа, ударное окончание, «трет»)
+_ORD_ENDINGS = {
+    'nom_m': ('ый', 'ой', 'ий'), 'nom_f': ('ая', 'ая', 'ья'), 'nom_n': ('ое', 'ое', 'ье'),
+    'nom_pl': ('ые', 'ые', 'ьи'), 'gen_m': ('ого', 'ого', 'ьего'), 'dat_m': ('ому', 'ому', 'ьему'),
+    'prep_m': ('ом', 'ом', 'ьем'), 'gen_pl': ('ых', 'ых', 'ьих'), 'acc_f': ('ую', 'ую', 'ью'),
+}
+# Окончание после дефиса в «5-й», «2-го» → форма
+_ORD_SUFFIXES = {
+    'й': 'nom_m', 'ый': 'nom_m', 'ой': 'nom_m', 'ий': 'nom_m', 'я': 'nom_f', 'ая': 'nom_f',
+    'е': 'nom_n', 'ое': 'nom_n', 'го': 'gen_m', 'ого': 'gen_m', 'му': 'dat_m', 'ому': 'dat_m',
+    'м': 'prep_m', 'ом': 'prep_m', 'х': 'gen_pl', 'ых': 'gen_pl', 'ю': 'acc_f', 'ую': 'acc_f',
+}
+_MONTHS = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля', 'августа', 'сентября',
+           'октября', 'ноября', 'декабря']
+
+# Единицы после числа: формы для 1 / 2–4 / 5+ и род (для «одна тонна», «две минуты»)
+NORMALIZE_UNITS = {
+    '%': (('процент', 'процента', 'процентов'), 'm'),
+    '°C': (('градус Цельсия', 'градуса Цельсия', 'градусов Цельсия'), 'm'),
+    '°С': (('градус Цельсия', 'градуса Цельсия', 'градусов Цельсия'), 'm'),
+    '°': (('градус', 'градуса', 'градусов'), 'm'),
+    'мг': (('миллиграмм', 'миллиграмма', 'миллиграммов'), 'm'),
+    'г': (('грамм', 'грамма', 'граммов'), 'm'),
+    'кг': (('килограмм', 'килограмма', 'килограммов'), 'm'),
+    'т': (('тонна', 'тонны', 'тонн'), 'f'),
+    'мм': (('миллиметр', 'миллиметра', 'миллиметров'), 'm'),
+    'см': (('сантиметр', 'сантиметра', 'сантиметров'), 'm'),
+    'м': (('метр', 'метра', 'метров'), 'm'),
+    'км': (('километр', 'километра', 'километров'), 'm'),
+    'км/ч': (('километр в час', 'километра в час', 'километров в час'), 'm'),
+    'мл': (('миллилитр', 'миллилитра', 'миллилитров'), 'm'),
+    'л': (('литр', 'литра', 'литров'), 'm'),
+    'мс': (('миллисекунда', 'миллисекунды', 'миллисекунд'), 'f'),
+    'сек': (('секунда', 'секунды', 'секунд'), 'f'),
+    'мин': (('минута', 'минуты', 'минут'), 'f'),
+    'ч': (('час', 'часа', 'часов'), 'm'),
+    'руб': (('рубль', 'рубля', 'рублей'), 'm'),
+    '₽': (('рубль', 'рубля', 'рублей'), 'm'),
+    'коп': (('копейка', 'копейки', 'копеек'), 'f'),
+    '$': (('доллар', 'доллара', 'долларов'), 'm'),
+    '€': (('евро', 'евро', 'евро'), 'n'),
+    'шт': (('штука', 'штуки', 'штук'), 'f'),
+    'тыс': (('тысяча', 'тысячи', 'тысяч'), 'f'),
+    'млн': (('миллион', 'миллиона', 'миллионов'), 'm'),
+    'млрд': (('миллиард', 'миллиарда', 'миллиардов'), 'm'),
+    'КБ': (('килобайт', 'килобайта', 'килобайт'), 'm'),
+    'МБ': (('мегабайт', 'мегабайта', 'мегабайт'), 'm'),
+    'ГБ': (('гигабайт', 'гигабайта', 'гигабайт'), 'm'),
+    'ТБ': (('терабайт', 'терабайта', 'терабайт'), 'm'),
+    'Гц': (('герц', 'герца', 'герц'), 'm'),
+    'кГц': (('килогерц', 'килогерца', 'килогерц'), 'm'),
+    'МГц': (('мегагерц', 'мегагерца', 'мегагерц'), 'm'),
+    'ГГц': (('гигагерц', 'гигагерца', 'гигагерц'), 'm'),
+    'Вт': (('ватт', 'ватта', 'ватт'), 'm'),
+    'кВт': (('киловатт', 'киловатта', 'киловатт'), 'm'),
+}
+_SCALE_UNITS = {'тыс', 'млн', 'млрд'}  # «5 млн руб.» → «пять миллионов рублей»
+
+NORMALIZE_ABBREVIATIONS = {
+    'т.е.': 'то есть', 'т.д.': 'так далее', 'т.п.': 'тому подобное', 'т.к.': 'так как',
+    'т.н.': 'так называемый', 'т.ч.': 'том числе', 'и др.': 'и другие', 'напр.': 'например',
+    'см.': 'смотри', 'стр.': 'страница', 'рис.': 'рисунок', 'табл.': 'таблица', 'гл.': 'глава',
+    'им.': 'имени', 'ул.': 'улица', 'проф.': 'профессор', 'акад.': 'академик', 'пр.': 'проспект',
+    'и пр.': 'и прочее',
+    'г.': 'город',  # только перед названием с большой буквы; год после числа разбирается раньше
+}
+# Сокращения перед именем и названием: их точка никогда не конец предложения
+_NAME_ABBREVIATIONS = {'ул.', 'им.', 'проф.', 'акад.', 'г.', 'пр.'}
+NORMALIZE_SYMBOLS = {'№': ' номер ', '§': ' параграф ', '&': ' и ', '\u00a0': ' ', '\u202f': ' '}
+
+_LATIN_LETTERS = {
+    'a': 'эй', 'b': 'би', 'c': 'си', 'd': 'ди', 'e': 'и', 'f': 'эф', 'g': 'джи', 'h': 'эйч', 'i': 'ай',
+    'j': 'джей', 'k': 'кей', 'l': 'эл', 'm': 'эм', 'n': 'эн', 'o': 'оу', 'p': 'пи', 'q': 'кью', 'r': 'ар',
+    's': 'эс', 't': 'ти', 'u': 'ю', 'v': 'ви', 'w': 'дабл-ю', 'x': 'экс', 'y': 'уай', 'z': 'зед',
+}
+# Сочетания букв проверяются раньше одиночных (упорядочено по длине в _LATIN_RULE_RE)
+_LATIN_RULES = {
+    'sch': 'ш', 'tch': 'ч', 'sh': 'ш', 'ch': 'ч', 'th': 'т', 'ph': 'ф', 'ck': 'к', 'qu': 'кв', 'kh': 'х',
+    'zh': 'ж', 'ts': 'ц', 'oo': 'у', 'ee': 'и', 'ea': 'и', 'ou': 'ау', 'ow': 'оу', 'ew': 'ью', 'ai': 'эй', 'ay': 'эй',
+    'ey': 'ей', 'ya': 'я', 'yu': 'ю', 'yo': 'ё', 'ce': 'се', 'ci': 'си', 'cy': 'си', 'ge': 'дже', 'gi': 'джи',
+    'a': 'а', 'b': 'б', 'c': 'к', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'х', 'i': 'и', 'j': 'дж',
+    'k': 'к', 'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'к', 'r': 'р', 's': 'с', 't': 'т',
+    'u': 'у', 'v': 'в', 'w': 'в', 'x': 'кс', 'y': 'и', 'z': 'з',
+}
+# Частые слова технических текстов, которые по правилам читаются неверно
+NORMALIZE_LATIN_WORDS = {
+    'python': 'пайтон', 'windows': 'виндоус', 'linux': 'линукс', 'microsoft': 'майкрософт',
+    'word': 'ворд', 'google': 'гугл', 'github': 'гитхаб', 'git': 'гит', 'apple': 'эппл', 'iphone': 'айфон',
+    'android': 'андроид', 'java': 'джава', 'javascript': 'джаваскрипт', 'docker': 'докер', 'server': 'сервер',
+    'online': 'онлайн', 'offline': 'офлайн', 'email': 'имейл', 'e-mail': 'имейл', 'wi-fi': 'вай-фай',
+    'wifi': 'вай-фай', 'ok': 'окей', 'the': 'зе', 'and': 'энд', 'of': 'оф', 'silero': 'силеро',
+    'torch': 'торч', 'pytorch': 'пайторч', 'ffmpeg': 'эф-эф-эмпег',
+}
+
+_NUMBER_GROUPS_RE = re.compile(r'(?<![\d,.])\d{1,3}(?:[ \u00a0\u202f]\d{3})+(?![\d,]|\.\d)')
+_DATE_RE = re.compile(r'(?<![\d.])(\d{1,2})\.(\d{1,2})\.(\d{4})(?![\d.]\d)')
+_DAY_MONTH_RE = re.compile(r'(?<![\d.,])(\d{1,2})(\s+)(' + '|'.join(_MONTHS) + r')\b')
+_YEAR_RE = re.compile(r'(?<![\d.,])(\d{3,4})(\s*)(году|года|год\b|гг?\.(?:\s+н\.\s?э\.)?)'
+                      r'(?!\s*(?:назад|спустя|тому)\b)')
+_DECADE_RE = re.compile(r'(?<![\d.,])(\d+)-е(\s+(?:годы|годах|гг\.))')
+_ORDINAL_RE = re.compile(r'(?<![\d.,])(\d+)-(' + '|'.join(sorted(_ORD_SUFFIXES, key=len, reverse=True)) +
+                         r')(?![а-яё])')
+_TIME_RE = re.compile(r'(?<![\d:.,])([01]?\d|2[0-3]):([0-5]\d)(?![\d:])')
+_CURRENCY_PREFIX_RE = re.compile(r'([$€₽])\s?(\d+(?:,\d+)?)')
+_UNIT_ALT = '|'.join(re.escape(u) for u in sorted(NORMALIZE_UNITS, key=len, reverse=True))
+_UNIT_RE = re.compile(r'(?<![\d.,])(\d+(?:,\d+)?)[ \u00a0\u202f]?(' + _UNIT_ALT + r')(?![а-яёА-ЯЁa-zA-Z])'
+                      r'(?:\.?[ \u00a0\u202f]?(' + _UNIT_ALT + r')(?![а-яёА-ЯЁa-zA-Z]))?(?:\.(?=\s+[а-яё]))?')
+# «1/2» — дробь, «5/2» (номер дома, счёт) — «пять дробь два»; единица после дроби — в родительном падеже
+_FRACTION_RE = re.compile(r'(?<![\d/.,])(\d{1,3})/(\d{1,3})(?![\d/])'
+                          r'(?:[ \u00a0\u202f]?(' + _UNIT_ALT + r')(?![а-яёА-ЯЁa-zA-Z])(?:\.(?=\s+[а-яё]))?)?')
+# «г.» после числа — год, если рядом слово времени или в предложении ничего не говорит о массе
+_YEARS_FORMS = ('год', 'года', 'лет')
+_TIME_AFTER_RE = re.compile(r'\.?\s*(?:назад|спустя|тому)\b', re.IGNORECASE)
+_TIME_BEFORE_RE = re.compile(r'(?:через|спустя|за|в течение|на протяжении|более|менее)\s+$', re.IGNORECASE)
+_MASS_CONTEXT_RE = re.compile(
+    r'(?<![а-яё])(?:вес|весит|масс|грамм|килограмм|миллиграмм|кг|мг|порци|рецепт|ингредиент|сахар|мук|масл|соли|'
+    r'белк|жир|углевод|веществ|препарат|доз|смес)', re.IGNORECASE)
+_DOTTED_RE = re.compile(r'(?<![\d.,])\d+(?:\.\d+)+(?![\d]|\.\d)')
+_DECIMAL_RE = re.compile(r'(?<![\d.,])(\d+),(\d+)(?![\d]|,\d)')
+_NEGATIVE_RE = re.compile(r'(?<![^\s(])[-−](?=\d)')
+_INTEGER_RE = re.compile(r'\d+')
+# Число перед этими словами читается в женском роде: «двадцать одна тысяча», «две минуты»
+_FEMININE_NEXT_RE = re.compile(r'\s*(?:тысяч|минут|секунд|недел|книг|страниц|глав|строк|копе|штук|тонн)')
+_ABBREVIATION_ALT = '|'.join(
+    r'\.\s?'.join(re.escape(part) for part in key.rstrip('.').split('.')) + r'\.'
+    for key in sorted(NORMALIZE_ABBREVIATIONS, key=len, reverse=True))
+_ABBREVIATION_RE = re.compile(r'(?<![\dа-яёА-ЯЁ])(?<!\d\s)(' + _ABBREVIATION_ALT + r')', re.IGNORECASE)
+_ABBREVIATION_KEYS = {re.sub(r'\s', '', k): v for k, v in NORMALIZE_ABBREVIATIONS.items()}
+_SYMBOL_RE = re.compile('|'.join(re.escape(s) for s in NORMALIZE_SYMBOLS))
+_LATIN_RULE_RE = re.compile('|'.join(sorted(_LATIN_RULES, key=len, reverse=True)))
+_WORD_RE = re.compile(r"[A-Za-z]+(?:['’-][A-Za-z]+)*|[а-яА-ЯёЁ]+")
+_LATIN_RE = re.compile(r'[A-Za-z]')
+_DIGIT_RE = re.compile(r'\d')
+_SPACES_RE = re.compile(r'[ \t]{2,}')
+
+def _plural(n: int, forms: Tuple[str, str, str]) -> str:
+    """Форма слова для числа n: 1 метр, 2 метра, 5 метров"""
+    if 11 <= n % 100 <= 14:
+        return forms[2]
+    if n % 10 == 1:
+        return forms[0]
+    if 2 <= n % 10 <= 4:
+        return forms[1]
+    return forms[2]
+
+def _hundreds_words(n: int, gender: str = 'm') -> List[str]:
+    words = []
+    if n >= 100:
+        words.append(_HUNDREDS[n // 100])
+        n %= 100
+    if n >= 20:
+        words.append(_TENS[n // 10])
+        n %= 10
+    if n:
+        words.append(_GENDER_UNITS.get(gender, {}).get(n, _UNITS[n]))
+    return words
+
+@functools.lru_cache(maxsize=WORD_CACHE_SIZE)
+def number_to_words(n: int, gender: str = 'm') -> str:
+    """Количественное числительное: 2024 → «две тысячи двадцать четыре». gender — m, f или n."""
+    if n < 0:
+        return 'минус ' + number_to_words(-n, gender)
+    if n == 0:
+        return _UNITS[0]
+    if n >= 10 ** 12:
+        # Такие числа в тексте — номера и коды: читаем по цифрам
+        return ' '.join(_UNITS[int(d)] for d in str(n))
+    words = []
+    for scale, forms, scale_gender, _ in _SCALES:
+        count, n = divmod(n, scale)
+        if count == 1 and scale == 1000:
+            words.append(forms[0])  # «тысяча девятьсот», а не «одна тысяча девятьсот»
+        elif count:
+            words += _hundreds_words(count, scale_gender) + [_plural(count, forms)]
+    words += _hundreds_words(n, gender)
+    return ' '.join(words)
+
+def _ordinal_ending(stem: str, form: str) -> str:
+    endings = _ORD_ENDINGS[form]
+    if stem == 'трет':
+        return stem + endings[2]
+    return stem + endings[1 if stem in _STRESSED_ORD else 0]
+
+@functools.lru_cache(maxsize=WORD_CACHE_SIZE)
+def ordinal_to_words(n: int, form: str = 'nom_m') -> str:
+    """Порядковое числительное: (2024, 'gen_m') → «две тысячи двадцать четвёртого». Формы — _ORD_ENDINGS."""
+    if n == 0 or n >= 10 ** 12:
+        return _ordinal_ending(_ORD_UNITS[0], form) if n == 0 else number_to_words(n)
+    last = n % 1000
+    if last:
+        head = number_to_words(n - last).split() if n - last else []
+        hundreds, rest = divmod(last, 100)
+        if not rest:
+            return ' '.join(head + [_ordinal_ending(_ORD_HUNDREDS[hundreds], form)])
+        if hundreds:
+            head.append(_HUNDREDS[hundreds])
+        if rest < 20:
+            stem = _ORD_UNITS[rest]
+        elif rest % 10 == 0:
+            stem = _ORD_TENS[rest // 10]
+        else:
+            head.append(_TENS[rest // 10])
+            stem = _ORD_UNITS[rest % 10]
+        return ' '.join(head + [_ordinal_ending(stem, form)])
+    # Круглое число тысяч, миллионов, миллиардов — одним словом: «двухтысячный», «стопятидесятимиллионный»
+    for scale, _, _, scale_stem in reversed(_SCALES):
+        count = (n // scale) % 1000
+        if not count:
+            continue
+        head = number_to_words(n - count * scale).split() if n - count * scale else []
+        hundreds, rest = divmod(count, 100)
+        prefix = ''
+        if count > 1:
+            prefix = ('сто' if hundreds == 1 else _ORD_HUNDREDS[hundreds]) if hundreds else ''
+            prefix += _GEN_UNITS[rest] if rest < 20 else _GEN_TENS[rest // 10] + _GEN_UNITS[rest % 10]
+        return ' '.join(head + [_ordinal_ending(prefix + scale_stem, form)])
+
+def _fraction_words(integer: str, fraction: str, gender: str = 'f') -> str:
+    """«2,5» → «две целых пять десятых»; больше трёх знаков после запятой читаем по цифрам"""
+    whole = int(integer)
+    if len(fraction) > 3:
+        return f"{number_to_words(whole, gender)} запятая " + ' '.join(_UNITS[int(d)] for d in fraction)
+    part = int(fraction)
+    denominator = ('десят', 'сот', 'тысячн')[len(fraction) - 1]
+    return (f"{number_to_words(whole, 'f')} {_plural(whole, ('целая', 'целых', 'целых'))} "
+            f"{number_to_words(part, 'f')} {_plural(part, (denominator + 'ая', denominator + 'ых', denominator + 'ых'))}")
+
+def _spaced(match, words: str) -> str:
+    """Отделяем слова пробелом от соседних букв: «v5» → «v пять»"""
+    text = match.string
+    if match.start() and text[match.start() - 1].isalpha():
+        words = ' ' + words
+    if match.end() < len(text) and text[match.end()].isalpha():
+        words += ' '
+    return words
+
+def _replace_date(m) -> str:
+    day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return m.group(0)
+    return f"{ordinal_to_words(day, 'nom_n')} {_MONTHS[month - 1]} {ordinal_to_words(year, 'gen_m')} года"
+
+def _replace_year(m) -> str:
+    word = m.group(3)
+    if word == 'году':
+        return f"{ordinal_to_words(int(m.group(1)), 'prep_m')}{m.group(2)}году"
+    if word == 'год':
+        return f"{ordinal_to_words(int(m.group(1)), 'nom_m')}{m.group(2)}год"
+    era = ' нашей эры' if 'н' in word else ''
+    if word.startswith('гг'):
+        return f"{ordinal_to_words(int(m.group(1)), 'gen_m')} годов{era}"
+    return f"{ordinal_to_words(int(m.group(1)), 'gen_m')} года{era}"
+
+def _replace_time(m) -> str:
+    hours, minutes = int(m.group(1)), m.group(2)
+    if minutes == '00':
+        return f"{number_to_words(hours)} ноль ноль"
+    spoken = number_to_words(int(minutes), 'f')
+    return f"{number_to_words(hours)} {'ноль ' + spoken if minutes[0] == '0' else spoken}"
+
+def _sentence_around(text: str, start: int, end: int) -> str:
+    """Предложение (строка) вокруг [start, end) без самого совпадения"""
+    left = max(text.rfind('\n', 0, start), *(text.rfind(c + ' ', 0, start) for c in '.!?'))
+    right = min([i for i in (text.find('\n', end), *(text.find(c + ' ', end) for c in '!?')) if i >= 0]
+                or [len(text)])
+    return text[left + 1:start] + ' ' + text[end:right]
+
+def _grams_mean_years(m, dotted: bool) -> bool:
+    """«5 г. назад» — годы: после числа «г» — год, если рядом слово времени или (с точкой) нет речи о массе"""
+    text = m.string
+    if _TIME_AFTER_RE.match(text, m.end(2)) or _TIME_BEFORE_RE.search(text, 0, m.start(1)):
+        return True
+    return dotted and not _MASS_CONTEXT_RE.search(_sentence_around(text, m.start(1), m.end(2)))
+
+def _replace_unit(m) -> str:
+    # Точку сокращения («руб.») перед продолжением предложения съедает выражение — это не конец фразы
+    number, unit, second = m.group(1), m.group(2), m.group(3)
+    forms, gender = NORMALIZE_UNITS[unit]
+    if unit == 'г' and not second and _grams_mean_years(m, m.string[m.end(2):m.end(2) + 1] == '.'):
+        forms = _YEARS_FORMS
+    if ',' in number:
+        words = f"{_fraction_words(*number.split(','))} {forms[1]}"
+        count = None
     else:
-        raise ValueError(f"Неподдерживаемый формат: {ext}")
+        count = int(number)
+        words = f"{number_to_words(count, gender)} {_plural(count, forms)}"
+    if second:
+        if unit in _SCALE_UNITS:
+            words += ' ' + NORMALIZE_UNITS[second][0][2 if count is not None else 1]
+        else:
+            words += ' ' + second
+    return _spaced(m, words)
+
+def _replace_fraction(m) -> str:
+    numerator, denominator, unit = int(m.group(1)), int(m.group(2)), m.group(3)
+    if 0 < numerator < denominator:
+        form = 'nom_f' if numerator % 10 == 1 and numerator % 100 != 11 else 'gen_pl'
+        words = f"{number_to_words(numerator, 'f')} {ordinal_to_words(denominator, form)}"
+    else:
+        words = f"{number_to_words(numerator)} дробь {number_to_words(denominator)}"
+    if unit:
+        words += ' ' + NORMALIZE_UNITS[unit][0][1]
+    return _spaced(m, words)
+
+def _replace_abbreviation(m) -> str:
+    original = m.group(1)
+    key = re.sub(r'\s', '', original).lower()
+    # С большой буквы — только первая («См.», «Т.к.»): «Т.Н. Иванова» и «Г. Иванов» — инициалы
+    if original[1:] != original[1:].lower() or (original[0].isupper() and key == 'г.'):
+        return original
+    words = _ABBREVIATION_KEYS[key]
+    rest = m.string[m.end():]
+    if key == 'г.':
+        return words + ' ' if rest.lstrip()[:1].isupper() else original
+    if original[0].isupper():
+        words = words[0].upper() + words[1:]
+    # Точка сокращения — ещё и конец предложения только в конце текста или строки
+    if key not in _NAME_ABBREVIATIONS and (not rest.strip() or rest.lstrip(' \t')[:1] == '\n'):
+        words += '.'
+    return words
+
+def _replace_integer(m) -> str:
+    digits = m.group(0)
+    if len(digits) > 1 and digits[0] == '0':
+        return _spaced(m, ' '.join(_UNITS[int(d)] for d in digits))
+    gender = 'f' if _FEMININE_NEXT_RE.match(m.string, m.end()) else 'm'
+    return _spaced(m, number_to_words(int(digits), gender))
+
+@functools.lru_cache(maxsize=1)
+def load_pronunciation_dictionary() -> Dict[str, str]:
+    """Словарь ударений и ё: {слово в нижнем регистре, ё → е: замена}. Читается один раз."""
+    folder = Path(sys.executable).parent if getattr(sys, 'frozen', False) else Path(__file__).parent
+    path = folder / PRONUNCIATION_DICT_NAME
+    entries = {}
+    if not path.is_file():
+        return entries
+    with open(path, 'r', encoding=detect_encoding(path)) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            word, sep, replacement = line.partition('=')
+            if sep and word.strip() and replacement.strip():
+                entries[word.strip().lower().replace('ё', 'е')] = replacement.strip()
+    logger.info(f"Словарь произношения: {path.name}, {len(entries)} слов")
+    return entries
+
+def transliterate_latin(word: str) -> str:
+    """Латинское слово кириллицей: известные слова — по словарю, аббревиатуры — по буквам, остальное — по правилам"""
+    lower = word.lower()
+    if lower in NORMALIZE_LATIN_WORDS:
+        return NORMALIZE_LATIN_WORDS[lower]
+    if (word.isupper() and len(word) <= 5) or len(word) == 1:
+        return '-'.join(_LATIN_LETTERS[c] for c in lower if c in _LATIN_LETTERS)
+    if len(lower) > 3 and lower.endswith('e') and lower[-2] not in 'aeiouy':
+        lower = lower[:-1]  # Немая e на конце: code → код
+    return _LATIN_RULE_RE.sub(lambda m: _LATIN_RULES[m.group(0)], lower)
+
+@functools.lru_cache(maxsize=WORD_CACHE_SIZE)
+def _respell_word(word: str) -> str:
+    if _LATIN_RE.match(word):
+        replacement = transliterate_latin(word) if NORMALIZE_LATIN else None
+    else:
+        replacement = load_pronunciation_dictionary().get(word.lower().replace('ё', 'е'))
+    if replacement is None:
+        return word
+    if word[:1].isupper() and not word.isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+def normalize_text(text: str) -> str:
+    """Числа, даты, время, единицы, сокращения и латиница → слова; ударения и ё — по словарю"""
+    text = _SYMBOL_RE.sub(lambda m: NORMALIZE_SYMBOLS[m.group(0)], text)
+    if _DIGIT_RE.search(text):
+        text = _NUMBER_GROUPS_RE.sub(lambda m: re.sub(r'\s', '', m.group(0)), text)
+        text = _DATE_RE.sub(_replace_date, text)
+        text = _DAY_MONTH_RE.sub(lambda m: ordinal_to_words(int(m.group(1)), 'nom_n') + m.group(2) + m.group(3), text)
+        text = _YEAR_RE.sub(_replace_year, text)
+        text = _DECADE_RE.sub(lambda m: ordinal_to_words(int(m.group(1)), 'nom_pl') + m.group(2), text)
+        text = _ORDINAL_RE.sub(lambda m: _spaced(m, ordinal_to_words(int(m.group(1)), _ORD_SUFFIXES[m.group(2)])),
+                               text)
+        text = _TIME_RE.sub(_replace_time, text)
+    if '.' in text:
+        text = _ABBREVIATION_RE.sub(_replace_abbreviation, text)
+    if _DIGIT_RE.search(text):
+        text = _NEGATIVE_RE.sub('минус ', text)
+        text = _CURRENCY_PREFIX_RE.sub(r'\2 \1', text)
+        text = _FRACTION_RE.sub(_replace_fraction, text)
+        text = _UNIT_RE.sub(_replace_unit, text)
+        text = _DOTTED_RE.sub(lambda m: _spaced(m, ' точка '.join(
+            number_to_words(int(part)) for part in m.group(0).split('.'))), text)
+        text = _DECIMAL_RE.sub(lambda m: _spaced(m, _fraction_words(m.group(1), m.group(2))), text)
+        text = _INTEGER_RE.sub(_replace_integer, text)
+    if (NORMALIZE_LATIN and _LATIN_RE.search(text)) or load_pronunciation_dictionary():
+        text = _WORD_RE.sub(lambda m: _respell_word(m.group(0)), text)
+    return _SPACES_RE.sub(' ', text)
+
+def normalization_cache_ratio() -> float:
+    """Доля слов, взятых из кэша нормализации (с начала работы процесса)"""
+    info = _respell_word.cache_info()
+    total = info.hits + info.misses
+    return info.hits / total if total else 0.0
+
+def set_text_normalization(enabled: bool):
+    """Включаем или выключаем нормализацию для этого процесса и дочерних (пул, пакетный режим)"""
+    global NORMALIZE_TEXT
+    os.environ[NORMALIZE_TEXT_ENV] = '1' if enabled else '0'
+    NORMALIZE_TEXT = enabled
 
 # === Разбивка на предложения ===
 def split_into_sentences(text: str) -> List[str]:
     """Разбиваем текст на предложения по . ! ? — – - : ... , (многоточие, запятая)"""
+    result = _split_fragments(text)
+    logger.info(f"Текст разбит на {len(result)} предложений")
+    return result
+
+def _split_fragments(text: str) -> List[str]:
     # Убираем лишние пробелы и переводы строк, заменяя на один пробел
     text = re.sub(r'\s+', ' ', text).strip()
 
@@ -281,9 +1333,7 @@ def split_into_sentences(text: str) -> List[str]:
     sentences = processed_text.split(marker)
 
     # Убираем пустые строки и лишние пробелы
-    result = [s.strip() for s in sentences if s.strip()]
-    logger.info(f"Текст разбит на {len(result)} предложений")
-    return result
+    return [s.strip() for s in sentences if s.strip()]
 
 def group_sentences(sentences: List[str], max_chars: int = 4900) -> List[str]:
     """Группируем предложения в чанки до max_chars символов"""
@@ -308,6 +1358,426 @@ def group_sentences(sentences: List[str], max_chars: int = 4900) -> List[str]:
     logger.info(f"Создано {len(chunks)} чанков для озвучки")
     return chunks
 
+# === Планирование чанков ===
+# split_into_sentences режет и по запятым, тире, двоеточиям — получаются обрывки в несколько символов,
+# и на каждый уходит отдельный вызов модели. Планировщик собирает обрывки обратно в предложения
+# и склеивает целые предложения в чанки до CHUNK_TARGET_CHARS, не превышая SILERO_MAX_CHARS.
+CHUNK_TARGET_CHARS = 200   # Желаемая длина чанка (0 — по одному предложению)
+SILERO_MAX_CHARS = 900     # Предел длины текста для одного вызова apply_tts (с запасом)
+
+_SENTENCE_END_RE = re.compile(r'[.!?…]+["»”)\]]*$')
+
+def _split_long_fragment(text: str, max_chars: int) -> List[str]:
+    """Режем слишком длинный фрагмент по пробелам (крайний случай — по max_chars символов)"""
+    pieces = []
+    current = ''
+    for word in text.split():
+        while len(word) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def plan_chunks(fragments: List[str], target_chars: int = None, max_chars: int = None) -> List[str]:
+    """Склеиваем фрагменты из split_into_sentences в чанки для синтеза.
+
+    Граница чанка всегда приходится на конец предложения (. ! ? …). Предложение длиннее max_chars
+    режется по запятым и тире, а фрагмент длиннее max_chars — по пробелам.
+    """
+    target_chars = CHUNK_TARGET_CHARS if target_chars is None else target_chars
+    max_chars = max_chars or SILERO_MAX_CHARS
+    target_chars = min(target_chars, max_chars)
+
+    # 1. Собираем обрывки в предложения по жёстким границам
+    sentences = []
+    parts = []
+    for fragment in fragments:
+        if not fragment:
+            continue
+        parts.append(fragment)
+        if _SENTENCE_END_RE.search(fragment):
+            sentences.append(parts)
+            parts = []
+    if parts:
+        sentences.append(parts)
+
+    # 2. Слишком длинные предложения режем по мягким границам
+    units = []
+    for parts in sentences:
+        sentence = ' '.join(parts)
+        if len(sentence) <= max_chars:
+            units.append(sentence)
+            continue
+        piece = ''
+        for fragment in parts:
+            for sub in ([fragment] if len(fragment) <= max_chars else _split_long_fragment(fragment, max_chars)):
+                if piece and len(piece) + 1 + len(sub) > max_chars:
+                    units.append(piece)
+                    piece = sub
+                else:
+                    piece = f"{piece} {sub}" if piece else sub
+        if piece:
+            units.append(piece)
+
+    # 3. Склеиваем целые предложения до целевой длины
+    chunks = []
+    current = ''
+    for unit in units:
+        if current and len(current) + 1 + len(unit) > target_chars:
+            chunks.append(current)
+            current = unit
+        else:
+            current = f"{current} {unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+# Абзац — пустая строка или перевод строки после конца предложения.
+# Перевод строки посреди предложения (текст с жёстким переносом) абзацем не считается.
+_PARAGRAPH_RE = re.compile(r'\n\s*\n|(?<=[.!?…»"”])[ \t]*\r?\n')
+_HAS_TEXT_RE = re.compile(r'[а-яА-ЯёЁa-zA-Z0-9]')
+
+def split_paragraphs(text: str) -> List[str]:
+    return [p for p in _PARAGRAPH_RE.split(text) if p.strip()]
+
+def plan_document(text: str, target_chars: int = None, max_chars: int = None,
+                  normalize: bool = None, sentences: list = None) -> Tuple[List[str], Set[int]]:
+    """Чанки всего документа и индексы чанков, которыми заканчиваются абзацы.
+
+    Чанк не переходит через границу абзаца. Чанки без букв и цифр отбрасываются.
+    normalize (по умолчанию NORMALIZE_TEXT) — сначала развернуть числа, сокращения и латиницу в слова.
+    Если передан список sentences, в него для каждого чанка добавляются его исходные предложения
+    (см. plan_paragraph_sentences).
+    """
+    normalize = NORMALIZE_TEXT if normalize is None else normalize
+    chunks = []
+    paragraph_ends = set()
+    for paragraph in split_paragraphs(text):
+        planned = plan_paragraph_sentences(paragraph, target_chars, max_chars,
+                                           _timed_normalize if normalize else None)
+        if planned:
+            chunks.extend(chunk for chunk, _ in planned)
+            paragraph_ends.add(len(chunks) - 1)
+            if sentences is not None:
+                sentences.extend(parts for _, parts in planned)
+    return chunks, paragraph_ends
+
+def _timed_normalize(text: str) -> str:
+    with metrics.span('normalize', chars=len(text)):
+        return normalize_text(text)
+
+# Граница предложения в исходном тексте (до нормализации): . ! ? … и пробел перед большой буквой,
+# цифрой, кавычкой или тире. Точка сокращения («т.е.», «ул.») и инициала («А. С. Пушкин») — не граница.
+_SOURCE_BOUNDARY_RE = re.compile(r'[.!?…]+["»”)\]]*\s+(?=[«"„(\[—–-]?\s*[А-ЯЁA-Z0-9])')
+_ABBREVIATION_END_RE = re.compile(
+    r'(?<![а-яёА-ЯЁa-zA-Z])(?:(?-i:[А-ЯЁA-Z]\.)|' + _ABBREVIATION_ALT + r')$', re.IGNORECASE)
+_LETTER_BEFORE_NUMBER_RE = re.compile(r'(?<![а-яёА-ЯЁa-zA-Z])[а-яёa-z]\.$')  # «д. 5», «с. 12», «т. 2»
+
+def split_source_sentences(paragraph: str) -> List[str]:
+    """Предложения абзаца в исходном виде — для разметки времени и поиска по тексту"""
+    sentences = []
+    start = 0
+    for m in _SOURCE_BOUNDARY_RE.finditer(paragraph):
+        dot = m.start() + 1
+        if paragraph[m.start()] == '.':
+            before = max(start, dot - 12)
+            if (_ABBREVIATION_END_RE.search(paragraph, before, dot)
+                    or (paragraph[m.end()].isdigit() and _LETTER_BEFORE_NUMBER_RE.search(paragraph, before, dot))):
+                continue
+        sentences.append(paragraph[start:m.end()].strip())
+        start = m.end()
+    sentences.append(paragraph[start:].strip())
+    return [s for s in sentences if s]
+
+def plan_paragraph_sentences(paragraph: str, target_chars: int = None, max_chars: int = None,
+                             normalize: Callable[[str], str] = None) -> List[Tuple[str, List[Tuple[int, str, int]]]]:
+    """Чанки абзаца вместе с исходными предложениями: [(чанк, [(номер, предложение, символов в чанке), ...])].
+
+    Абзац режется на предложения по исходному тексту, каждое нормализуется отдельно (normalize),
+    и чанки собираются из них так же, как в plan_chunks. Длинное предложение, разрезанное
+    по SILERO_MAX_CHARS, попадает в несколько чанков под одним номером.
+    """
+    target_chars = CHUNK_TARGET_CHARS if target_chars is None else target_chars
+    max_chars = max_chars or SILERO_MAX_CHARS
+    target_chars = min(target_chars, max_chars)
+
+    sources = split_source_sentences(paragraph)
+    units = []  # (текст для синтеза, номер исходного предложения)
+    for n, sentence in enumerate(sources):
+        text = normalize(sentence) if normalize else sentence
+        units += [(unit, n) for unit in plan_chunks(_split_fragments(text), 0, max_chars)]
+
+    planned = []
+    current = ''
+    parts = []
+    for unit, n in units:
+        if current and len(current) + 1 + len(unit) > target_chars:
+            planned.append((current, parts))
+            current, parts = unit, []
+        else:
+            current = f"{current} {unit}" if current else unit
+        if parts and parts[-1][0] == n:
+            parts[-1][2] += len(unit) + 1
+        else:
+            parts.append([n, sources[n], len(unit) + 1])
+    if current:
+        planned.append((current, parts))
+    return [(chunk, [tuple(part) for part in parts]) for chunk, parts in planned if _HAS_TEXT_RE.search(chunk)]
+
+# === Потоковое чтение документа ===
+# Для больших файлов текст не собирается в одну строку: абзацы читаются блоками,
+# сразу режутся на чанки и уходят в синтез. В памяти — блок чтения и текущий абзац.
+READ_BLOCK_CHARS = 64 * 1024
+MAX_PARAGRAPH_CHARS = 256 * 1024  # Более длинный «абзац» режется по концу предложения
+
+def _cut_paragraph(text: str) -> Tuple[str, str]:
+    """Режем слишком длинный абзац по последнему концу предложения (или пробелу) до MAX_PARAGRAPH_CHARS"""
+    pos = max(text.rfind(c, 0, MAX_PARAGRAPH_CHARS) for c in '.!?…')
+    if pos <= 0:
+        pos = text.rfind(' ', 0, MAX_PARAGRAPH_CHARS)
+    if pos <= 0:
+        pos = MAX_PARAGRAPH_CHARS - 1
+    return text[:pos + 1], text[pos + 1:]
+
+# === Голоса по абзацам ===
+# Диалоги и интервью озвучиваются разными голосами. Метка [голос] в начале абзаца
+# (например [xenia] или [aidar]) переключает голос до следующей метки, [-] — обратно на выбранный.
+# Роли задаются файлом рядом с документом: Книга.voices.json = {"Автор": "eugene", "Маша": "xenia"}.
+# Абзац «Маша: текст» озвучивается голосом роли (имя роли не читается), метка [Маша] тоже работает.
+# Квадратные скобки с чем-то другим ([1], [примечание]) остаются текстом.
+VOICE_MARKUP = True
+VOICE_MAP_SUFFIX = ".voices.json"
+
+_VOICE_TAG_RE = re.compile(r'^\s*\[([^\[\]\n]{1,40})\]\s*')
+
+def voice_map_path(file_path: Path) -> Path:
+    return Path(file_path).with_suffix(VOICE_MAP_SUFFIX)
+
+def load_voice_map(file_path: Path) -> Dict[str, str]:
+    """Роли документа {роль: голос} из файла рядом с ним; без файла — пустой словарь"""
+    path = voice_map_path(file_path)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            roles = json.load(f)
+    except ValueError as e:
+        raise ValueError(f"{path.name}: ошибка в JSON: {e}")
+    if not isinstance(roles, dict):
+        raise ValueError(f"{path.name}: ожидается словарь {{\"роль\": \"голос\"}}")
+    for role, voice in roles.items():
+        if voice not in SPEAKERS_INFO:
+            raise ValueError(f"{path.name}: неизвестный голос «{voice}» для роли «{role}». "
+                             f"Доступны: {', '.join(SPEAKERS_INFO)}")
+    logger.info(f"Роли из {path.name}: " + ", ".join(f"{role} — {voice}" for role, voice in roles.items()))
+    return {role.strip().lower(): voice for role, voice in roles.items()}
+
+class VoiceMarkup:
+    """Голос каждого абзаца по меткам [голос] и ролям «Роль: текст»"""
+
+    def __init__(self, roles: Dict[str, str] = None):
+        self.roles = roles or {}
+        self.current = None  # Голос по последней метке; None — выбранный для всей озвучки
+        self.role_re = None
+        if self.roles:
+            names = '|'.join(re.escape(role) for role in sorted(self.roles, key=len, reverse=True))
+            self.role_re = re.compile(rf'^\s*({names})\s*[:—–]\s*', re.IGNORECASE)
+
+    def resolve(self, name: str) -> str:
+        name = name.strip().lower()
+        return name if name in SPEAKERS_INFO else self.roles.get(name)
+
+    def apply(self, paragraph: str) -> Tuple[str, str]:
+        """(абзац без разметки, голос или None)"""
+        m = _VOICE_TAG_RE.match(paragraph)
+        if m:
+            name = m.group(1).strip()
+            voice = self.resolve(name)
+            if voice is not None or name == '-':
+                self.current = voice
+                paragraph = paragraph[m.end():]
+        voice = self.current
+        if self.role_re is not None:
+            m = self.role_re.match(paragraph)
+            if m:
+                voice = self.roles[m.group(1).lower()]
+                paragraph = paragraph[m.end():]
+        return paragraph, voice
+
+# Главы в .txt: первая строка абзаца «# Заголовок» (как в Markdown), «Глава 3», «Часть II», «Пролог».
+# В .docx, .rtf и .odt главы берутся из стилей заголовков (см. extract_paragraphs).
+TXT_HEADING_MAX_CHARS = 80
+_TXT_HEADING_RE = re.compile(
+    r'(#{1,6})\s+(.+)'
+    r'|((?:глава|часть|раздел|книга|chapter|part)\s+(?:\d+|[IVXLCDM]+)\b.*'
+    r'|(?:пролог|эпилог|предисловие|послесловие|введение|заключение)[.:]?)',
+    re.IGNORECASE)
+
+def txt_heading(paragraph: str) -> Tuple[str, int, str]:
+    """(заголовок, уровень, остаток абзаца) для абзаца .txt; уровень 0 — заголовка нет"""
+    first, _, rest = paragraph.strip().partition('\n')
+    m = _TXT_HEADING_RE.fullmatch(first.strip())
+    if m is None or len(first.strip()) > TXT_HEADING_MAX_CHARS:
+        return '', 0, paragraph
+    if m.group(1):
+        return m.group(2).strip(), len(m.group(1)), rest
+    return m.group(3), 1, rest
+
+class DocumentStream:
+    """Ленивое чтение документа: абзацы и чанки по мере надобности, без текста целиком в памяти"""
+
+    def __init__(self, file_path: Path, target_chars: int = None, max_chars: int = None, normalize: bool = None,
+                 voices: bool = None, sentences: bool = False):
+        self.file_path = Path(file_path)
+        self.target_chars = target_chars
+        self.max_chars = max_chars
+        self.normalize = NORMALIZE_TEXT if normalize is None else normalize
+        self.voices = VOICE_MARKUP if voices is None else voices
+        self.voice_chunks = collections.Counter()  # Голос из разметки → сколько чанков
+        self.chapters = {}  # Номер первого чанка главы → (уровень, заголовок)
+        # С sentences=True: номер чанка → его исходные предложения (см. plan_paragraph_sentences);
+        # записи забирает тот, кто читает чанки, иначе они копятся
+        self.sentences = {} if sentences else None
+        self.sentences_read = 0
+        self.fraction = 0.0  # Доля прочитанного файла — для прогресса
+        self.characters = 0
+        self.chunks_read = 0
+        self.paragraphs = 0
+        self.normalized_chars = 0
+        self.normalize_seconds = 0.0
+
+    def _iter_txt(self) -> Iterator[str]:
+        encoding = detect_encoding(self.file_path)
+        logger.info(f"Кодировка файла: {encoding}")
+        size = max(1, self.file_path.stat().st_size)
+        buffer = ''
+        with open(self.file_path, 'r', encoding=encoding, errors='replace') as f:
+            while True:
+                with metrics.span('read'):
+                    block = f.read(READ_BLOCK_CHARS)
+                self.fraction = min(1.0, f.buffer.tell() / size)
+                parts = _PARAGRAPH_RE.split(buffer + block)
+                # Последний кусок может продолжиться в следующем блоке
+                buffer = parts.pop() if block else ''
+                while len(buffer) > MAX_PARAGRAPH_CHARS:
+                    head, buffer = _cut_paragraph(buffer)
+                    parts.append(head)
+                for paragraph in parts:
+                    if paragraph.strip():
+                        yield paragraph
+                if not block:
+                    return
+
+    def _iter_document(self) -> Iterator[Tuple[str, int]]:
+        # Разбор .docx/.doc/.rtf/.odt отдаёт все абзацы сразу (или из кэша извлечения)
+        with metrics.span('read'):
+            paragraphs = extract_paragraphs(self.file_path)
+        for k, paragraph in enumerate(paragraphs):
+            self.fraction = (k + 1) / len(paragraphs)
+            yield paragraph
+
+    def iter_marked_paragraphs(self) -> Iterator[Tuple[str, int]]:
+        """(абзац, уровень заголовка; 0 — обычный абзац)"""
+        ext = self.file_path.suffix.lower()
+        logger.info(f"Чтение файла: {self.file_path.name} ({ext})")
+        if ext == '.txt':
+            for paragraph in self._iter_txt():
+                title, level, rest = txt_heading(paragraph)
+                if level:
+                    yield title, level
+                if rest.strip():
+                    yield rest, 0
+        elif ext in DOCUMENT_EXTRACTORS:
+            yield from self._iter_document()
+        else:
+            raise ValueError(f"Неподдерживаемый формат: {ext}")
+
+    def _normalize(self, text: str) -> str:
+        start = time.perf_counter()
+        with metrics.span('normalize', chars=len(text)):
+            normalized = normalize_text(text)
+        self.normalize_seconds += time.perf_counter() - start
+        self.normalized_chars += len(text)
+        return normalized
+
+    def iter_paragraphs(self) -> Iterator[str]:
+        for paragraph, _ in self.iter_marked_paragraphs():
+            yield paragraph
+
+    def voiced_chunks(self) -> Iterator[Tuple[str, bool, str]]:
+        """(чанк, конец абзаца, голос из разметки или None) по мере чтения файла"""
+        markup = VoiceMarkup(load_voice_map(self.file_path)) if self.voices else None
+        for paragraph, level in self.iter_marked_paragraphs():
+            voice = None
+            if markup is not None:
+                # Метки снимаем до нормализации: иначе [xenia] прочиталось бы как слово
+                paragraph, voice = markup.apply(paragraph)
+            title = ' '.join(paragraph.split()) if level else None
+            # Предложения нормализуются по отдельности внутри планировщика: время нормализации — своим этапом
+            start = time.perf_counter()
+            normalize_before = self.normalize_seconds
+            planned = plan_paragraph_sentences(paragraph, self.target_chars, self.max_chars,
+                                               self._normalize if self.normalize else None)
+            metrics.observe('split', time.perf_counter() - start - (self.normalize_seconds - normalize_before))
+            if planned:
+                self.paragraphs += 1
+                if title:
+                    self.chapters[self.chunks_read] = (level, title)
+                first = self.sentences_read
+                self.sentences_read += max(number for _, parts in planned for number, _, _ in parts) + 1
+            for k, (chunk, parts) in enumerate(planned):
+                if self.sentences is not None:
+                    self.sentences[self.chunks_read] = [(first + number, text, chars) for number, text, chars in parts]
+                self.characters += len(chunk)
+                self.chunks_read += 1
+                if voice is not None:
+                    self.voice_chunks[voice] += 1
+                yield chunk, k == len(planned) - 1, voice
+
+def benchmark_chunk_sizes(text: str, speaker: str = None, sample_rate: int = None,
+                          targets: List[int] = (0, 100, 200, 400, 800)) -> List[dict]:
+    """Скорость синтеза (RTF) в зависимости от размера чанка.
+
+    Первая строка — старое поведение: каждый фрагмент split_into_sentences отдельно.
+    """
+    speaker = speaker or DEFAULT_SPEAKER
+    sample_rate = sample_rate or DEFAULT_SAMPLE_RATE
+    model = model_manager.get()
+    fragments = split_into_sentences(text)
+
+    plans = [('фрагменты', fragments)] + [(target, plan_chunks(fragments, target)) for target in targets]
+    results = []
+    for target, chunks in plans:
+        chunks = [c for c in chunks if re.search(r'[а-яА-ЯёЁa-zA-Z0-9]', c)]
+        start = time.perf_counter()
+        samples = 0
+        for batch in make_length_buckets(chunks):
+            for audio in synthesize_batch(model, [chunks[i] for i in batch], speaker, sample_rate):
+                samples += len(audio)
+        seconds = time.perf_counter() - start
+        audio_seconds = samples / sample_rate
+        row = {
+            'target_chars': target,
+            'chunks': len(chunks),
+            'avg_chars': sum(len(c) for c in chunks) / max(1, len(chunks)),
+            'seconds': seconds,
+            'audio_seconds': audio_seconds,
+            'rtf': seconds / audio_seconds if audio_seconds else 0.0,
+        }
+        results.append(row)
+        logger.info(f"Чанки [{target}]: {row['chunks']} шт., в среднем {row['avg_chars']:.0f} символов, "
+                    f"{seconds:.2f} с, RTF {row['rtf']:.3f}")
+    return results
+
 # === Загрузка модели Silero ===
 def get_silero_model_path():
     """Получаем путь к модели (скачиваем при необходимости)"""
@@ -325,6 +1795,8 @@ def get_silero_model_path():
                     percent = min(100, downloaded * 100 / total_size)
                     print(f"\rЗагрузка модели: {percent:.1f}%", end='')
 
+            import urllib.request
+
             url = 'https://models.silero.ai/models/tts/ru/v5_ru.pt'
             urllib.request.urlretrieve(url, str(model_path), show_progress)
             print()  # Новая строка после прогресса
@@ -337,10 +1809,13 @@ def get_silero_model_path():
 
     return model_path
 
-def load_silero_model():
-    """Загружаем модель Silero TTS"""
+@metrics.timed('model_load')
+def load_silero_model(model_path: Path = None):
+    """Загружаем модель Silero TTS (по умолчанию — из кэша, со скачиванием при необходимости)"""
+    import torch
+
     try:
-        model_path = get_silero_model_path()
+        model_path = model_path or get_silero_model_path()
         logger.info("Инициализация модели...")
         model = torch.package.PackageImporter(str(model_path)).load_pickle("tts_models", "model")
         model.to(torch.device('cpu'))
@@ -350,30 +1825,1065 @@ def load_silero_model():
         logger.error(f"Ошибка загрузки модели: {e}")
         raise
 
-# === Генерация аудио ===
-def generate_audio_chunk(model, text: str, speaker: str, sample_rate: int, output_path: Path):
-    """Генерируем аудио для одного чанка"""
-    try:
-        audio = model.apply_tts(
-            text=text,
-            speaker=speaker,
-            sample_rate=sample_rate,
-            put_accent=True,
-            put_yo=True
-        )
-        sf.write(str(output_path), audio.numpy(), sample_rate)
-    except Exception as e:
-        logger.error(f"Ошибка генерации аудио: {e}")
-        raise
+# === Профили инференса ===
+# Как исполнять модель на CPU. 'baseline' — как раньше. Остальные добавляют по шагу:
+#   inference_mode — apply_tts внутри torch.inference_mode() (без учёта градиентов и версий тензоров)
+#   threads        — число потоков torch по физическим ядрам, один inter-op поток
+#   int8           — динамическое квантование nn.Linear в int8
+#   compile        — torch.compile
+#   jit            — torch.jit.freeze + optimize_for_inference для частей на TorchScript
+# Модель Silero v5 — пакет с TorchScript внутри: int8 и compile применимы только к частям на обычном
+# nn.Module, поэтому шаг, которому не к чему примениться, пропускается и отмечается в отчёте.
+# Подобрать профиль для конкретной машины: python text_to_vois.py tune
+INFERENCE_PROFILE_ENV = "TTS_INFERENCE_PROFILE"
+INFERENCE_PROFILE = os.environ.get(INFERENCE_PROFILE_ENV, 'baseline')
+INFERENCE_THREADS = 0    # 0 — по числу физических ядер
+INFERENCE_PROFILES = {
+    'baseline': [],
+    'inference': ['inference_mode'],
+    'threads': ['inference_mode', 'threads'],
+    'int8': ['inference_mode', 'threads', 'int8'],
+    'compile': ['inference_mode', 'threads', 'compile'],
+    'jit': ['inference_mode', 'threads', 'jit'],
+}
+QUALITY_MAX_SPECTRAL_DB = 2.0   # Допустимое среднее отличие спектра от baseline, дБ
+QUALITY_MAX_LENGTH_DIFF = 0.05  # Допустимое отличие длительности от baseline (5%)
 
-# === Склейка в MP3 (через ffmpeg напрямую) ===
-def convert_and_concatenate(wav_files: List[Path], output_mp3: Path):
-    """Склеиваем WAV и конвертируем в MP3 через ffmpeg напрямую"""
-    import subprocess
-    import tempfile
+class InferenceModel:
+    """Обёртка модели с выбранным профилем: apply_tts исполняется под torch.inference_mode()"""
 
-    logger.info("Начинаем склейку и конвертацию через ffmpeg...")
-    try:
+    def __init__(self, model, profile: str, steps: List[str]):
+        self.model = model
+        self.profile = profile
+        self.steps = steps  # Шаги, которые удалось применить
+        original = model.apply_tts
+
+        @functools.wraps(original)  # Сохраняем сигнатуру: по ней synthesize_batch выбирает режим пакетов
+        def apply_tts(*args, **kwargs):
+            import torch
+
+            with torch.inference_mode():
+                return original(*args, **kwargs)
+
+        self.apply_tts = apply_tts
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def _physical_cores() -> int:
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+def _plain_modules(model) -> Dict[str, object]:
+    """Части модели на обычном nn.Module (не TorchScript) — к ним применимы int8 и torch.compile"""
+    import torch
+
+    if isinstance(model, torch.nn.Module):
+        return {} if isinstance(model, torch.jit.ScriptModule) else {'': model}
+    return {name: value for name, value in vars(model).items()
+            if isinstance(value, torch.nn.Module) and not isinstance(value, torch.jit.ScriptModule)}
+
+def _script_modules(model) -> Dict[str, object]:
+    import torch
+
+    if isinstance(model, torch.jit.ScriptModule):
+        return {'': model}
+    return {name: value for name, value in vars(model).items() if isinstance(value, torch.jit.ScriptModule)}
+
+def _replace_modules(model, transform, modules: Dict[str, object]):
+    """Заменяем части модели результатом transform(часть). Возвращает новую модель (если менялась она сама)."""
+    for name, module in modules.items():
+        if name == '':
+            return transform(module)
+        setattr(model, name, transform(module))
+    return model
+
+def apply_inference_profile(model, profile: str = None):
+    """Применяем профиль инференса к загруженной модели"""
+    import torch
+
+    profile = profile or INFERENCE_PROFILE
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"Неизвестный профиль инференса: {profile}. Доступны: {', '.join(INFERENCE_PROFILES)}")
+    steps = INFERENCE_PROFILES[profile]
+    if not steps:
+        return model
+
+    applied = []
+    for step in steps:
+        try:
+            if step == 'inference_mode':
+                applied.append(step)  # Применяется обёрткой InferenceModel ниже
+            elif step == 'threads':
+                if multiprocessing.parent_process() is not None:
+                    continue  # У процессов пула свой бюджет потоков
+                torch.set_num_threads(INFERENCE_THREADS or _physical_cores())
+                try:
+                    torch.set_num_interop_threads(1)
+                except RuntimeError:
+                    pass  # Можно задать только до первой параллельной работы torch
+                applied.append(f"threads={torch.get_num_threads()}")
+            elif step == 'int8':
+                modules = _plain_modules(model)
+                if not modules:
+                    logger.warning("Профиль int8: в модели нет частей на nn.Module, квантование пропущено")
+                    continue
+                model = _replace_modules(
+                    model, lambda m: torch.quantization.quantize_dynamic(m, {torch.nn.Linear}, dtype=torch.qint8),
+                    modules)
+                applied.append(step)
+            elif step == 'compile':
+                modules = _plain_modules(model)
+                if not modules:
+                    logger.warning("Профиль compile: в модели нет частей на nn.Module, torch.compile пропущен")
+                    continue
+                model = _replace_modules(model, torch.compile, modules)
+                applied.append(step)
+            elif step == 'jit':
+                modules = _script_modules(model)
+                if not modules:
+                    logger.warning("Профиль jit: в модели нет частей на TorchScript, шаг пропущен")
+                    continue
+                model = _replace_modules(
+                    model, lambda m: torch.jit.optimize_for_inference(torch.jit.freeze(m.eval())), modules)
+                applied.append(step)
+        except Exception as e:
+            logger.warning(f"Профиль {profile}: шаг {step} не применён: {e}")
+
+    logger.info(f"Профиль инференса {profile}: {', '.join(applied) or 'без изменений'}")
+    return InferenceModel(model, profile, applied)
+
+def set_inference_profile(profile: str):
+    """Выбираем профиль для этого процесса и дочерних (пул, пакетный режим)"""
+    global INFERENCE_PROFILE
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"Неизвестный профиль инференса: {profile}. Доступны: {', '.join(INFERENCE_PROFILES)}")
+    os.environ[INFERENCE_PROFILE_ENV] = profile
+    if profile != INFERENCE_PROFILE:
+        INFERENCE_PROFILE = profile
+        model_manager.unload()
+
+def audio_distance(reference, candidate, sample_rate: int) -> Dict[str, float]:
+    """Насколько аудио отличается от эталона: спектр (дБ), длительность и SNR (если длины совпали)"""
+    import numpy as np
+
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    result = {'length_diff': abs(len(candidate) - len(reference)) / max(1, len(reference))}
+    if len(reference) == len(candidate):
+        noise = float(np.sum((reference - candidate) ** 2))
+        if noise > 0:
+            result['snr_db'] = 10 * np.log10(float(np.sum(reference ** 2)) / noise)
+        # Без snr_db — аудио совпало с эталоном побитово
+
+    n_fft = 1024 if sample_rate > 16000 else 256
+    hop = n_fft // 4
+    window = np.hanning(n_fft).astype(np.float32)
+
+    def log_spectrum(audio):
+        if len(audio) < n_fft:
+            audio = np.pad(audio, (0, n_fft - len(audio)))
+        frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop] * window
+        return 20 * np.log10(np.abs(np.fft.rfft(frames, axis=1)) + 1e-6)
+
+    ref_spec, cand_spec = log_spectrum(reference), log_spectrum(candidate)
+    frames = min(len(ref_spec), len(cand_spec))
+    # Сравниваем только слышимую часть: тихие полосы эталона (ниже -60 дБ от пика) не учитываем
+    ref_spec, cand_spec = ref_spec[:frames], cand_spec[:frames]
+    audible = ref_spec > ref_spec.max() - 60
+    result['spectral_db'] = float(np.mean(np.abs(ref_spec - cand_spec)[audible])) if audible.any() else 0.0
+    return result
+
+def tune_inference(profiles: List[str] = None, texts: List[str] = None, speaker: str = None,
+                   sample_rate: int = None, model_path: Path = None, loader: Callable[[], object] = None) -> List[dict]:
+    """Сравниваем профили инференса с baseline: скорость и отличие звука. Возвращает отчёт по профилям."""
+    import torch
+    import numpy as np
+
+    profiles = list(profiles or INFERENCE_PROFILES)  # Копия: список вызывающего не меняем
+    if 'baseline' in profiles:
+        profiles.remove('baseline')
+    profiles.insert(0, 'baseline')
+    texts = texts or plan_document(bench_corpus(BENCH_SYNTH_CHARS))[0]
+    speaker = speaker or DEFAULT_SPEAKER
+    sample_rate = sample_rate or DEFAULT_SAMPLE_RATE
+    loader = loader or (lambda: load_silero_model(model_path))
+
+    results = []
+    reference = None
+    default_threads = torch.get_num_threads()
+    for profile in profiles:
+        row = {'profile': profile}
+        try:
+            # Каждому профилю — свежая модель (квантование и компиляция меняют её на месте) и исходные потоки
+            torch.set_num_threads(default_threads)
+            model = apply_inference_profile(loader(), profile)
+            row['steps'] = getattr(model, 'steps', [])
+            row['skipped'] = [step for step in INFERENCE_PROFILES[profile]
+                              if not any(applied.startswith(step) for applied in row['steps'])]
+            synthesize_batch(model, [MODEL_WARMUP_TEXT], speaker, sample_rate)  # Прогрев (и компиляция)
+            start = time.perf_counter()
+            audios = []
+            for batch in make_length_buckets(texts):
+                audios.extend(zip(batch, synthesize_batch(model, [texts[i] for i in batch], speaker, sample_rate)))
+            seconds = time.perf_counter() - start
+            audio = np.concatenate([np.asarray(a, dtype=np.float32) for _, a in sorted(audios, key=lambda x: x[0])])
+            row.update(seconds=round(seconds, 3), audio_seconds=round(len(audio) / sample_rate, 3),
+                       rtf=round(seconds / (len(audio) / sample_rate), 4))
+            if reference is None:
+                reference = (audio, seconds)
+            distance = audio_distance(reference[0], audio, sample_rate)
+            row.update({k: round(v, 3) for k, v in distance.items()})
+            row['speedup'] = round(reference[1] / seconds, 3) if seconds > 0 else None
+            row['acceptable'] = (distance['spectral_db'] <= QUALITY_MAX_SPECTRAL_DB
+                                 and distance['length_diff'] <= QUALITY_MAX_LENGTH_DIFF)
+        except Exception as e:
+            row.update(error=str(e), acceptable=False)
+            if profile == 'baseline':
+                raise
+        results.append(row)
+        logger.info(f"Профиль {profile}: " + ", ".join(f"{k}={v}" for k, v in row.items() if k != 'profile'))
+
+    best = min((r for r in results if r.get('acceptable')), key=lambda r: r['seconds'])
+    logger.info(f"✅ Самый быстрый допустимый профиль: {best['profile']} (x{best['speedup']} к baseline)")
+    return results
+
+# === Загруженная модель (одна на процесс) ===
+# Распаковка v5_ru.pt занимает секунды, поэтому модель грузится один раз и живёт между задачами.
+PRELOAD_MODEL_ON_START = True           # GUI: загрузить и прогреть модель в фоне сразу после запуска
+MODEL_WARMUP_TEXT = "Привет! Это проверка синтеза речи."
+
+class ModelManager:
+    """Держит модель Silero загруженной и прогретой между задачами"""
+
+    def __init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.reuses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _ensure_loaded(self) -> bool:
+        # Вызывается под self._lock. Возвращает True, если модель уже была в памяти.
+        if self._model is not None:
+            return True
+        start = time.perf_counter()
+        self._model = apply_inference_profile(load_silero_model(), INFERENCE_PROFILE)
+        self.load_seconds = time.perf_counter() - start
+        logger.info(f"Модель загружена за {self.load_seconds:.2f} с")
+        return False
+
+    def get(self):
+        """Возвращаем модель, загружая её при первом обращении"""
+        with self._lock:
+            if self._ensure_loaded():
+                self.reuses += 1
+                logger.info(f"Модель уже в памяти (повторное использование №{self.reuses}, "
+                            f"сэкономлено ~{self.load_seconds:.2f} с загрузки)")
+            return self._model
+
+    def warmup(self, speaker: str = None, sample_rate: int = None):
+        """Загружаем модель и делаем пробный синтез, чтобы первая реальная фраза не платила за прогрев"""
+        speaker = speaker or DEFAULT_SPEAKER
+        sample_rate = sample_rate or DEFAULT_SAMPLE_RATE
+        with self._lock:
+            self._ensure_loaded()
+            start = time.perf_counter()
+            self._model.apply_tts(text=MODEL_WARMUP_TEXT, speaker=speaker, sample_rate=sample_rate,
+                                  put_accent=True, put_yo=True)
+            self.warmup_seconds = time.perf_counter() - start
+        logger.info(f"Прогрев модели: {self.warmup_seconds:.2f} с")
+
+    def unload(self):
+        with self._lock:
+            self._model = None
+
+model_manager = ModelManager()
+
+# === Пакетный синтез ===
+# 'auto' — один вызов на пакет, если модель принимает список текстов, иначе по одному предложению
+# 'off'  — всегда по одному предложению (как раньше)
+# У Silero v5 (v5_ru.pt) apply_tts принимает только один текст, поэтому с ней пакетного синтеза нет:
+# 'auto' работает как 'off'. Пакеты по длине остаются единицей работы пула процессов и сервера.
+BATCH_MODE = 'auto'
+BATCH_MAX_SENTENCES = 16
+BATCH_MAX_CHARS = 2000
+
+def make_length_buckets(texts: List[str], max_sentences: int = None, max_chars: int = None) -> List[List[int]]:
+    """Группируем индексы предложений в пакеты близкой длины"""
+    max_sentences = max_sentences or BATCH_MAX_SENTENCES
+    max_chars = max_chars or BATCH_MAX_CHARS
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+    batches = []
+    current = []
+    chars = 0
+    for i in order:
+        n = len(texts[i])
+        if current and (len(current) >= max_sentences or chars + n > max_chars):
+            batches.append(current)
+            current = []
+            chars = 0
+        current.append(i)
+        chars += n
+    if current:
+        batches.append(current)
+    return batches
+
+def _apply_tts_params(model) -> set:
+    try:
+        return set(inspect.signature(model.apply_tts).parameters)
+    except (TypeError, ValueError):
+        return set()
+
+def model_supports_batch(model) -> bool:
+    """Умеет ли модель принимать список текстов за один вызов"""
+    return 'texts' in _apply_tts_params(model)
+
+class PartialBatchError(Exception):
+    """Пакет озвучен не целиком: audios — аудио каждого предложения (None — не озвучено), errors — {позиция: ошибка}"""
+
+    def __init__(self, audios: list, errors: dict):
+        super().__init__(audios, errors)  # Через args — исключение переживает pickle из процесса пула
+        self.audios = audios
+        self.errors = errors
+
+    def __str__(self):
+        return f"не озвучено {len(self.errors)} из {len(self.audios)} предложений: {next(iter(self.errors.values()))}"
+
+def synthesize_batch(model, texts: List[str], speaker: str, sample_rate: int, mode: str = None) -> list:
+    """Озвучиваем пакет предложений. Возвращает аудио в том же порядке, что и texts.
+
+    Если по одному модель не смогла озвучить часть пакета, поднимается PartialBatchError
+    с уже готовым аудио остальных предложений.
+    """
+    mode = mode or BATCH_MODE
+    kwargs = dict(speaker=speaker, sample_rate=sample_rate, put_accent=True, put_yo=True)
+
+    if mode != 'off' and len(texts) > 1 and model_supports_batch(model):
+        with metrics.span('apply_tts', chars=sum(len(t) for t in texts), batch=len(texts)):
+            return list(model.apply_tts(texts=texts, **kwargs))
+
+    audios = []
+    errors = {}
+    for j, t in enumerate(texts):
+        try:
+            with metrics.span('apply_tts', chars=len(t), batch=1):
+                audios.append(model.apply_tts(text=t, **kwargs))
+        except Exception as e:
+            if len(texts) == 1:
+                raise
+            audios.append(None)
+            errors[j] = e
+    if errors:
+        raise PartialBatchError(audios, errors)
+    return audios
+
+def benchmark_batching(model, texts: List[str], speaker: str, sample_rate: int = 48000) -> Dict[str, float]:
+    """Сравниваем скорость: по одному предложению против пакетного синтеза (предложений/сек по режимам)"""
+    if not model_supports_batch(model):
+        logger.warning("Модель не принимает список текстов (как Silero v5): пакетного синтеза нет, "
+                       "режимы 'auto' и 'off' делают одинаковые вызовы")
+    results = {}
+    for mode in ('off', 'auto'):
+        start = time.perf_counter()
+        for batch in make_length_buckets(texts):
+            synthesize_batch(model, [texts[i] for i in batch], speaker, sample_rate, mode=mode)
+        elapsed = time.perf_counter() - start
+        results[mode] = len(texts) / elapsed if elapsed > 0 else float('inf')
+        logger.info(f"Пакетный синтез [{mode}]: {results[mode]:.2f} предложений/сек")
+    return results
+
+# === Параллельный синтез (пул процессов) ===
+# Каждый процесс один раз грузит модель и получает пакеты предложений из общей очереди
+SYNTH_WORKERS = 1                # 1 — синтез в текущем процессе, без пула
+SYNTH_THREADS_PER_WORKER = 0     # 0 — поровну делим ядра между процессами
+
+def synthesize_audio(model, indices: List[int], texts: List[str], speaker: str, sample_rate: int) -> list:
+    """Озвучиваем пакет предложений по индексам. Возвращает массивы numpy float32."""
+    batch_texts = [texts[i] for i in indices]
+    for text in batch_texts:
+        # ЛОГИРУЕМ текст предложения перед обработкой
+        logger.info(f"Обрабатывается предложение: {text}")
+    try:
+        audios = synthesize_batch(model, batch_texts, speaker, sample_rate)
+    except PartialBatchError as e:
+        logger.error(f"Ошибка генерации аудио: {e}")
+        raise PartialBatchError([audio.numpy() if hasattr(audio, 'numpy') else audio for audio in e.audios],
+                                e.errors) from None
+    except Exception as e:
+        logger.error(f"Ошибка генерации аудио: {e}")
+        raise
+    return [audio.numpy() if hasattr(audio, 'numpy') else audio for audio in audios]
+
+def _pool_worker_init(threads: int):
+    """Инициализация процесса пула: свой бюджет потоков и своя копия модели"""
+    import torch
+
+    setup_logging()
+    torch.set_num_threads(threads)
+    model_manager.get()
+
+def _pool_synthesize(indices, texts, speaker, sample_rate):
+    start = time.perf_counter()
+    audios = synthesize_audio(model_manager.get(), list(range(len(indices))), texts, speaker, sample_rate)
+    return indices, audios, os.getpid(), time.perf_counter() - start
+
+class SynthesisPool:
+    """Пул процессов синтеза. Живёт всю озвучку, чтобы модель грузилась один раз на процесс."""
+
+    def __init__(self, workers: int = None, threads_per_worker: int = None):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers or SYNTH_WORKERS
+        threads = threads_per_worker or SYNTH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // self.workers)
+        logger.info(f"Пул синтеза: {self.workers} процессов по {threads} потоков")
+
+        self.stats = {}  # pid -> [предложений, секунд]
+        # spawn — одинаковое поведение на Windows и Linux, без наследования состояния Tk и потоков torch
+        ctx = multiprocessing.get_context('spawn')
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                            initializer=_pool_worker_init, initargs=(threads,))
+
+    def run(self, batches: List[List[int]], texts: List[str], voices: List[str], sample_rate: int):
+        """Отдаёт (индексы, аудио, ошибка) по мере готовности пакетов.
+
+        voices — голос каждого предложения; внутри пакета голос один.
+        Если модель упала на пакете, аудио — None, а ошибка — исключение из процесса пула
+        (PartialBatchError несёт аудио той части пакета, которую удалось озвучить).
+        Падение самого процесса (BrokenProcessPool) пробрасывается.
+        """
+        from concurrent.futures import as_completed
+        from concurrent.futures.process import BrokenProcessPool
+
+        # Длинные пакеты отправляем первыми, чтобы процессы закончили примерно одновременно
+        futures = {
+            self.executor.submit(_pool_synthesize, batch, [texts[i] for i in batch], voices[batch[0]],
+                                 sample_rate): batch
+            for batch in sorted(batches, key=lambda b: -sum(len(texts[i]) for i in b))
+        }
+        completed = as_completed(futures)
+        while True:
+            # Ожидание процессов пула: время их вызовов apply_tts видно только в их строках JSON
+            with metrics.span('pool_wait'):
+                future = next(completed, None)
+            if future is None:
+                break
+            try:
+                indices, audios, pid, elapsed = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                yield futures[future], None, e
+                continue
+            worker_stats = self.stats.setdefault(pid, [0, 0.0])
+            worker_stats[0] += len(indices)
+            worker_stats[1] += elapsed
+            yield indices, audios, None
+
+    def run_one(self, text: str, speaker: str, sample_rate: int):
+        """Одно предложение в процессе пула (повтор после ошибки пакета)"""
+        with metrics.span('pool_wait'):
+            return self.executor.submit(_pool_synthesize, [0], [text], speaker, sample_rate).result()[1][0]
+
+    def log_stats(self):
+        for pid, (count, elapsed) in sorted(self.stats.items()):
+            rate = count / elapsed if elapsed > 0 else 0.0
+            logger.info(f"Процесс {pid}: {count} предложений за {elapsed:.1f} с ({rate:.2f} предложений/сек)")
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        self.log_stats()
+
+# === Кэш озвученных фраз ===
+# Ключ: нормализованный текст + голос + частота + хэш файла модели + шаги профиля инференса,
+# меняющие звук (AUDIO_CACHE_PROFILE_STEPS). При смене модели или такого профиля старые записи
+# просто перестают совпадать и вытесняются по LRU.
+AUDIO_CACHE_ENABLED = True
+AUDIO_CACHE_DIR = Path.home() / ".cache" / "silero" / "audio_cache"
+AUDIO_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 ГБ
+AUDIO_CACHE_PROFILE_STEPS = ('int8', 'compile', 'jit')  # inference_mode и threads звук не меняют
+
+_model_hash_memo = {}
+
+def get_model_hash(model_path: Path) -> str:
+    """SHA-256 файла модели (считается один раз за запуск)"""
+    stat = model_path.stat()
+    memo_key = (str(model_path), stat.st_size, stat.st_mtime)
+    if memo_key not in _model_hash_memo:
+        h = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        _model_hash_memo[memo_key] = h.hexdigest()
+    return _model_hash_memo[memo_key]
+
+def normalize_cache_text(text: str) -> str:
+    """Нормализуем текст фразы для ключа кэша"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+class AudioCache:
+    """Дисковый кэш озвученных фраз с вытеснением давно неиспользуемых (LRU)"""
+
+    def __init__(self, model_hash: str, cache_dir: Path = None, max_bytes: int = None, profile: str = None):
+        self.model_hash = model_hash
+        # Без шагов, меняющих звук (baseline, threads), ключ тот же, что и до профилей
+        steps = INFERENCE_PROFILES.get(profile or INFERENCE_PROFILE, [])
+        self.profile_tag = '+'.join(step for step in steps if step in AUDIO_CACHE_PROFILE_STEPS)
+        self.cache_dir = Path(cache_dir or AUDIO_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or AUDIO_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+
+    # Размер кэша хранится в size.json, чтобы не обходить все записи при каждом запуске.
+    # Параллельные процессы могут его немного сбить — evict пересчитывает размер по диску.
+    @property
+    def _size_path(self) -> Path:
+        return self.cache_dir / "size.json"
+
+    @property
+    def total_bytes(self) -> int:
+        if self._total_bytes is None:
+            try:
+                self._total_bytes = int(json.loads(self._size_path.read_text(encoding='utf-8'))['bytes'])
+            except (OSError, ValueError, KeyError, TypeError):
+                self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob('*/*.wav'))
+                self._save_size()
+        return self._total_bytes
+
+    @total_bytes.setter
+    def total_bytes(self, value: int):
+        self._total_bytes = value
+
+    def _save_size(self):
+        tmp = self._size_path.with_name(f"size.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps({'bytes': self._total_bytes}), encoding='utf-8')
+            os.replace(tmp, self._size_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить размер кэша фраз: {e}")
+
+    def key(self, text: str, speaker: str, sample_rate: int) -> str:
+        parts = [normalize_cache_text(text), speaker, str(sample_rate), self.model_hash]
+        if self.profile_tag:
+            parts.append(self.profile_tag)
+        payload = '\x1f'.join(parts)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.wav"
+
+    @metrics.timed('cache_read')
+    def load(self, text: str, speaker: str, sample_rate: int):
+        """Достаём аудио фразы из кэша. Возвращает None при промахе."""
+        import soundfile as sf
+
+        entry = self._entry_path(self.key(text, speaker, sample_rate))
+        try:
+            audio, _ = sf.read(str(entry), dtype='float32')
+            os.utime(entry)  # Отмечаем использование для LRU
+        except (OSError, RuntimeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return audio
+
+    @metrics.timed('cache_write')
+    def store(self, text: str, speaker: str, sample_rate: int, audio):
+        """Сохраняем озвученную фразу в кэш"""
+        import soundfile as sf
+
+        entry = self._entry_path(self.key(text, speaker, sample_rate))
+        if entry.exists():
+            return
+        try:
+            entry.parent.mkdir(exist_ok=True)
+            # Пишем через временный файл, чтобы параллельный запуск не увидел недописанный WAV
+            tmp = entry.with_name(f"{entry.stem}.{os.getpid()}.tmp")
+            sf.write(str(tmp), audio, sample_rate, format='WAV')
+            os.replace(tmp, entry)
+            self.total_bytes += entry.stat().st_size
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Не удалось сохранить фразу в кэш: {e}")
+            return
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        else:
+            self._save_size()
+
+    def evict(self):
+        """Удаляем самые давно использованные записи, пока кэш не станет меньше 90% лимита"""
+        entries = []
+        for p in self.cache_dir.glob('*/*.wav'):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        self.total_bytes = sum(size for _, size, _ in entries)
+
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, p in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            self.total_bytes -= size
+            removed += 1
+        self._save_size()
+        logger.info(f"Кэш фраз: вытеснено {removed} записей, размер {self.total_bytes / 1024 ** 2:.1f} МБ")
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        logger.info(
+            f"Кэш фраз: попаданий {self.hits}, промахов {self.misses} "
+            f"({ratio:.1f}% попаданий), размер {self.total_bytes / 1024 ** 2:.1f} МБ"
+        )
+
+# === Повторы внутри документа ===
+# В договорах и инструкциях одни и те же предложения и пункты списков встречаются много раз.
+# Каждый уникальный текст озвучивается один раз за запуск, повторы получают тот же буфер аудио.
+# Работает и без кэша фраз на диске; память ограничена DEDUP_MEMORY_MB (вытесняются давние записи).
+SYNTH_DEDUP = True
+DEDUP_MEMORY_MB = 256
+
+class DedupIndex:
+    """Аудио уже озвученных в этом запуске чанков: повтор берётся из памяти, а не из модели"""
+
+    def __init__(self, max_mb: int = None):
+        self.max_bytes = (max_mb or DEDUP_MEMORY_MB) * 1024 * 1024
+        self._audio = collections.OrderedDict()
+        self.bytes = 0
+        self.total = 0    # Сколько чанков прошло через индекс
+        self.reused = 0   # Сколько из них — повторы
+
+    @staticmethod
+    def key(text: str, speaker: str) -> str:
+        # Тот же текст другим голосом — другое аудио
+        return f"{speaker}\x1f{' '.join(text.split())}"
+
+    def get(self, key: str):
+        audio = self._audio.get(key)
+        if audio is not None:
+            self._audio.move_to_end(key)
+        return audio
+
+    def put(self, key: str, audio):
+        import numpy as np
+
+        audio = np.asarray(audio, dtype=np.float32)
+        if key in self._audio or audio.nbytes > self.max_bytes:
+            return audio
+        self._audio[key] = audio
+        self.bytes += audio.nbytes
+        while self.bytes > self.max_bytes:
+            _, old = self._audio.popitem(last=False)
+            self.bytes -= old.nbytes
+        return audio
+
+    @property
+    def ratio(self) -> float:
+        return self.reused / self.total if self.total else 0.0
+
+    def log_stats(self, log: Callable[[str], None] = None):
+        (log or logger.info)(f"Повторы в документе: {self.reused} из {self.total} чанков "
+                             f"({self.ratio:.1%}) взяты из памяти без повторной озвучки")
+
+# === Синтез документа по порядку ===
+# Предложения обрабатываются окнами: внутри окна — пакеты по длине, наружу — строго по порядку.
+# Окно ограничивает память при потоковой записи в MP3.
+SYNTH_WINDOW = 32
+
+def _local_batches(model, batches: List[List[int]], texts: List[str], voices: List[str], sample_rate: int):
+    """Пакеты в этом процессе: (индексы, аудио, ошибка) — как SynthesisPool.run"""
+    for batch in batches:
+        try:
+            yield batch, synthesize_audio(model, batch, texts, voices[batch[0]], sample_rate), None
+        except Exception as e:
+            yield batch, None, e
+
+def iter_synthesized_audio(texts: Iterable, speaker: str, sample_rate: int, cache: 'AudioCache' = None,
+                           workers: int = 1, threads: int = None, log: Callable[[str], None] = None,
+                           dedup: DedupIndex = None, on_failure: Callable[[int, str, Exception], None] = None,
+                           counts: dict = None):
+    """Отдаёт (индекс, аудио numpy float32) для каждого предложения в исходном порядке.
+
+    texts может быть генератором: следующее окно читается только после того, как отдано предыдущее.
+    Элемент texts — строка (голос speaker) или пара (текст, голос): пакеты собираются внутри
+    одного голоса, а порядок на выходе остаётся исходным.
+    С dedup повторяющиеся чанки озвучиваются один раз и отдаются одним и тем же массивом.
+    Без on_failure ошибка модели останавливает озвучку. С on_failure предложения упавшего пакета,
+    которые не получили аудио и ещё не озвучивались отдельно, повторяются по одному, а предложение,
+    которое так и не удалось озвучить, отдаётся пустым аудио, и on_failure(индекс, текст, ошибка)
+    получает причину.
+    Если передан словарь counts, в нём растут synthesized (предложений, озвученных моделью)
+    и cached (взятых из кэша фраз); повторы считает dedup.
+    """
+    log = log or logger.info
+    counts = counts if counts is not None else {}
+    counts.setdefault('synthesized', 0)
+    counts.setdefault('cached', 0)
+    model = None
+    pool = None
+    source = iter(texts)
+    start = 0
+    try:
+        while True:
+            # Индексы внутри окна — локальные, наружу отдаём start + i
+            items = list(itertools.islice(source, SYNTH_WINDOW))
+            if not items:
+                break
+            texts = [item if isinstance(item, str) else item[0] for item in items]
+            voices = [speaker if isinstance(item, str) else item[1] or speaker for item in items]
+            window = range(len(texts))
+            ready = {}
+            pending = []  # Индексы предложений, которых нет в кэше
+            first = {}    # Текст → индекс первого вхождения в окне (для повторов внутри окна)
+            repeats = {}  # Индекс повтора → индекс первого вхождения
+            for i in window:
+                if dedup is not None:
+                    key = dedup.key(texts[i], voices[i])
+                    dedup.total += 1
+                    audio = dedup.get(key)
+                    if audio is not None or key in first:
+                        dedup.reused += 1
+                        logger.info(f"Повтор в документе: {texts[i]}")
+                        if audio is not None:
+                            ready[i] = audio
+                        else:
+                            repeats[i] = first[key]
+                        continue
+                    first[key] = i
+                audio = cache.load(texts[i], voices[i], sample_rate) if cache is not None else None
+                if audio is None:
+                    pending.append(i)
+                else:
+                    logger.info(f"Взято из кэша: {texts[i]}")
+                    counts['cached'] += 1
+                    ready[i] = dedup.put(key, audio) if dedup is not None else audio
+
+            # Пакеты из предложений одного голоса и близкой длины — меньше накладных расходов на вызов модели
+            batches = []
+            for voice in dict.fromkeys(voices[i] for i in pending):
+                group = [i for i in pending if voices[i] == voice]
+                batches += [[group[j] for j in batch] for batch in make_length_buckets([texts[i] for i in group])]
+            if not batches:
+                results = []
+            elif workers > 1:
+                if pool is None:
+                    log(f"Параллельный синтез: {workers} процессов")
+                    pool = SynthesisPool(workers, threads)
+                results = pool.run(batches, texts, voices, sample_rate)
+                synthesize_one = lambda i: pool.run_one(texts[i], voices[i], sample_rate)
+            else:
+                if model is None:
+                    if not model_manager.loaded:
+                        log("Загрузка модели Silero...")
+                    model = model_manager.get()
+                    log("✅ Модель загружена")
+                    if threads:
+                        # После загрузки: явное число потоков важнее профиля инференса
+                        import torch
+                        torch.set_num_threads(threads)
+                results = _local_batches(model, batches, texts, voices, sample_rate)
+                synthesize_one = lambda i: synthesize_audio(model, [i], texts, voices[i], sample_rate)[0]
+
+            failed = set()
+            for batch, audios, error in results:
+                if error is not None:
+                    partial = isinstance(error, PartialBatchError)
+                    if on_failure is None:
+                        raise next(iter(error.errors.values())) if partial else error
+                    import numpy as np
+
+                    # Ищем предложение, на котором падает модель: готовое аудио пакета оставляем,
+                    # остальные предложения озвучиваем по одному
+                    logger.warning(f"Ошибка синтеза пакета из {len(batch)} предложений: {error}")
+                    audios = list(error.audios) if partial else [None] * len(batch)
+                    for position, i in enumerate(batch):
+                        if audios[position] is not None:
+                            continue
+                        try:
+                            if partial:
+                                raise error.errors[position]  # Модель уже пробовала его отдельно
+                            if len(batch) == 1:
+                                raise error
+                            audios[position] = synthesize_one(i)
+                        except Exception as e:
+                            failed.add(i)
+                            audios[position] = np.zeros(0, dtype=np.float32)
+                            on_failure(start + i, texts[i], e)
+                for i, audio in zip(batch, audios):
+                    ready[i] = audio
+                    if i in failed:
+                        continue
+                    counts['synthesized'] += 1
+                    if cache is not None:
+                        cache.store(texts[i], voices[i], sample_rate, audio)
+                    if dedup is not None:
+                        ready[i] = dedup.put(dedup.key(texts[i], voices[i]), audio)
+            for i, original in repeats.items():
+                ready[i] = ready[original]
+                if original in failed:
+                    on_failure(start + i, texts[i], RuntimeError("повтор предложения, которое не удалось озвучить"))
+
+            for i in window:
+                yield start + i, ready.pop(i)
+            start += len(texts)
+    finally:
+        if pool is not None:
+            pool.close()
+
+# === Потоковое кодирование в MP3 ===
+# PCM из модели сразу уходит в stdin одного процесса ffmpeg — без временных WAV и списка склейки.
+STREAM_ENCODING = True
+
+# === Форматы вывода ===
+# Один проход синтеза может сохраняться сразу в нескольких форматах: ffmpeg кодирует все копии
+# из одного потока PCM. Формат задаётся строкой «формат[:битрейт]», например opus:24k.
+# Без битрейта берётся типичный для частоты синтеза (192k MP3 на 8 кГц ffmpeg просто не примет).
+OUTPUT_FORMATS = {
+    # формат: (кодек ffmpeg, расширение, битрейт по умолчанию для 8000 / 24000 / 48000 Гц)
+    'mp3': ('libmp3lame', '.mp3', {8000: '32k', 24000: '64k', 48000: '192k'}),
+    'opus': ('libopus', '.opus', {8000: '12k', 24000: '24k', 48000: '32k'}),
+    'ogg': ('libvorbis', '.ogg', {8000: '24k', 24000: '48k', 48000: '64k'}),
+    'aac': ('aac', '.m4a', {8000: '24k', 24000: '48k', 48000: '96k'}),
+}
+OUTPUT_PRESETS = {
+    # пресет: (частота синтеза, форматы, описание для GUI)
+    'studio': (48000, ['mp3'], "48 кГц, MP3 192k — как раньше"),
+    'audiobook': (24000, ['mp3', 'opus'], "24 кГц, MP3 64k + Opus 24k — аудиокниги"),
+    'phone': (8000, ['opus'], "8 кГц, Opus 12k — телефония и голосовые"),
+}
+DEFAULT_OUTPUT_PRESET = 'studio'
+
+def parse_output_format(spec: str, sample_rate: int) -> Tuple[str, str, str, str]:
+    """«opus:24k» → ('opus', 'libopus', '.opus', '24k')"""
+    name, _, bitrate = spec.strip().lower().partition(':')
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Неизвестный формат: {name}. Доступны: {', '.join(OUTPUT_FORMATS)}")
+    codec, suffix, bitrates = OUTPUT_FORMATS[name]
+    if not bitrate:
+        bitrate = bitrates[min(bitrates, key=lambda sr: abs(sr - sample_rate))]
+    elif not re.fullmatch(r'\d+k?', bitrate):
+        raise ValueError(f"Неверный битрейт: {bitrate} (пример: 64k)")
+    return name, codec, suffix, bitrate
+
+def output_renditions(output: Path, formats: List[str], sample_rate: int) -> List[Tuple[Path, str, str]]:
+    """Пути и кодеки всех копий: [(путь, кодек, битрейт)], первая — основной файл.
+
+    Имя берётся от output с расширением формата. Если расширение повторяется (mp3:64k и mp3:192k),
+    к имени добавляется битрейт.
+    """
+    output = Path(output)
+    parsed = [parse_output_format(spec, sample_rate) for spec in formats or ['mp3']]
+    suffixes = collections.Counter(suffix for _, _, suffix, _ in parsed)
+    renditions = []
+    for name, codec, suffix, bitrate in parsed:
+        if suffixes[suffix] == 1:
+            path = output.with_suffix(suffix)
+        else:
+            path = output.with_name(f"{output.stem}_{bitrate}{suffix}")
+        if path not in [r[0] for r in renditions]:
+            renditions.append((path, codec, bitrate))
+    return renditions
+
+def resolve_output_profile(preset: str = None, sample_rate: int = None,
+                           formats: List[str] = None) -> Tuple[int, List[str]]:
+    """Частота и форматы из пресета; явно заданные sample_rate и formats важнее пресета"""
+    preset_rate, preset_formats, _ = OUTPUT_PRESETS[preset or DEFAULT_OUTPUT_PRESET]
+    sample_rate = sample_rate or preset_rate
+    formats = formats or preset_formats
+    for spec in formats:
+        parse_output_format(spec, sample_rate)  # Ошибку в формате показываем до начала озвучки
+    return sample_rate, list(formats)
+
+def format_duration(seconds: float) -> str:
+    """Длительность в формате ffmpeg: ЧЧ:ММ:СС.сс"""
+    minutes, sec = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{sec:05.2f}"
+
+class FFmpegStreamEncoder:
+    """Один долгоживущий ffmpeg: float32 PCM в stdin → MP3 (или другой формат) на диске.
+
+    renditions — дополнительные копии [(путь, кодек, битрейт)], которые тот же ffmpeg
+    кодирует из того же потока (см. output_renditions).
+    """
+
+    def __init__(self, output: Path, sample_rate: int, bitrate: str = "192k", codec: str = "libmp3lame",
+                 renditions: List[Tuple[Path, str, str]] = ()):
+        self.output = Path(output)
+        self.outputs = [(self.output, codec, bitrate)] + [(Path(p), c, b) for p, c, b in renditions]
+        self.sample_rate = sample_rate
+        self.samples = 0
+        cmd = [
+            get_ffmpeg_path(),
+            "-hide_banner", "-loglevel", "error",
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", "1",
+            "-i", "pipe:0",
+        ]
+        for path, codec, bitrate in self.outputs:
+            cmd += [
+                "-c:a", codec,     # кодек (libmp3lame для MP3)
+                "-b:a", bitrate,   # битрейт
+                "-y",              # перезаписать
+                str(path)
+            ]
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        )
+
+    @property
+    def duration(self) -> float:
+        """Длительность записанного аудио по числу сэмплов — без повторного декодирования"""
+        return self.samples / self.sample_rate
+
+    @metrics.timed('encode')
+    def write(self, audio):
+        import numpy as np
+
+        data = np.ascontiguousarray(audio, dtype='<f4')
+        try:
+            self.proc.stdin.write(data.tobytes())
+        except (BrokenPipeError, OSError):
+            # ffmpeg упал — причину покажет close()
+            self.close()
+            raise
+        self.samples += len(data)
+
+    @metrics.timed('encode_finish')
+    def close(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+        stderr = self.proc.stderr.read().decode('utf-8', errors='replace')
+        if self.proc.wait() != 0:
+            raise Exception(f"ffmpeg вернул ошибку: {stderr}")
+
+    def abort(self):
+        self.proc.kill()
+        self.proc.wait()
+        for path, _, _ in self.outputs:
+            path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+# === Сборка аудио в памяти ===
+# Модель оставляет в начале и в конце каждого чанка тишину разной длины. Срезаем её по энергии
+# окон (векторно, без цикла по сэмплам) и вставляем паузы по знаку в конце чанка и границам абзацев.
+TRIM_SILENCE = True
+TRIM_THRESHOLD_DB = -50    # Окно тише этого уровня (dBFS) считается тишиной
+TRIM_FRAME_MS = 10         # Размер окна для оценки энергии
+TRIM_PAD_MS = 30           # Сколько тишины оставить у края, чтобы не срезать затухание звука
+FADE_MS = 5                # Плавное нарастание/затухание на краях, чтобы стыки не щёлкали
+PAUSE_COMMA_MS = 150       # Чанк закончился запятой, двоеточием или тире (длинное предложение разрезано)
+PAUSE_SENTENCE_MS = 350    # Чанк закончился точкой, ! ? или многоточием
+PAUSE_PARAGRAPH_MS = 800   # Конец абзаца
+
+def trim_silence(audio, sample_rate: int, threshold_db: float = None, pad_ms: int = None):
+    """Срезаем тишину в начале и в конце чанка. Полностью тихий чанк становится пустым."""
+    import numpy as np
+
+    threshold_db = TRIM_THRESHOLD_DB if threshold_db is None else threshold_db
+    pad_ms = TRIM_PAD_MS if pad_ms is None else pad_ms
+    audio = np.asarray(audio, dtype=np.float32)
+    frame = max(1, sample_rate * TRIM_FRAME_MS // 1000)
+    frames = len(audio) // frame
+    if frames == 0:
+        return audio
+
+    rms = np.sqrt(np.mean(np.square(audio[:frames * frame].reshape(frames, frame)), axis=1))
+    loud = np.flatnonzero(rms > 10 ** (threshold_db / 20))
+    if loud.size == 0:
+        return audio[:0]
+
+    pad = sample_rate * pad_ms // 1000
+    start = max(0, loud[0] * frame - pad)
+    end = len(audio) if loud[-1] == frames - 1 else min(len(audio), (loud[-1] + 1) * frame + pad)
+    audio = audio[start:end].copy()
+
+    fade = min(len(audio) // 2, sample_rate * FADE_MS // 1000)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        audio[:fade] *= ramp
+        audio[-fade:] *= ramp[::-1]
+    return audio
+
+@metrics.timed('assemble')
+def prepare_segment(audio, sample_rate: int):
+    """Аудио чанка в том виде, в каком оно попадёт в MP3"""
+    import numpy as np
+
+    if TRIM_SILENCE:
+        return trim_silence(audio, sample_rate)
+    return np.asarray(audio, dtype=np.float32)
+
+def pause_after(text: str, paragraph_end: bool = False) -> int:
+    """Длина паузы после чанка в миллисекундах"""
+    if paragraph_end:
+        return PAUSE_PARAGRAPH_MS
+    if _SENTENCE_END_RE.search(text):
+        return PAUSE_SENTENCE_MS
+    if re.search(r'[,;:—–\-]$', text):
+        return PAUSE_COMMA_MS
+    return 0
+
+def silence(ms: int, sample_rate: int):
+    import numpy as np
+
+    return np.zeros(sample_rate * ms // 1000, dtype=np.float32)
+
+@metrics.timed('assemble')
+def assemble_audio(segments: list, pauses_ms: List[int], sample_rate: int):
+    """Склеиваем чанки с паузами в один заранее выделенный буфер.
+
+    pauses_ms[i] — пауза после segments[i]; после последнего чанка пауза не ставится.
+    """
+    import numpy as np
+
+    gaps = [sample_rate * ms // 1000 for ms in pauses_ms[:len(segments) - 1]]
+    out = np.zeros(sum(len(a) for a in segments) + sum(gaps), dtype=np.float32)
+    pos = 0
+    for k, audio in enumerate(segments):
+        out[pos:pos + len(audio)] = audio
+        pos += len(audio)
+        if k < len(gaps):
+            pos += gaps[k]
+    return out
+
+# === Склейка в MP3 (через ffmpeg напрямую) ===
+def convert_and_concatenate(wav_files: List[Path], output_mp3: Path):
+    """Склеиваем WAV и конвертируем в MP3 через ffmpeg напрямую"""
+    import subprocess
+    import tempfile
+
+    logger.info("Начинаем склейку и конвертацию через ffmpeg...")
+    try:
         # Создаём временный .txt файл с путями к WAV
         with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as f:
             for wav in wav_files:
@@ -381,56 +2891,1838 @@ def convert_and_concatenate(wav_files: List[Path], output_mp3: Path):
                 f.write(f"file '{wav.absolute()}'\n")
             list_file = f.name
 
-        # Команда ffmpeg для склейки и конвертации
-        cmd = [
-            FFMPEG_PATH,  # Используем путь, найденный в начале
-            "-f", "concat",
-            "-safe", "0",
-            "-i", list_file,
-            "-c:a", "libmp3lame",  # для MP3
-            "-b:a", "192k",        # битрейт
-            "-y",                  # перезаписать
-            str(output_mp3)
-        ]
+        # Команда ffmpeg для склейки и конвертации
+        cmd = [
+            get_ffmpeg_path(),  # ffmpeg ищем при первой конвертации
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_file,
+            "-c:a", "libmp3lame",  # для MP3
+            "-b:a", "192k",        # битрейт
+            "-y",                  # перезаписать
+            str(output_mp3)
+        ]
+
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg вернул ошибку: {result.stderr}")
+
+        logger.info(f"✅ Аудио сохранено: {output_mp3}")
+        # Получим длительность через ffmpeg
+        cmd_duration = [get_ffmpeg_path(), "-i", str(output_mp3), "-f", "null", "-"]
+        result_dur = subprocess.run(cmd_duration, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        duration_line = [l for l in result_dur.stderr.split('\n') if 'Duration' in l]
+        if duration_line:
+            duration = duration_line[0].split(',')[0].replace('Duration: ', '').strip()
+            logger.info(f"Длительность: {duration}")
+
+    except Exception as e:
+        logger.error(f"Ошибка конвертации: {e}")
+        raise
+    finally:
+        # Удаляем временный .txt файл
+        try:
+            os.unlink(list_file)
+        except:
+            pass
+
+# === Возобновление прерванной озвучки ===
+# Во время озвучки готовые предложения дописываются в спул audio.f32 (сырой float32),
+# а журнал manifest.jsonl хранит хэш текста и смещение аудио каждого из них.
+# Повторный запуск сверяет журнал с текущим текстом и озвучивает только то, что не готово.
+# Предложение, на котором падает модель, пропускается (тишина) и попадает в отчёт; в журнале
+# оно отмечено как failed, и следующий запуск попробует озвучить его снова.
+TEMP_DIR_NAME = "temp_tts_chunks"
+SKIP_FAILED_CHUNKS = True       # False — останавливать озвучку на первой ошибке модели
+CHECKPOINT_FSYNC_SECONDS = 5    # Как часто сбрасывать журнал и спул на диск (на случай отключения питания)
+
+def job_work_dir(file: Path, speaker: str) -> Path:
+    """Рабочая папка задачи: своя для каждого файла и голоса, чтобы параллельные задачи не мешали друг другу"""
+    return file.parent / TEMP_DIR_NAME / f"{file.stem}_{speaker}"
+
+def remove_work_dir(work_dir: Path):
+    shutil.rmtree(work_dir, ignore_errors=True)
+    try:
+        work_dir.parent.rmdir()  # Убираем temp_tts_chunks, если в нём больше ничего нет
+    except OSError:
+        pass
+
+def sentence_hash(text: str) -> str:
+    return hashlib.sha1(normalize_cache_text(text).encode('utf-8')).hexdigest()
+
+class ResumeManifest:
+    """Журнал готовых предложений файла и спул с их аудио.
+
+    Запись журнала ищется по номеру чанка и хэшу текста. Повторно озвученный чанк дописывается
+    в конец спула, и его новая запись заменяет прежнюю.
+    """
+
+    def __init__(self, work_dir: Path, sample_rate: int):
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.journal_path = self.work_dir / "manifest.jsonl"
+        self.spool_path = self.work_dir / "audio.f32"
+        self.entries = {}  # Номер чанка → последняя запись о нём
+        self._end = 0      # Конец аудио последней целой записи в спуле, в сэмплах
+        self._journal = None
+        self._spool = None
+        self._synced = time.monotonic()
+
+    def _read_journal(self) -> list:
+        entries = []
+        if not self.journal_path.exists():
+            return entries
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # Строка, оборванная при аварийном завершении
+        return entries
+
+    def load(self) -> int:
+        """Читаем журнал прошлого запуска (только записи с целым аудио в спуле). Возвращает число готовых чанков."""
+        spool_size = self.spool_path.stat().st_size if self.spool_path.exists() else 0
+        self.entries = {}
+        self._end = 0
+        for entry in self._read_journal():
+            end = entry['offset'] + entry['samples']
+            if entry.get('sample_rate') != self.sample_rate or end * 4 > spool_size:
+                break
+            self.entries[entry['i']] = entry
+            self._end = max(self._end, end)
+        return sum('failed' not in entry for entry in self.entries.values())
+
+    def matches(self, k: int, text: str) -> bool:
+        """Совпадает ли запись журнала о чанке k с его текущим текстом (пропущенные из-за ошибки — не совпадают)"""
+        entry = self.entries.get(k)
+        return entry is not None and entry.get('sha') == sentence_hash(text) and 'failed' not in entry
+
+    def open(self):
+        """Переписываем журнал без заменённых и оборванных записей и продолжаем дописывать его и спул"""
+        with open(self.spool_path, 'ab') as f:
+            f.truncate(self._end * 4)
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            for _, entry in sorted(self.entries.items()):
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._spool = open(self.spool_path, 'ab')
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    @metrics.timed('journal_read')
+    def read(self, k: int):
+        """Аудио k-го готового предложения из спула"""
+        import numpy as np
+
+        entry = self.entries[k]
+        return np.fromfile(self.spool_path, dtype='<f4', count=entry['samples'], offset=entry['offset'] * 4)
+
+    @metrics.timed('journal_write')
+    def append(self, index: int, text: str, audio, failed: str = None):
+        """Дописываем готовый чанк; failed — причина, по которой он пропущен (аудио пустое)"""
+        import numpy as np
+
+        data = np.ascontiguousarray(audio, dtype='<f4')
+        offset = self._end
+        self._spool.write(data.tobytes())
+        self._spool.flush()
+        entry = {'i': index, 'sha': sentence_hash(text), 'offset': offset,
+                 'samples': len(data), 'sample_rate': self.sample_rate}
+        if failed is not None:
+            entry['failed'] = failed
+        # Запись в журнал — после аудио: строка журнала появляется только для полностью записанного предложения
+        self._journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        self.entries[index] = entry
+        self._end += len(data)
+        if time.monotonic() - self._synced >= CHECKPOINT_FSYNC_SECONDS:
+            os.fsync(self._spool.fileno())
+            os.fsync(self._journal.fileno())
+            self._synced = time.monotonic()
+
+    def close(self):
+        for f in (self._spool, self._journal):
+            if f is not None and not f.closed:
+                f.close()
+
+    def remove(self):
+        self.close()
+        remove_work_dir(self.work_dir)
+
+# === Инкрементальная переозвучка ===
+# После озвучки в .tts_renders/ рядом с исходником остаётся аудио каждого чанка (уже с обрезанной
+# тишиной) в спуле audio-N.f32 и индекс render.json с хэшем текста и смещением каждого чанка.
+# Следующая озвучка того же файла тем же голосом ищет свои чанки в индексе и озвучивает только
+# новые и изменённые, а остальные вклеивает из спула. Новое аудио дописывается в конец спула;
+# когда устаревшее аудио занимает больше половины спула, он переписывается в следующий audio-N.f32.
+INCREMENTAL_RENDER = False
+RENDER_STORE_DIR_NAME = ".tts_renders"
+
+def render_store_dir(file: Path, speaker: str, sample_rate: int) -> Path:
+    return file.parent / RENDER_STORE_DIR_NAME / f"{file.stem}_{speaker}_{sample_rate}"
+
+class RenderStore:
+    """Аудио чанков прошлой озвучки документа по хэшу текста; копит индекс новой озвучки"""
+
+    def __init__(self, work_dir: Path, sample_rate: int):
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_rate = sample_rate
+        self.index_path = self.work_dir / "render.json"
+        self.generation = 1
+        self.seconds_per_char = 0.0  # Скорость синтеза прошлой озвучки — для оценки сэкономленного времени
+        self.known = {}    # Хэш текста → запись (offset, samples в спуле)
+        self.entries = []  # Чанки новой озвучки по порядку
+        self._end = 0      # Конец спула в сэмплах
+        self._spool = None
+
+    @property
+    def spool_path(self) -> Path:
+        return self.work_dir / f"audio-{self.generation}.f32"
+
+    def load(self) -> int:
+        """Читаем индекс прошлой озвучки (только записи с целым аудио в спуле). Возвращает число чанков."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index['sample_rate'] != self.sample_rate:
+                return 0
+            self.generation = index['generation']
+            self._end = self.spool_path.stat().st_size // 4
+        except (OSError, ValueError, KeyError):
+            return 0
+        self.seconds_per_char = index.get('seconds_per_char', 0.0)
+        for entry in index.get('chunks', []):
+            if entry['offset'] + entry['samples'] <= self._end:
+                self.known.setdefault(entry['sha'], entry)
+        return len(self.known)
+
+    def lookup(self, text: str) -> dict:
+        return self.known.get(sentence_hash(text))
+
+    @metrics.timed('journal_read')
+    def read(self, entry: dict):
+        import numpy as np
+
+        return np.fromfile(self.spool_path, dtype='<f4', count=entry['samples'], offset=entry['offset'] * 4)
+
+    @metrics.timed('journal_write')
+    def add(self, text: str, audio):
+        """Чанк новой озвучки: уже известный текст ссылается на своё аудио в спуле, новый дописывается"""
+        import numpy as np
+
+        sha = sentence_hash(text)
+        entry = self.known.get(sha)
+        if entry is None:
+            if self._spool is None:
+                self._spool = open(self.spool_path, 'ab')
+                self._spool.truncate(self._end * 4)  # Хвост, оборванный при аварийном завершении
+            data = np.ascontiguousarray(audio, dtype='<f4')
+            self._spool.write(data.tobytes())
+            self._spool.flush()  # Повтор этого чанка дальше в документе прочитается из файла
+            entry = self.known[sha] = {'sha': sha, 'offset': self._end, 'samples': len(data)}
+            self._end += len(data)
+        self.entries.append(entry)
+
+    def _compact(self):
+        """Переписываем в новый спул только аудио чанков новой озвучки"""
+        import numpy as np
+
+        # Отрезок — пара (смещение, длина): у пустого чанка то же смещение, что у следующего за ним
+        moved = {}
+        source = self.spool_path
+        self.generation += 1
+        with open(self.spool_path, 'wb') as out:
+            for entry in self.entries:
+                span = (entry['offset'], entry['samples'])
+                if span not in moved:
+                    moved[span] = out.tell() // 4
+                    np.fromfile(source, dtype='<f4', count=entry['samples'], offset=entry['offset'] * 4).tofile(out)
+            self._end = out.tell() // 4
+        self.entries = [dict(entry, offset=moved[(entry['offset'], entry['samples'])]) for entry in self.entries]
+
+    def commit(self, seconds_per_char: float = None):
+        """Сохраняем индекс новой озвучки — с этого момента она становится «прошлой»"""
+        self.close()
+        live = {(entry['offset'], entry['samples']) for entry in self.entries}
+        if sum(samples for _, samples in live) * 2 < self._end:
+            self._compact()
+        if seconds_per_char:
+            self.seconds_per_char = seconds_per_char
+        index = {'sample_rate': self.sample_rate, 'generation': self.generation,
+                 'seconds_per_char': self.seconds_per_char, 'chunks': self.entries}
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_path)
+        # Старые спулы удаляем только после записи индекса, который на них уже не ссылается
+        for path in self.work_dir.glob("audio-*.f32"):
+            if path != self.spool_path:
+                path.unlink()
+
+    def close(self):
+        if self._spool is not None and not self._spool.closed:
+            self._spool.close()
+
+# === Озвучка файла целиком (API без GUI) ===
+DEFAULT_SPEAKER = 'xenia'
+DEFAULT_SAMPLE_RATE = 48000
+SUPPORTED_SAMPLE_RATES = [8000, 24000, 48000]
+SUPPORTED_EXTENSIONS = ['.txt', '.docx', '.doc', '.rtf', '.odt']
+
+class JobCancelled(Exception):
+    """Озвучка отменена пользователем"""
+
+class JobControl:
+    """Пауза и отмена задачи озвучки из другого потока"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # Снимаем с паузы, чтобы задача увидела отмену
+
+    def checkpoint(self):
+        """Вызывается между предложениями: ждём снятия паузы и выходим при отмене"""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise JobCancelled("Озвучка отменена")
+
+# === Разметка времени и главы ===
+# Время каждого чанка считается по числу сэмплов, записанных в аудио, — без декодирования MP3,
+# а внутри чанка делится между его предложениями по числу символов. В индекс идёт исходный текст
+# предложения (до нормализации), чтобы по нему можно было искать.
+# Индекс пишется по мере озвучки: JSON (для поиска и склейки), WebVTT и SRT (субтитры в плеерах).
+# Главы — заголовки документа: вшиваются в аудио (ID3 CHAP в MP3, главы MP4 в m4a)
+# и пишутся в JSON и в Имя.chapters.vtt.
+TIMING_FORMATS = ['json']  # Из 'json', 'vtt', 'srt'; пустой список — без индекса
+EMBED_CHAPTERS = True
+# В Ogg (opus, ogg) ffmpeg округляет секунды начала главы и сдвигает её до секунды — туда не вшиваем
+CHAPTER_CONTAINERS = {'.mp3', '.m4a'}
+
+def _timestamp(seconds: float, separator: str = '.') -> str:
+    """ЧЧ:ММ:СС.ммм (WebVTT) или ЧЧ:ММ:СС,ммм (SRT)"""
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3600 * 1000)
+    minutes, ms = divmod(ms, 60 * 1000)
+    sec, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{sec:02d}{separator}{ms:03d}"
+
+class TimingIndex:
+    """Индекс времени предложений и глав для одного результата озвучки.
+
+    Файлы пишутся во временные копии и появляются под своими именами только при успешном close().
+    """
+
+    def __init__(self, output: Path, sample_rate: int, formats: List[str] = None, source: Path = None,
+                 audio: List[Path] = ()):
+        self.output = Path(output)
+        self.sample_rate = sample_rate
+        self.formats = TIMING_FORMATS if formats is None else formats
+        unknown = set(self.formats) - {'json', 'vtt', 'srt'}
+        if unknown:
+            raise ValueError(f"Неизвестный формат индекса: {', '.join(sorted(unknown))}. Доступны: json, vtt, srt")
+        self.chapters = []  # (начало в сэмплах, уровень, заголовок, номер чанка)
+        self.end = 0
+        self.cues = 0
+        self.written = []
+        self._pending = None  # Последнее предложение: может продолжиться в следующем чанке
+        self.paths = {fmt: self.output.with_suffix('.timings.json' if fmt == 'json' else f'.{fmt}')
+                      for fmt in self.formats}
+        self._files = {fmt: open(self._tmp(path), 'w', encoding='utf-8') for fmt, path in self.paths.items()}
+        # JSON пишется по частям: шапка без закрывающей скобки, сегменты по одному, главы — в close()
+        if 'json' in self._files:
+            header = {'source': str(source) if source else None, 'audio': [Path(p).name for p in audio],
+                      'sample_rate': sample_rate}
+            self._files['json'].write(json.dumps(header, ensure_ascii=False)[:-1] + ', "segments": [\n')
+        if 'vtt' in self._files:
+            self._files['vtt'].write("WEBVTT\n\n")
+
+    @staticmethod
+    def _tmp(path: Path) -> Path:
+        return path.with_name(path.name + ".tmp")
+
+    def add(self, index: int, start: int, end: int, sentences: List[Tuple[int, str, int]], voice: str = None,
+            chapter: Tuple[int, str] = None):
+        """Чанк index занимает сэмплы [start, end); chapter — (уровень, заголовок), если с него начинается глава.
+
+        sentences — предложения чанка (номер, исходный текст, символов в чанке), см. plan_paragraph_sentences.
+        Точное время известно для границ чанка, внутри него сэмплы делятся по числу символов.
+        Предложение, разрезанное на несколько чанков, записывается одним сегментом.
+        """
+        if chapter is not None:
+            self.chapters.append((start, chapter[0], chapter[1], index))
+        self.end = max(self.end, end)
+        total = sum(chars for _, _, chars in sentences) or 1
+        position = start
+        consumed = 0
+        for number, text, chars in sentences:
+            consumed += chars
+            stop = start + (end - start) * consumed // total
+            if self._pending is not None and self._pending[0] == number:
+                self._pending[2] = stop
+            else:
+                self._flush()
+                self._pending = [number, position, stop, text, voice, index]
+            position = stop
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        _, start, end, text, voice, chunk = self._pending
+        self._pending = None
+        t0, t1 = start / self.sample_rate, end / self.sample_rate
+        cue = ' '.join(text.split())
+        files = self._files
+        if 'json' in files:
+            segment = {'index': self.cues, 'chunk': chunk, 'start': round(t0, 3), 'end': round(t1, 3), 'text': cue}
+            if voice:
+                segment['voice'] = voice
+            files['json'].write((",\n" if self.cues else "") + json.dumps(segment, ensure_ascii=False))
+        if 'vtt' in files:
+            files['vtt'].write(f"{_timestamp(t0)} --> {_timestamp(t1)}\n{cue}\n\n")
+        if 'srt' in files:
+            files['srt'].write(f"{self.cues + 1}\n{_timestamp(t0, ',')} --> {_timestamp(t1, ',')}\n{cue}\n\n")
+        self.cues += 1
+
+    def chapter_spans(self) -> List[Tuple[float, float, int, str]]:
+        """(начало, конец в секундах, уровень, заголовок): глава длится до следующей"""
+        starts = [start for start, _, _, _ in self.chapters[1:]] + [self.end]
+        return [(start / self.sample_rate, stop / self.sample_rate, level, title)
+                for (start, level, title, _), stop in zip(self.chapters, starts)]
+
+    def close(self) -> List[Path]:
+        """Дописываем главы и длительность, переименовываем файлы. Возвращает пути записанных файлов."""
+        self._flush()
+        spans = self.chapter_spans()
+        if 'json' in self._files:
+            chapters = [{'index': index, 'start': round(start, 3), 'end': round(stop, 3), 'level': level,
+                         'title': title} for (start, stop, level, title), (_, _, _, index) in zip(spans, self.chapters)]
+            self._files['json'].write("\n], " + json.dumps({
+                'duration': round(self.end / self.sample_rate, 3), 'chapters': chapters,
+            }, ensure_ascii=False, indent=1)[1:] + "\n")
+        for f in self._files.values():
+            f.close()
+        written = []
+        for path in self.paths.values():
+            os.replace(self._tmp(path), path)
+            written.append(path)
+        if 'vtt' in self.paths and spans:
+            path = self.output.with_suffix('.chapters.vtt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("WEBVTT\n\n")
+                for start, stop, _, title in spans:
+                    f.write(f"{_timestamp(start)} --> {_timestamp(stop)}\n{title}\n\n")
+            written.append(path)
+        return written
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        for path in self.paths.values():
+            self._tmp(path).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.written = self.close()
+        else:
+            self.abort()
+
+def _ffmetadata_escape(value: str) -> str:
+    return re.sub(r'([=;#\\\n])', r'\\\1', value)
+
+def embed_chapters(path: Path, chapters: List[Tuple[float, float, int, str]]):
+    """Вшиваем главы в готовый файл: ffmpeg переупаковывает его без перекодирования"""
+    import tempfile
+
+    path = Path(path)
+    with tempfile.TemporaryDirectory(dir=path.parent) as tmp:
+        metadata = Path(tmp) / "chapters.txt"
+        with open(metadata, 'w', encoding='utf-8') as f:
+            f.write(";FFMETADATA1\n")
+            for start, stop, _, title in chapters:
+                f.write(f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={int(start * 1000)}\nEND={int(stop * 1000)}\n"
+                        f"title={_ffmetadata_escape(title)}\n")
+        remuxed = Path(tmp) / f"chapters{path.suffix}"
+        cmd = [get_ffmpeg_path(), "-hide_banner", "-loglevel", "error", "-i", str(path), "-i", str(metadata),
+               "-map", "0", "-map_metadata", "1", "-map_chapters", "1", "-c", "copy", "-y", str(remuxed)]
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg вернул ошибку: {result.stderr.decode('utf-8', errors='replace')}")
+        os.replace(remuxed, path)
+
+FAILURE_REPORT_SUFFIX = ".skipped.txt"
+
+def write_failure_report(output: Path, source: Path, failures: Dict[int, Tuple[str, str]]) -> Path:
+    """Отчёт о пропущенных чанках рядом с результатом: Имя.skipped.txt"""
+    path = Path(output).with_name(Path(output).stem + FAILURE_REPORT_SUFFIX)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"Файл: {source}\n")
+        f.write(f"Пропущено чанков: {len(failures)} (в аудио на их месте тишина)\n\n")
+        for k, (text, error) in sorted(failures.items()):
+            f.write(f"#{k + 1}: {error}\n{text}\n\n")
+    return path
+
+def default_output_path(file: Path, speaker: str) -> Path:
+    """Имя результата рядом с исходником: имя_файла_голос_дата_время.mp3"""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return file.parent / f"{file.stem}_{speaker}_{timestamp}.mp3"
+
+def synthesize_file(file: Path, speaker: str = DEFAULT_SPEAKER, output: Path = None,
+                    sample_rate: int = DEFAULT_SAMPLE_RATE, workers: int = None, threads: int = None,
+                    use_cache: bool = None, stream: bool = None, resume: bool = False,
+                    log: Callable[[str], None] = None, on_progress: Callable[[float, str], None] = None,
+                    control: JobControl = None, stats: dict = None, profile: str = None,
+                    formats: List[str] = None, timings: List[str] = None, incremental: bool = None) -> Path:
+    """Озвучиваем файл и возвращаем путь к MP3 (к первому из formats).
+
+    stream=True пишет аудио сразу в ffmpeg, stream=False — собирает документ в памяти и кодирует целиком.
+    resume=True ведёт журнал готовых предложений, и прерванная озвучка продолжается с места остановки.
+    incremental=True озвучивает только чанки, которых не было в прошлой озвучке файла (см. RenderStore),
+    остальные берёт из неё; по умолчанию INCREMENTAL_RENDER.
+    log(message) получает сообщения о ходе работы, on_progress(percent, status) — прогресс.
+    Без колбэков сообщения уходят в logger. control позволяет поставить задачу на паузу
+    или отменить её (JobCancelled) из другого потока. Если передан словарь stats, в него
+    записываются characters, sentences, synthesized (чанков, озвученных моделью), cached (взято из кэша фраз),
+    audio_seconds, seconds, stages (время по видам работы),
+    outputs (путь, формат, битрейт и размер каждого файла), deduplicated (сколько чанков — повторы)
+    failed (чанки, пропущенные из-за ошибки модели: index, text, error), voices (чанков на голос из разметки),
+    timings (файлы индекса времени), chapters (сколько глав вшито в аудио), reused (чанков взято
+    из прошлой озвучки) и saved_seconds (оценка сэкономленного на этом времени синтеза).
+    Разметка [голос] и роли из Книга.voices.json (см. VoiceMarkup) меняют голос абзацев, speaker — голос
+    остального текста.
+    profile='cprofile' или 'torch' сохраняет профиль задачи рядом с MP3.
+    formats — форматы вывода («mp3», «opus:24k», см. OUTPUT_FORMATS): все копии кодируются
+    из одного прохода синтеза, основной файл — первый в списке.
+    timings — форматы индекса времени чанков ('json', 'vtt', 'srt', см. TimingIndex), по умолчанию TIMING_FORMATS.
+    """
+    if profile:
+        output = Path(output) if output else default_output_path(file, speaker)
+        with profile_job(profile, output):
+            return synthesize_file(file, speaker, output, sample_rate, workers, threads, use_cache, stream,
+                                   resume, log, on_progress, control, stats, formats=formats, timings=timings,
+                                   incremental=incremental)
+
+    started = time.perf_counter()
+    stages_before = metrics.snapshot()
+    file = Path(file)
+    log = log or logger.info
+    on_progress = on_progress or (lambda percent, status: None)
+    workers = workers or SYNTH_WORKERS
+    use_cache = AUDIO_CACHE_ENABLED if use_cache is None else use_cache
+    incremental = INCREMENTAL_RENDER if incremental is None else incremental
+    stream = (STREAM_ENCODING if stream is None else stream) or resume or incremental
+    control = control or JobControl()
+    if speaker not in SPEAKERS_INFO:
+        raise ValueError(f"Неизвестный голос: {speaker}. Доступны: {', '.join(SPEAKERS_INFO)}")
+
+    on_progress(0, "Запуск...")
+    log(f"Чтение файла: {file.name}")
+    document = DocumentStream(file, sentences=True)
+    # Чанки читаются по мере синтеза. Для ещё не записанных чанков держим текст, паузу после него
+    # и долю прочитанного файла (для прогресса) — это не больше окна SYNTH_WINDOW.
+    texts = {}
+    voices = {}
+    pauses = {}
+    positions = {}
+
+    def planned_chunks():
+        for k, (chunk, paragraph_end, voice) in enumerate(document.voiced_chunks()):
+            texts[k] = chunk
+            voices[k] = voice or speaker
+            pauses[k] = pause_after(chunk, paragraph_end)
+            positions[k] = document.fraction
+            yield chunk, voices[k]
+
+    def journal_text(k):
+        # Голос из разметки входит в хэш журнала: смена голоса абзаца — повод озвучить его заново
+        return texts[k] if voices[k] == speaker else f"[{voices[k]}] {texts[k]}"
+
+    chunks = planned_chunks()
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("Файл пуст или не содержит текста!")
+    chunks = itertools.chain([first], chunks)
+
+    # === Кэш фраз ===
+    cache = None
+    if use_cache:
+        cache = AudioCache(get_model_hash(get_silero_model_path()))
+        log(f"Кэш фраз: {cache.cache_dir}")
+
+    renditions = output_renditions(output or default_output_path(file, speaker), formats, sample_rate)
+    output_mp3, codec, bitrate = renditions[0]
+    dedup = DedupIndex() if SYNTH_DEDUP else None
+    failures = {}  # Номер чанка → (текст, причина): чанки, которые модель не смогла озвучить
+    format_names = ", ".join(f"{path.suffix[1:]} {rate}" for path, _, rate in renditions)
+    timing_args = (output_mp3, sample_rate, timings, file, [path for path, _, _ in renditions])
+    audio_seconds = 0.0
+    manifest = None    # Журнал для возобновления (resume)
+    store = None       # Прошлая озвучка файла (incremental)
+    fresh = {}         # Номер чанка в синтезе → номер в документе, когда часть чанков берётся готовыми
+    spliced = {}       # Номер чанка → (откуда, аудио) для готовых чанков, ещё не записанных
+    resumed = 0
+    reused = 0
+    reused_chars = 0
+    synthesized_chars = 0
+    counts = {}        # Сколько чанков озвучила модель и сколько взято из кэша фраз (см. iter_synthesized_audio)
+    saved_seconds = 0.0
+
+    def report(done):
+        texts.pop(done - 1, None)
+        voices.pop(done - 1, None)
+        percent = positions.pop(done - 1, 1.0) * 100
+        on_progress(percent, f"Озвучка... {done} чанков ({percent:.0f}%)")
+        log(f"Обработан чанк {done}")
+        control.checkpoint()
+
+    def gap(k):
+        """Тишина перед чанком k"""
+        return silence(pauses.pop(k - 1), sample_rate) if k else silence(0, sample_rate)
+
+    def skip(i, text, error):
+        k = fresh.get(i, i)
+        failures[k] = (text, f"{type(error).__name__}: {error}")
+        logger.error(f"❌ Чанк {k + 1} пропущен: {error}")
+
+    def reusable(k):
+        """Готовое аудио чанка k: ('journal', чтение) из журнала прерванного запуска,
+        ('render', чтение) из прошлой озвучки или None, если чанк надо озвучить"""
+        if manifest is not None and manifest.matches(k, journal_text(k)):
+            return 'journal', functools.partial(manifest.read, k)
+        entry = store.lookup(journal_text(k)) if store is not None else None
+        if entry is not None:
+            return 'render', functools.partial(store.read, entry)
+        return None
+
+    def splice(chunks):
+        """(номер, аудио): готовые чанки (см. reusable) читаются с диска, остальные озвучиваются"""
+        order = collections.deque()  # reusable() для каждого прочитанного чанка
+
+        def changed():
+            synth_index = itertools.count()
+            for k, item in enumerate(chunks):
+                found = reusable(k)
+                order.append(found)
+                if found is None:
+                    fresh[next(synth_index)] = k
+                    yield item
+
+        i = 0
+        audio_iter = iter_synthesized_audio(changed(), speaker, sample_rate, cache, workers, threads, log,
+                                            dedup, on_failure, counts)
+        with contextlib.closing(audio_iter):
+            # Синтез отдаёт чанки по порядку: перед каждым вклеиваем готовые чанки, прочитанные до него
+            for j, audio in itertools.chain(audio_iter, [(None, None)]):
+                while order and order[0] is not None:
+                    source, read = order.popleft()
+                    spliced[i] = source, read()
+                    yield i, spliced[i][1]
+                    i += 1
+                if j is not None:
+                    order.popleft()
+                    fresh.pop(j)
+                    yield i, audio
+                    i += 1
+
+    on_failure = skip if SKIP_FAILED_CHUNKS else None
+
+    control.checkpoint()
+    if stream:
+        # === Потоковая запись в MP3 ===
+        log(f"Озвучка с потоковой записью ({format_names})...")
+        # === Журнал для возобновления ===
+        if resume:
+            manifest = ResumeManifest(job_work_dir(file, speaker), sample_rate)
+            known = manifest.load()
+            manifest.open()
+            if known:
+                log(f"Возобновление: в журнале {known} озвученных чанков")
+        if incremental:
+            store = RenderStore(render_store_dir(file, speaker, sample_rate), sample_rate)
+            known = store.load()
+            log(f"Инкрементальная озвучка: в прошлой озвучке {known} чанков" if known else
+                "Инкрементальная озвучка: прошлой озвучки нет, озвучиваем целиком")
+        try:
+            with TimingIndex(*timing_args) as timing, \
+                    FFmpegStreamEncoder(output_mp3, sample_rate, bitrate, codec, renditions[1:]) as encoder:
+                if manifest is not None or store is not None:
+                    audio_iter = splice(chunks)
+                else:
+                    audio_iter = iter_synthesized_audio(chunks, speaker, sample_rate, cache, workers, threads, log,
+                                                        dedup, on_failure, counts)
+                with contextlib.closing(audio_iter):
+                    for k, audio in audio_iter:
+                        source = None
+                        if k in spliced:
+                            source, _ = spliced.pop(k)  # Уже подготовлен в прошлый раз
+                            if source == 'journal':
+                                resumed += 1
+                            else:
+                                reused += 1
+                                reused_chars += len(texts[k])
+                        else:
+                            audio = prepare_segment(audio, sample_rate)
+                            if k not in failures:
+                                synthesized_chars += len(texts[k])
+                        if store is not None and k not in failures:
+                            store.add(journal_text(k), audio)
+                        encoder.write(gap(k))
+                        start = encoder.samples
+                        encoder.write(audio)
+                        timing.add(k, start, encoder.samples, document.sentences.pop(k), voices[k],
+                                   document.chapters.get(k))
+                        if manifest is not None and source != 'journal':
+                            failed = failures.get(k)
+                            manifest.append(k, journal_text(k), audio, failed[1] if failed else None)
+                        report(k + 1)
+        except BaseException:
+            if manifest is not None:
+                manifest.close()  # Журнал остаётся для следующего запуска
+            if store is not None:
+                store.close()  # Индекс прошлой озвучки не меняется, дописанное аудио уберёт следующее сжатие
+            raise
+        if manifest is not None:
+            if failures:
+                manifest.close()  # Следующий запуск возьмёт из спула всё, кроме пропусков, и повторит только их
+            else:
+                manifest.remove()
+        if resumed:
+            log(f"Возобновление: из журнала взято {resumed} чанков")
+        if store is not None:
+            # Скорость синтеза: время модели на символ в этом запуске или, если озвучивать было нечего, в прошлых
+            snapshot = metrics.snapshot()
+            synth_seconds = sum(snapshot.get(stage, 0.0) - stages_before.get(stage, 0.0)
+                                for stage in ('apply_tts', 'pool_wait'))
+            seconds_per_char = synth_seconds / synthesized_chars if synthesized_chars else None
+            saved_seconds = reused_chars * (seconds_per_char or store.seconds_per_char)
+            store.commit(seconds_per_char)
+            log(f"Инкрементальная озвучка: взято готовыми {reused} из {document.chunks_read - resumed} чанков, "
+                f"озвучено заново {counts['synthesized']}, "
+                f"сэкономлено ≈{format_duration(saved_seconds)} синтеза")
+        audio_seconds = encoder.duration
+        log("✅ Озвучка завершена")
+        log(f"Длительность: {format_duration(encoder.duration)}")
+    else:
+        # === Сборка в памяти ===
+        segments = []
+        prepared = {}  # Повторы ссылаются на один и тот же готовый сегмент
+        cursor = 0     # Начало следующего чанка в сэмплах — так же, как его положит assemble_audio
+        with TimingIndex(*timing_args) as timing:
+            audio_iter = iter_synthesized_audio(chunks, speaker, sample_rate, cache, workers, threads, log,
+                                                dedup, on_failure, counts)
+            with contextlib.closing(audio_iter):
+                for i, audio in audio_iter:
+                    key = DedupIndex.key(texts[i], voices[i])
+                    if key not in prepared:
+                        prepared[key] = prepare_segment(audio, sample_rate)
+                    segments.append(prepared[key])
+                    if i:
+                        cursor += sample_rate * pauses[i - 1] // 1000
+                    timing.add(i, cursor, cursor + len(prepared[key]), document.sentences.pop(i), voices[i],
+                               document.chapters.get(i))
+                    cursor += len(prepared[key])
+                    report(i + 1)
+            del prepared
+            log("✅ Озвучка завершена")
+
+            # === Кодирование ===
+            on_progress(100, f"Кодирование ({format_names})...")
+            audio = assemble_audio(segments, [pauses[k] for k in range(len(segments))], sample_rate)
+            del segments
+            audio_seconds = len(audio) / sample_rate
+            with FFmpegStreamEncoder(output_mp3, sample_rate, bitrate, codec, renditions[1:]) as encoder:
+                encoder.write(audio)
+        log(f"Длительность: {format_duration(audio_seconds)}")
+
+    log(f"Прочитано символов: {document.characters}, чанков: {document.chunks_read}, "
+        f"абзацев: {document.paragraphs}")
+    if document.voice_chunks:
+        log("Голоса по разметке: " + ", ".join(
+            f"{voice} — {count} чанков" for voice, count in document.voice_chunks.most_common()))
+    if document.normalized_chars:
+        log(f"Нормализация текста: {document.normalized_chars} символов за {document.normalize_seconds:.2f} с "
+            f"({document.normalized_chars / max(document.normalize_seconds, 1e-9):.0f} символов/сек), "
+            f"слов из кэша: {normalization_cache_ratio():.0%}")
+    if cache is not None:
+        cache.log_stats()
+    if dedup is not None:
+        dedup.log_stats(log)
+    if failures:
+        failed_report = write_failure_report(output_mp3, file, failures)
+        log(f"⚠ Пропущено чанков: {len(failures)} — список в {failed_report.name}")
+    chapters = timing.chapter_spans() if EMBED_CHAPTERS else []
+    if chapters:
+        try:
+            for path, _, _ in renditions:
+                if path.suffix in CHAPTER_CONTAINERS:
+                    embed_chapters(path, chapters)
+            log(f"Глав: {len(chapters)}")
+        except Exception as e:
+            logger.warning(f"Не удалось вшить главы: {e}")
+            chapters = []
+    if timing.written:
+        log(f"Разметка времени: {', '.join(path.name for path in timing.written)}")
+    outputs = []
+    for path, _, rate in renditions:
+        size = path.stat().st_size
+        outputs.append({'path': str(path), 'format': path.suffix[1:], 'bitrate': rate, 'bytes': size})
+        log(f"✅ Аудио сохранено: {path.name} ({size / 1024:.0f} КБ)")
+
+    seconds = time.perf_counter() - started
+    stages = stage_breakdown(stages_before, metrics.snapshot(), seconds)
+    log("Время по этапам: " + ", ".join(
+        f"{kind} {value:.2f} с ({value / seconds * 100:.0f}%)"
+        for kind, value in sorted(stages.items(), key=lambda item: -item[1]) if value >= 0.005))
+    metrics.inc('tts_jobs_total')
+    metrics.inc('tts_characters_total', document.characters)
+    metrics.inc('tts_audio_seconds_total', round(audio_seconds, 3))
+    on_progress(100, "Готово!")
+    if stats is not None:
+        stats.update(
+            characters=document.characters,
+            sentences=document.chunks_read,
+            synthesized=counts.get('synthesized', 0),
+            cached=counts.get('cached', 0),
+            audio_seconds=audio_seconds,
+            seconds=seconds,
+            stages=stages,
+            outputs=outputs,
+            deduplicated=dedup.reused if dedup is not None else 0,
+            failed=[{'index': k, 'text': text, 'error': error} for k, (text, error) in sorted(failures.items())],
+            voices=dict(document.voice_chunks),
+            timings=[str(path) for path in timing.written],
+            chapters=len(chapters),
+            reused=reused,
+            saved_seconds=saved_seconds,
+        )
+    return output_mp3
+
+# === Пакетная обработка папки ===
+# Файлы распределяются по процессам от самых больших к маленьким. Готовые файлы отмечаются
+# в манифесте папки, а недоозвученные продолжаются по журналу предложений (resume).
+BATCH_MANIFEST_NAME = ".tts_batch_manifest.json"
+
+def scan_directory(root: Path, recursive: bool = True) -> List[Path]:
+    """Ищем поддерживаемые файлы в папке. Самые большие — первыми."""
+    root = Path(root)
+    pattern = '**/*' if recursive else '*'
+    files = [
+        p for p in root.glob(pattern)
+        if p.is_file()
+        and p.suffix.lower() in SUPPORTED_EXTENSIONS
+        and TEMP_DIR_NAME not in p.parts
+        and not p.name.startswith('~$')  # Временные файлы Word
+        and not p.name.endswith(FAILURE_REPORT_SUFFIX)  # Наши отчёты о пропусках — не книги
+    ]
+    return sorted(files, key=lambda p: p.stat().st_size, reverse=True)
+
+def _load_batch_manifest(path: Path) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_batch_manifest(path: Path, manifest: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def _format_throughput(stats: dict) -> str:
+    seconds = stats['seconds'] or 1e-9
+    rtf = seconds / stats['audio_seconds'] if stats['audio_seconds'] else 0.0
+    repeats = f", повторов {stats['deduplicated']}" if stats.get('deduplicated') else ""
+    repeats += f", из кэша {stats['cached']}" if stats.get('cached') else ""
+    return (f"{stats['sentences']} предложений ({stats['synthesized']} озвучено{repeats}), "
+            f"{stats['characters']} символов за {stats['seconds']:.1f} с — "
+            f"{stats['characters'] / seconds:.0f} символов/сек, RTF {rtf:.3f}")
 
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            raise Exception(f"ffmpeg вернул ошибку: {result.stderr}")
+def _batch_worker_init(threads: int):
+    import torch
 
-        logger.info(f"✅ Аудио сохранено: {output_mp3}")
-        # Получим длительность через ffmpeg
-        cmd_duration = [FFMPEG_PATH, "-i", str(output_mp3), "-f", "null", "-"]
-        result_dur = subprocess.run(cmd_duration, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        duration_line = [l for l in result_dur.stderr.split('\n') if 'Duration' in l]
-        if duration_line:
-            duration = duration_line[0].split(',')[0].replace('Duration: ', '').strip()
-            logger.info(f"Длительность: {duration}")
+    setup_logging()
+    torch.set_num_threads(threads)
 
-    except Exception as e:
-        logger.error(f"Ошибка конвертации: {e}")
-        raise
+def _batch_synthesize(file: Path, speaker: str, options: dict):
+    stats = {}
+    output = synthesize_file(file, speaker, resume=True, stats=stats, **options)
+    return output, stats
+
+def synthesize_directory(root: Path, speaker: str = DEFAULT_SPEAKER, jobs: int = 1, threads: int = None,
+                         recursive: bool = True, log: Callable[[str], None] = None, **options) -> Dict[Path, Path]:
+    """Озвучиваем все файлы папки, по jobs файлов параллельно. Возвращает {исходник: mp3}."""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    root = Path(root)
+    log = log or logger.info
+    manifest_path = root / BATCH_MANIFEST_NAME
+    manifest = _load_batch_manifest(manifest_path)
+
+    # Файл, озвученный с другой частотой или в другие форматы, озвучиваем заново
+    output_profile = {'sample_rate': options.get('sample_rate', DEFAULT_SAMPLE_RATE),
+                      'formats': options.get('formats') or ['mp3']}
+    todo = []
+    results = {}
+    for file in scan_directory(root, recursive):
+        key = file.relative_to(root).as_posix()
+        st = file.stat()
+        done = manifest.get(key)
+        if (done and done.get('speaker') == speaker and done.get('size') == st.st_size
+                and done.get('mtime') == st.st_mtime and (root / done.get('output', '')).is_file()
+                and done.get('sample_rate', DEFAULT_SAMPLE_RATE) == output_profile['sample_rate']
+                and done.get('formats', ['mp3']) == output_profile['formats']):
+            log(f"Пропуск (уже озвучен): {key}")
+            results[file] = root / done['output']
+            continue
+        todo.append(file)
+    log(f"Файлов к озвучке: {len(todo)}, уже готово: {len(results)}")
+    if not todo:
+        return results
+
+    total = {'characters': 0, 'sentences': 0, 'synthesized': 0, 'deduplicated': 0, 'cached': 0,
+             'audio_seconds': 0.0}
+    failed = []
+    started = time.perf_counter()
+
+    def finish(file: Path, output: Path, stats: dict):
+        key = file.relative_to(root).as_posix()
+        st = file.stat()
+        if stats.get('failed'):
+            # В манифест папки не пишем: следующий запуск дозвучит пропуски по журналу файла
+            log(f"⚠ {key}: пропущено чанков {len(stats['failed'])}, повторим при следующем запуске")
+        else:
+            # Путь к MP3 храним относительно папки, чтобы манифест не ломался при её переносе
+            manifest[key] = {'speaker': speaker, 'size': st.st_size, 'mtime': st.st_mtime,
+                             'output': Path(os.path.relpath(output, root)).as_posix(), **output_profile}
+            _save_batch_manifest(manifest_path, manifest)
+        results[file] = output
+        for name in total:
+            total[name] += stats[name]
+        log(f"✅ {key}: {_format_throughput(stats)}")
+
+    if jobs <= 1:
+        for file in todo:
+            try:
+                output, stats = _batch_synthesize(file, speaker, options)
+            except Exception as e:
+                logger.error(f"❌ {file.name}: {e}")
+                failed.append(file)
+                continue
+            finish(file, output, stats)
+    else:
+        threads = threads or max(1, (os.cpu_count() or 1) // jobs)
+        log(f"Параллельно файлов: {jobs}, потоков torch на файл: {threads}")
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx,
+                                 initializer=_batch_worker_init, initargs=(threads,)) as pool:
+            # Порядок отправки — от больших файлов к маленьким
+            futures = {pool.submit(_batch_synthesize, file, speaker, options): file for file in todo}
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    output, stats = future.result()
+                except Exception as e:
+                    logger.error(f"❌ {file.name}: {e}")
+                    failed.append(file)
+                    continue
+                finish(file, output, stats)
+
+    total['seconds'] = time.perf_counter() - started
+    log(f"Итого: {len(results)} файлов готово, ошибок: {len(failed)}")
+    log(f"Итого: {_format_throughput(total)}")
+    if failed:
+        raise RuntimeError(f"Не удалось озвучить: {', '.join(f.name for f in failed)}")
+    return results
+
+# === Локальный HTTP-сервер ===
+# Модель держится в памяти одним потоком-пакетировщиком. Предложения всех одновременных запросов
+# собираются за короткое окно и озвучиваются пакетами, а каждый ответ отдаётся частями
+# (Transfer-Encoding: chunked) по мере готовности предложений. По умолчанию слушаем только localhost.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_BATCH_WINDOW_MS = 20       # Сколько ждать предложения соседних запросов, чтобы озвучить их вместе
+SERVER_PREFETCH = 8               # Сколько предложений запроса держать в очереди наперёд
+SERVER_MAX_TEXT_CHARS = 100_000
+SERVER_MAX_BODY_BYTES = SERVER_MAX_TEXT_CHARS * 6 + 64 * 1024  # \uXXXX в JSON — 6 байт на символ, плюс запас
+SERVER_LATENCY_WINDOW = 1000      # По скольким последним запросам считать перцентили
+SERVER_FORMATS = {
+    'wav': 'audio/wav',
+    'pcm': 'audio/L16',           # 16 бит, моно, little-endian; частота — в заголовке X-Sample-Rate
+    'mp3': 'audio/mpeg',
+}
+
+class MicroBatcher:
+    """Поток с моделью: собирает предложения всех запросов за короткое окно и озвучивает пакетами"""
+
+    def __init__(self, cache: 'AudioCache' = None, window_ms: int = None, max_batch: int = None):
+        self.cache = cache
+        self.window = (SERVER_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or BATCH_MAX_SENTENCES
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.sentences = 0
+        self.error = None  # Ошибка загрузки модели: с ней сервер не озвучит ни одного запроса
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="tts-batcher")
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        """Сколько предложений ждут синтеза"""
+        return self.queue.qsize()
+
+    def submit(self, text: str, speaker: str, sample_rate: int):
+        """Ставим предложение в очередь. Возвращает Future с аудио numpy float32."""
+        from concurrent.futures import Future
+
+        future = Future()
+        if self.error is not None:
+            future.set_exception(self.error)
+        else:
+            self.queue.put((text, speaker, sample_rate, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+
+    def _collect(self, first) -> list:
+        items = [first]
+        deadline = time.monotonic() + self.window
+        while len(items) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # Остановка — после текущего пакета
+                break
+            items.append(item)
+        return items
+
+    def _loop(self):
+        import numpy as np
+
+        try:
+            model = model_manager.get()
+        except Exception as e:
+            logger.error(f"Сервер не смог загрузить модель: {e}")
+            self.error = e
+            # Все ждущие предложения и те, что успеют попасть в очередь до остановки, получают ту же ошибку
+            for item in iter(self.queue.get, None):
+                item[3].set_exception(e)
+            return
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            groups = {}
+            for item in self._collect(first):
+                groups.setdefault((item[1], item[2]), []).append(item)
+
+            for (speaker, sample_rate), items in groups.items():
+                pending = []
+                for text, _, _, future in items:
+                    audio = self.cache.load(text, speaker, sample_rate) if self.cache is not None else None
+                    if audio is None:
+                        pending.append((text, future))
+                    else:
+                        future.set_result(audio)
+                for bucket in make_length_buckets([text for text, _ in pending]):
+                    texts = [pending[i][0] for i in bucket]
+                    # Ошибка на одном предложении не должна задевать соседей по пакету — часто это чужие запросы
+                    try:
+                        audios, errors = synthesize_batch(model, texts, speaker, sample_rate), {}
+                    except PartialBatchError as e:
+                        logger.error(f"Ошибка синтеза на сервере: {e}")
+                        audios, errors = e.audios, e.errors
+                    except Exception as e:
+                        logger.error(f"Ошибка синтеза на сервере: {e}")
+                        audios, errors = [None] * len(bucket), {}
+                        for position, text in enumerate(texts):
+                            try:
+                                audios[position] = synthesize_batch(model, [text], speaker, sample_rate)[0]
+                            except Exception as error:
+                                errors[position] = error
+                    self.batches += 1
+                    for position, i in enumerate(bucket):
+                        text, future = pending[i]
+                        if position in errors:
+                            future.set_exception(errors[position])
+                            continue
+                        audio = np.asarray(audios[position], dtype=np.float32)
+                        if self.cache is not None:
+                            self.cache.store(text, speaker, sample_rate, audio)
+                        self.sentences += 1
+                        future.set_result(audio)
+
+class LatencyTracker:
+    """Задержки последних запросов: до первого байта аудио и до конца ответа"""
+
+    def __init__(self, window: int = None):
+        self._lock = threading.Lock()
+        self.first_audio = collections.deque(maxlen=window or SERVER_LATENCY_WINDOW)
+        self.total = collections.deque(maxlen=window or SERVER_LATENCY_WINDOW)
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+
+    def begin(self):
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+
+    def end(self, first_audio: float = None, total: float = None):
+        """Запрос завершён; без замеров — завершён с ошибкой"""
+        with self._lock:
+            self.active -= 1
+            if total is None:
+                self.errors += 1
+            else:
+                self.first_audio.append(first_audio)
+                self.total.append(total)
+
+    @staticmethod
+    def _percentiles(values) -> Dict[str, float]:
+        values = sorted(values)
+        if not values:
+            return {}
+        return {f"p{q}": round(values[min(len(values) - 1, int(len(values) * q / 100))], 4) for q in (50, 90, 99)}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'active': self.active,
+                'first_audio_seconds': self._percentiles(self.first_audio),
+                'total_seconds': self._percentiles(self.total),
+            }
+
+def _pcm16(audio) -> bytes:
+    import numpy as np
+
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+def _wav_stream_header(sample_rate: int) -> bytes:
+    """Заголовок WAV для потока неизвестной длины (размеры 0xFFFFFFFF понимают ffmpeg, браузеры и плееры)"""
+    import struct
+
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+class TTSRequestHandler:
+    """Обработчик запросов; базовый класс (BaseHTTPRequestHandler) подставляется в make_server"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive: клиент переиспользует соединение между запросами
+
+    def log_message(self, format, *args):
+        logger.info(f"HTTP {self.client_address[0]}: {format % args}")
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+
+    def do_GET(self):
+        from urllib.parse import urlsplit, parse_qs
+
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            error = self.server.batcher.error
+            status = 'ok' if error is None else f"ошибка модели: {error}"
+            self._send_json(200 if error is None else 503, {'status': status, 'model_loaded': model_manager.loaded})
+        elif url.path == "/stats":
+            self._send_json(200, self.server.stats())
+        elif url.path == "/metrics":
+            body = self.server.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/synthesize":
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            self._synthesize(params)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        from urllib.parse import urlsplit, parse_qs
+
+        url = urlsplit(self.path)
+        if url.path != "/synthesize":
+            self._send_json(404, {'error': 'not found'})
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= SERVER_MAX_BODY_BYTES:
+            # Тело не читаем: соединение закрывается, чтобы непрочитанные байты не стали следующим запросом
+            self.close_connection = True
+            self._send_json(400 if length < 0 else 413,
+                            {'error': f"тело запроса должно быть не длиннее {SERVER_MAX_BODY_BYTES} байт"})
+            return
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                params.update(json.loads(body or "{}"))
+            except ValueError:
+                self._send_json(400, {'error': 'некорректный JSON'})
+                return
+        else:
+            params['text'] = body
+        self._synthesize(params)
+
+    def _synthesize(self, params: dict):
+        text = str(params.get('text') or '')
+        speaker = params.get('speaker') or DEFAULT_SPEAKER
+        fmt = params.get('format') or 'wav'
+        try:
+            sample_rate = int(params.get('sample_rate') or DEFAULT_SAMPLE_RATE)
+        except ValueError:
+            sample_rate = None
+        # Дешёвые проверки — до разбора текста, чтобы огромный или заведомо неверный запрос не нагружал сервер
+        error = None
+        if len(text) > SERVER_MAX_TEXT_CHARS:
+            error = f"текст длиннее {SERVER_MAX_TEXT_CHARS} символов"
+        elif speaker not in SPEAKERS_INFO:
+            error = f"неизвестный голос: {speaker}"
+        elif sample_rate not in SUPPORTED_SAMPLE_RATES:
+            error = f"частота должна быть одной из {SUPPORTED_SAMPLE_RATES}"
+        elif fmt not in SERVER_FORMATS:
+            error = f"формат должен быть одним из {sorted(SERVER_FORMATS)}"
+        else:
+            chunks, paragraph_ends = plan_document(text)
+            if not chunks:
+                error = "нет текста для озвучки"
+        if error:
+            self._send_json(400, {'error': error})
+            return
+
+        tracker = self.server.latency
+        tracker.begin()
+        started = time.perf_counter()
+        first_audio = None
+        # Первое предложение ждём до статуса: если модель недоступна, клиент получит 503, а не оборванный ответ
+        audio_iter = self._iter_audio(chunks, paragraph_ends, speaker, sample_rate)
+        try:
+            audio_iter = itertools.chain([next(audio_iter)], audio_iter)
+        except Exception as e:
+            logger.error(f"Ошибка ответа: {e}")
+            tracker.end()
+            unavailable = self.server.batcher.error is not None
+            self._send_json(503 if unavailable else 500,
+                            {'error': f"модель недоступна: {e}" if unavailable else f"ошибка синтеза: {e}"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", SERVER_FORMATS[fmt])
+        self.send_header("X-Sample-Rate", str(sample_rate))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            if fmt == 'mp3':
+                data_iter = self._iter_mp3(audio_iter, sample_rate)
+            else:
+                pcm_iter = (_pcm16(audio) for audio in audio_iter)
+                data_iter = itertools.chain([_wav_stream_header(sample_rate)], pcm_iter) if fmt == 'wav' else pcm_iter
+            for data in data_iter:
+                if first_audio is None:
+                    first_audio = time.perf_counter() - started
+                self._write_chunk(data)
+            self.wfile.write(b"0\r\n\r\n")
+            tracker.end(first_audio or 0.0, time.perf_counter() - started)
+        except Exception as e:
+            # Статус уже отправлен — просто обрываем соединение, клиент увидит неполный ответ
+            logger.error(f"Ошибка ответа: {e}")
+            tracker.end()
+            self.close_connection = True
+
+    def _iter_audio(self, chunks: List[str], paragraph_ends: Set[int], speaker: str, sample_rate: int):
+        """Аудио предложений по порядку, с паузами; наперёд в очереди не больше SERVER_PREFETCH предложений"""
+        batcher = self.server.batcher
+        futures = collections.deque()
+        submitted = 0
+        for k in range(len(chunks)):
+            while submitted < len(chunks) and len(futures) < SERVER_PREFETCH:
+                futures.append(batcher.submit(chunks[submitted], speaker, sample_rate))
+                submitted += 1
+            audio = prepare_segment(futures.popleft().result(), sample_rate)
+            if k:
+                yield silence(pause_after(chunks[k - 1], k - 1 in paragraph_ends), sample_rate)
+            yield audio
+
+    def _iter_mp3(self, audio_iter, sample_rate: int):
+        """Кодируем поток в MP3 на лету: синтез пишет в stdin ffmpeg, ответ читает его stdout"""
+        import numpy as np
+
+        proc = subprocess.Popen(
+            [get_ffmpeg_path(), "-hide_banner", "-loglevel", "error",
+             "-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+             "-c:a", "libmp3lame", "-b:a", parse_output_format('mp3', sample_rate)[3], "-f", "mp3", "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        )
+        errors = []
+
+        def feed():
+            try:
+                for audio in audio_iter:
+                    proc.stdin.write(np.ascontiguousarray(audio, dtype='<f4').tobytes())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            while True:
+                data = proc.stdout.read1(64 * 1024)
+                if not data:
+                    break
+                yield data
+        finally:
+            if proc.poll() is None and errors:
+                proc.kill()
+            proc.wait()
+            feeder.join()
+        if errors:
+            raise errors[0]
+
+def make_server(host: str = None, port: int = None, cache: 'AudioCache' = None, window_ms: int = None):
+    """HTTP-сервер синтеза (ещё не запущенный): server.serve_forever() / server.shutdown()"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(TTSRequestHandler, BaseHTTPRequestHandler):
+        pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def stats(self) -> dict:
+            return {'queue_depth': self.batcher.depth, 'batches': self.batcher.batches,
+                    'sentences': self.batcher.sentences, **self.latency.summary()}
+
+        def prometheus(self) -> str:
+            summary = self.latency.summary()
+            lines = [
+                "# TYPE tts_server_queue_depth gauge", f"tts_server_queue_depth {self.batcher.depth}",
+                "# TYPE tts_server_active_requests gauge", f"tts_server_active_requests {summary['active']}",
+                "# TYPE tts_server_requests_total counter", f"tts_server_requests_total {summary['requests']}",
+                "# TYPE tts_server_errors_total counter", f"tts_server_errors_total {summary['errors']}",
+                "# TYPE tts_server_batches_total counter", f"tts_server_batches_total {self.batcher.batches}",
+            ]
+            for name in ('first_audio_seconds', 'total_seconds'):
+                lines.append(f"# TYPE tts_server_{name} summary")
+                for q, value in summary[name].items():
+                    lines.append(f'tts_server_{name}{{quantile="{int(q[1:]) / 100}"}} {value}')
+            return "\n".join(lines) + "\n" + metrics.prometheus()
+
+    server = Server((host or SERVER_HOST, SERVER_PORT if port is None else port), Handler)
+    server.batcher = MicroBatcher(cache, window_ms)
+    server.latency = LatencyTracker()
+    return server
+
+def serve(host: str = None, port: int = None, use_cache: bool = None, window_ms: int = None):
+    """Запускаем сервер и держим модель прогретой до Ctrl+C"""
+    use_cache = AUDIO_CACHE_ENABLED if use_cache is None else use_cache
+    model_manager.warmup()
+    cache = AudioCache(get_model_hash(get_silero_model_path())) if use_cache else None
+    server = make_server(host, port, cache, window_ms)
+    host, port = server.server_address[:2]
+    logger.info(f"✅ Сервер озвучки: http://{host}:{port}/synthesize (метрики: /metrics, /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Остановка сервера...")
     finally:
-        # Удаляем временный .txt файл
+        server.batcher.close()
+        server.server_close()
+
+# === Потоковое воспроизведение (быстрый старт) ===
+# Для интерактивной работы не ждём всего документа: фоновый поток озвучивает чанки по одному
+# и держит наготове до PLAYBACK_PREFETCH следующих, а первое аудио отдаётся сразу после первого чанка.
+PLAYBACK_PREFETCH = 4
+
+class WavFileSink:
+    """Пишем поток в WAV (16 бит) — файл растёт по мере озвучки"""
+
+    def __init__(self, path: Path, sample_rate: int):
+        import soundfile as sf
+
+        self.file = sf.SoundFile(str(path), 'w', samplerate=sample_rate, channels=1, subtype='PCM_16')
+
+    def write(self, audio):
+        self.file.write(audio)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class PcmStreamSink:
+    """Сырой PCM (16 бит, моно) в двоичный поток — например, в stdout для ffplay/aplay"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, audio):
+        self.stream.write(_pcm16(audio))
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+class SoundDeviceSink:
+    """Воспроизведение через звуковую карту (нужен пакет sounddevice)"""
+
+    def __init__(self, sample_rate: int):
         try:
-            os.unlink(list_file)
-        except:
-            pass
+            import sounddevice
+        except ImportError:
+            raise RuntimeError("Для воспроизведения нужен пакет sounddevice: pip install sounddevice")
+        self.stream = sounddevice.OutputStream(samplerate=sample_rate, channels=1, dtype='float32')
+        self.stream.start()
+
+    def write(self, audio):
+        import numpy as np
+
+        self.stream.write(np.ascontiguousarray(audio, dtype=np.float32).reshape(-1, 1))
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+def stream_audio(file: Path, speaker: str = DEFAULT_SPEAKER, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 prefetch: int = None, use_cache: bool = None, control: JobControl = None,
+                 stats: dict = None) -> Iterator:
+    """Отдаёт аудио документа (numpy float32, вместе с паузами) по мере готовности чанков.
+
+    В stats записываются time_to_first_audio, chunks и audio_seconds.
+    """
+    prefetch = prefetch or PLAYBACK_PREFETCH
+    use_cache = AUDIO_CACHE_ENABLED if use_cache is None else use_cache
+    control = control or JobControl()
+    stats = {} if stats is None else stats
+    started = time.perf_counter()
+    ready = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Ждём место в очереди, но выходим, если слушатель уже ушёл
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            model = model_manager.get()
+            cache = AudioCache(get_model_hash(get_silero_model_path())) if use_cache else None
+            dedup = DedupIndex() if SYNTH_DEDUP else None
+            for chunk, paragraph_end, voice in DocumentStream(file).voiced_chunks():
+                voice = voice or speaker
+                audio = dedup.get(dedup.key(chunk, voice)) if dedup is not None else None
+                if audio is None and cache is not None:
+                    audio = cache.load(chunk, voice, sample_rate)
+                if audio is None:
+                    audio = synthesize_audio(model, [0], [chunk], voice, sample_rate)[0]
+                    if cache is not None:
+                        cache.store(chunk, voice, sample_rate, audio)
+                if dedup is not None:
+                    audio = dedup.put(dedup.key(chunk, voice), audio)
+                if not put((prepare_segment(audio, sample_rate), pause_after(chunk, paragraph_end))):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True, name="tts-prefetch")
+    producer.start()
+    try:
+        pause = None
+        chunks = 0
+        audio_seconds = 0.0
+        while True:
+            item = ready.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            audio, next_pause = item
+            if pause is not None:
+                gap = silence(pause, sample_rate)
+                audio_seconds += len(gap) / sample_rate
+                yield gap
+            if chunks == 0:
+                stats['time_to_first_audio'] = time.perf_counter() - started
+                metrics.observe('first_audio', stats['time_to_first_audio'])
+                logger.info(f"Первое аудио через {stats['time_to_first_audio']:.2f} с")
+            chunks += 1
+            audio_seconds += len(audio) / sample_rate
+            stats.update(chunks=chunks, audio_seconds=audio_seconds)
+            yield audio
+            pause = next_pause
+            control.checkpoint()
+    finally:
+        stop.set()
+        producer.join()
+
+def play_file(file: Path, sink, speaker: str = DEFAULT_SPEAKER, sample_rate: int = DEFAULT_SAMPLE_RATE,
+              prefetch: int = None, use_cache: bool = None, control: JobControl = None) -> dict:
+    """Озвучиваем документ прямо в sink (WavFileSink, PcmStreamSink, SoundDeviceSink). Возвращает stats."""
+    stats = {}
+    try:
+        for audio in stream_audio(file, speaker, sample_rate, prefetch, use_cache, control, stats):
+            sink.write(audio)
+    finally:
+        sink.close()
+    logger.info(f"✅ Воспроизведено {stats.get('chunks', 0)} чанков, "
+                f"{format_duration(stats.get('audio_seconds', 0.0))}, "
+                f"первое аудио через {stats.get('time_to_first_audio', 0.0):.2f} с")
+    return stats
+
+# === Бенчмарк ===
+# Воспроизводимый замер горячих путей: разбивка текста, синтез по голосам и частотам, сборка и кодирование.
+# Работает без сети: с локальным v5_ru.pt (--model) или с заглушкой вместо модели (--stub).
+BENCH_CORPUS_SIZES = [1_000, 10_000, 100_000]  # Размеры корпуса для этапов обработки текста, символов
+BENCH_SYNTH_CHARS = 2_000                      # Сколько символов озвучивать на каждую пару голос/частота
+BENCH_REPEAT = 3                               # Повторы этапов обработки текста (берём лучший)
+
+BENCH_SENTENCES = [
+    "Жили-были старик со старухой у самого синего моря.",
+    "Они жили в ветхой землянке ровно тридцать лет и три года!",
+    "Старик ловил неводом рыбу, а старуха пряла свою пряжу.",
+    "Раз он в море закинул невод, — пришёл невод с одною тиной.",
+    "Он в другой раз закинул невод: пришёл невод с травой морскою.",
+    "В третий раз закинул он невод, — пришёл невод с одною рыбкой, с непростою рыбкой, — золотою.",
+    "Как взмолится золотая рыбка!",
+    "Голосом молвит человечьим: «Отпусти ты, старче, меня в море...»",
+    "Удивился старик, испугался; он рыбачил тридцать лет и три года и не слыхивал, чтоб рыба говорила?",
+    "Отпустил он рыбку золотую и сказал ей ласковое слово.",
+]
+
+def bench_corpus(chars: int) -> str:
+    """Фиксированный русский текст нужной длины: предложения по кругу, абзац — каждые 5 предложений"""
+    parts = []
+    size = 0
+    for k in itertools.count():
+        sentence = BENCH_SENTENCES[k % len(BENCH_SENTENCES)]
+        if size + len(sentence) > chars and parts:
+            break
+        parts.append(sentence + ("\n\n" if k % 5 == 4 else " "))
+        size += len(parts[-1])
+    return ''.join(parts).strip()
+
+class StubTTSModel:
+    """Заглушка вместо Silero: шум длиной ~15 символов в секунду с тишиной по краям"""
+    CHARS_PER_SECOND = 15
+
+    def apply_tts(self, text: str, speaker: str = DEFAULT_SPEAKER, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                  put_accent: bool = True, put_yo: bool = True):
+        import torch
+
+        samples = int(len(text) / self.CHARS_PER_SECOND * sample_rate)
+        generator = torch.Generator().manual_seed(len(text))
+        pad = torch.zeros(sample_rate // 10)
+        return torch.cat([pad, 0.1 * torch.randn(samples, generator=generator), pad])
+
+def peak_rss_mb() -> float:
+    """Пиковое потребление памяти процессом, МБ (None, если узнать нельзя)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+def _best_time(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _stage(seconds: float, characters: int = None, audio_seconds: float = None) -> dict:
+    result = {'seconds': round(seconds, 6), 'peak_rss_mb': peak_rss_mb()}
+    if characters is not None:
+        result['chars_per_sec'] = round(characters / seconds, 1) if seconds > 0 else None
+    if audio_seconds is not None:
+        result['audio_seconds'] = round(audio_seconds, 3)
+        result['rtf'] = round(seconds / audio_seconds, 4) if audio_seconds else None
+    return result
+
+def run_benchmark(model=None, speakers: List[str] = None, sample_rates: List[int] = None,
+                  sizes: List[int] = None, synth_chars: int = None, repeat: int = None,
+                  legacy_concat: bool = True, batching: bool = False) -> dict:
+    """Замеряем этапы конвейера и возвращаем отчёт (словарь, готовый для JSON).
+
+    batching=True добавляет в отчёт batching: скорость синтеза по одному предложению и пакетами
+    (benchmark_batching) для каждой пары голос/частота.
+    """
+    import tempfile
+    import platform
+    import numpy as np
+
+    model = model if model is not None else model_manager.get()
+    speakers = speakers or [DEFAULT_SPEAKER]
+    sample_rates = sample_rates or SUPPORTED_SAMPLE_RATES
+    sizes = sizes or BENCH_CORPUS_SIZES
+    synth_chars = synth_chars or BENCH_SYNTH_CHARS
+    repeat = repeat or BENCH_REPEAT
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'model': type(model).__name__,
+        'text': [],
+        'synthesis': [],
+    }
+    if batching:
+        report['batching'] = []
+    try:
+        import torch
+        report['torch'] = torch.__version__
+        report['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+
+    # === Обработка текста ===
+    for size in sizes:
+        text = bench_corpus(size)
+        sentences = split_into_sentences(text)
+        stages = {
+            'split_into_sentences': _stage(_best_time(lambda: split_into_sentences(text), repeat), len(text)),
+            'group_sentences': _stage(_best_time(lambda: group_sentences(sentences), repeat), len(text)),
+            'normalize_text': _stage(_best_time(lambda: normalize_text(text), repeat), len(text)),
+            'plan_document': _stage(_best_time(lambda: plan_document(text, normalize=False), repeat), len(text)),
+        }
+        report['text'].append({'characters': len(text), 'sentences': len(sentences), 'stages': stages})
+        logger.info(f"Бенчмарк текста: {len(text)} символов, "
+                    f"split {stages['split_into_sentences']['chars_per_sec']} симв/с, "
+                    f"plan {stages['plan_document']['chars_per_sec']} симв/с")
+
+    # === Синтез, сборка и кодирование ===
+    text = bench_corpus(synth_chars)
+    chunks, paragraph_ends = plan_document(text)
+    pauses = [pause_after(c, k in paragraph_ends) for k, c in enumerate(chunks)]
+    characters = sum(len(c) for c in chunks)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for speaker in speakers:
+            for sample_rate in sample_rates:
+                start = time.perf_counter()
+                raw_audio = [None] * len(chunks)
+                for batch in make_length_buckets(chunks):
+                    audios = synthesize_batch(model, [chunks[i] for i in batch], speaker, sample_rate)
+                    for i, audio in zip(batch, audios):
+                        raw_audio[i] = np.asarray(audio, dtype=np.float32)
+                synth_seconds = time.perf_counter() - start
+                raw_seconds = sum(len(a) for a in raw_audio) / sample_rate
+
+                start = time.perf_counter()
+                audio = assemble_audio([prepare_segment(a, sample_rate) for a in raw_audio], pauses, sample_rate)
+                assemble_seconds = time.perf_counter() - start
+                audio_seconds = len(audio) / sample_rate
+
+                stages = {
+                    'synthesize': _stage(synth_seconds, characters, raw_seconds),
+                    'assemble': _stage(assemble_seconds, audio_seconds=audio_seconds),
+                }
+                try:
+                    start = time.perf_counter()
+                    with FFmpegStreamEncoder(tmp / "stream.mp3", sample_rate) as encoder:
+                        encoder.write(audio)
+                    stages['encode'] = _stage(time.perf_counter() - start, audio_seconds=audio_seconds)
+
+                    if legacy_concat:
+                        import soundfile as sf
+
+                        start = time.perf_counter()
+                        wav_files = []
+                        for k, a in enumerate(raw_audio):
+                            wav_files.append(tmp / f"audio_{k + 1:03d}.wav")
+                            sf.write(str(wav_files[-1]), a, sample_rate)
+                        convert_and_concatenate(wav_files, tmp / "concat.mp3")
+                        stages['concat_legacy'] = _stage(time.perf_counter() - start, audio_seconds=raw_seconds)
+                except RuntimeError as e:
+                    logger.warning(f"Кодирование пропущено: {e}")
+
+                total = sum(st['seconds'] for st in stages.values())
+                report['synthesis'].append({
+                    'speaker': speaker,
+                    'sample_rate': sample_rate,
+                    'characters': characters,
+                    'chunks': len(chunks),
+                    'stages': stages,
+                    'total': _stage(total, characters, audio_seconds),
+                })
+                logger.info(f"Бенчмарк синтеза [{speaker}, {sample_rate} Гц]: "
+                            f"{stages['synthesize']['chars_per_sec']} симв/с, RTF {stages['synthesize']['rtf']}")
+                if batching:
+                    rates = benchmark_batching(model, chunks, speaker, sample_rate)
+                    report['batching'].append({
+                        'speaker': speaker,
+                        'sample_rate': sample_rate,
+                        'sentences': len(chunks),
+                        'batch_supported': model_supports_batch(model),
+                        'sentences_per_sec': {mode: round(rate, 2) for mode, rate in rates.items()},
+                    })
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+def run_format_report(model=None, speaker: str = DEFAULT_SPEAKER, sample_rates: List[int] = None,
+                      formats: List[str] = None, synth_chars: int = None) -> dict:
+    """Время синтеза и размер файла для каждой пары частота/формат (словарь, готовый для JSON).
+
+    Для каждой частоты текст озвучивается один раз; каждый формат кодируется отдельно (время и размер),
+    а затем все вместе одним ffmpeg — так, как это делает synthesize_file.
+    """
+    import tempfile
+
+    model = model if model is not None else model_manager.get()
+    sample_rates = sample_rates or SUPPORTED_SAMPLE_RATES
+    formats = formats or list(OUTPUT_FORMATS)
+    text = bench_corpus(synth_chars or BENCH_SYNTH_CHARS)
+    chunks, paragraph_ends = plan_document(text)
+    pauses = [pause_after(c, k in paragraph_ends) for k, c in enumerate(chunks)]
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'model': type(model).__name__,
+        'speaker': speaker,
+        'characters': sum(len(c) for c in chunks),
+        'profiles': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for sample_rate in sample_rates:
+            start = time.perf_counter()
+            segments = [prepare_segment(a, sample_rate) for a in synthesize_batch(model, chunks, speaker, sample_rate)]
+            audio = assemble_audio(segments, pauses, sample_rate)
+            synth_seconds = time.perf_counter() - start
+            audio_seconds = len(audio) / sample_rate
+
+            renditions = output_renditions(tmp / f"report_{sample_rate}", formats, sample_rate)
+            for path, codec, bitrate in renditions:
+                start = time.perf_counter()
+                with FFmpegStreamEncoder(path, sample_rate, bitrate, codec) as encoder:
+                    encoder.write(audio)
+                encode_seconds = time.perf_counter() - start
+                size = path.stat().st_size
+                report['profiles'].append({
+                    'sample_rate': sample_rate,
+                    'format': path.suffix[1:],
+                    'bitrate': bitrate,
+                    'synth_seconds': round(synth_seconds, 3),
+                    'encode_seconds': round(encode_seconds, 3),
+                    'audio_seconds': round(audio_seconds, 3),
+                    'bytes': size,
+                    'kbps': round(size * 8 / 1000 / audio_seconds, 1) if audio_seconds else None,
+                    'mb_per_hour': round(size / audio_seconds * 3600 / 1024 / 1024, 1) if audio_seconds else None,
+                })
+
+            path, codec, bitrate = renditions[0]
+            start = time.perf_counter()
+            with FFmpegStreamEncoder(path, sample_rate, bitrate, codec, renditions[1:]) as encoder:
+                encoder.write(audio)
+            report.setdefault('one_pass', []).append({
+                'sample_rate': sample_rate,
+                'formats': [f"{p.suffix[1:]}:{b}" for p, _, b in renditions],
+                'encode_seconds': round(time.perf_counter() - start, 3),
+            })
+            logger.info(f"Отчёт по форматам [{sample_rate} Гц]: синтез {synth_seconds:.2f} с, "
+                        f"аудио {format_duration(audio_seconds)}")
+    return report
 
 # === Основной класс GUI ===
 class TTSApp:
     def __init__(self, root):
         self.root = root
         self.root.title("TTS (Text-to-Speech) на базе Silero TTS\nМодифицированная версия от UpDate0909")  # Изменено: заголовок
-        self.root.geometry("700x600")
+        self.root.geometry("700x700")
         self.root.resizable(True, True)
 
         # === Переменные ===
         self.file_path = tk.StringVar()
         self.selected_voice = tk.StringVar(value="xenia — женский, мягкий, дружелюбный")  # Изменено: теперь полное имя
+        self.selected_preset = tk.StringVar()
+
+        # === Очередь задач ===
+        # Озвучка идёт в фоновом потоке. Он не трогает виджеты напрямую, а кладёт действия
+        # в ui_queue, которую главный поток разбирает через root.after.
+        self.jobs = queue.Queue()
+        self.ui_queue = queue.Queue()
+        self.current_control = None
+        self.job_count = 0
+        self.finished_jobs = []
 
         # === Интерфейс ===
         self.create_widgets()
 
+        threading.Thread(target=self.worker_loop, daemon=True).start()
+        self.root.after(100, self.poll_ui_queue)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # === Фоновая загрузка модели, пока пользователь выбирает файл ===
+        if PRELOAD_MODEL_ON_START:
+            threading.Thread(target=self.preload_model, args=(self.get_selected_speaker_key(),), daemon=True).start()
+
+    def preload_model(self, speaker: str):
+        try:
+            model_manager.warmup(speaker)
+        except Exception as e:
+            # Не страшно: модель загрузится при первой озвучке и покажет ошибку там
+            logger.warning(f"Не удалось заранее загрузить модель: {e}")
+
     def get_selected_speaker_key(self):
         selected = self.selected_voice.get()
         key = selected.split(" — ")[0]
@@ -445,9 +4737,10 @@ class TTSApp:
         file_frame = tk.Frame(self.root)
         file_frame.pack(fill="x", padx=20, pady=5)
 
-        tk.Label(file_frame, text="Файл (.txt, .docx, .doc):").pack(anchor="w")
+        tk.Label(file_frame, text="Файлы (.txt, .docx, .doc, .rtf, .odt), несколько — через «;»:").pack(anchor="w")
         file_entry = tk.Entry(file_frame, textvariable=self.file_path, width=60)
         file_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        tk.Button(file_frame, text="Папка", command=self.browse_folder).pack(side="right", padx=(5, 0))
         tk.Button(file_frame, text="Обзор", command=self.browse_file).pack(side="right")
 
         # === Выбор голоса ===
@@ -460,13 +4753,36 @@ class TTSApp:
         voice_selector.current(4)  # по умолчанию xenia
         voice_selector.pack(side="left", fill="x", expand=True, padx=(0, 10))
 
-        # === Кнопка запуска ===
-        tk.Button(self.root, text="Начать озвучку", command=self.start_processing, bg="lightgreen", font=("Arial", 12)).pack(pady=20)
+        # === Качество и форматы ===
+        preset_frame = tk.Frame(self.root)
+        preset_frame.pack(fill="x", padx=20, pady=5)
+
+        tk.Label(preset_frame, text="Качество:").pack(anchor="w")
+        preset_selector = ttk.Combobox(preset_frame, textvariable=self.selected_preset, state="readonly", width=50)
+        preset_selector['values'] = [f"{k} — {v[2]}" for k, v in OUTPUT_PRESETS.items()]
+        preset_selector.current(list(OUTPUT_PRESETS).index(DEFAULT_OUTPUT_PRESET))
+        preset_selector.pack(side="left", fill="x", expand=True, padx=(0, 10))
+
+        # === Кнопки управления ===
+        buttons = tk.Frame(self.root)
+        buttons.pack(pady=15)
+        tk.Button(buttons, text="Начать озвучку", command=self.start_processing, bg="lightgreen", font=("Arial", 12)).pack(side="left", padx=5)
+        self.pause_button = tk.Button(buttons, text="Пауза", command=self.toggle_pause, font=("Arial", 12))
+        self.pause_button.pack(side="left", padx=5)
+        tk.Button(buttons, text="Отменить", command=self.cancel_current, font=("Arial", 12)).pack(side="left", padx=5)
 
         # === Прогресс-бар ===
         self.progress = ttk.Progressbar(self.root, orient="horizontal", length=600, mode="determinate")
         self.progress.pack(pady=5)
 
+        # === Очередь ===
+        queue_frame = tk.Frame(self.root)
+        queue_frame.pack(fill="x", padx=20, pady=5)
+
+        tk.Label(queue_frame, text="Очередь:").pack(anchor="w")
+        self.job_list = tk.Listbox(queue_frame, height=5)
+        self.job_list.pack(fill="x")
+
         # === Логи ===
         log_frame = tk.Frame(self.root)
         log_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -486,118 +4802,171 @@ class TTSApp:
             ("Текстовые файлы", "*.txt"),
             ("Документы Word", "*.docx"),
             ("Старые документы Word", "*.doc"),
+            ("RTF", "*.rtf"),
+            ("Документы OpenDocument", "*.odt"),
         )
-        filename = filedialog.askopenfilename(title="Выберите файл", filetypes=filetypes)
-        if filename:
-            self.file_path.set(filename)
+        filenames = filedialog.askopenfilenames(title="Выберите файлы", filetypes=filetypes)
+        if filenames:
+            self.file_path.set("; ".join(filenames))
+
+    def browse_folder(self):
+        folder = filedialog.askdirectory(title="Выберите папку с документами")
+        if folder:
+            files = scan_directory(Path(folder))
+            if not files:
+                messagebox.showerror("Ошибка", f"В папке нет файлов {', '.join(SUPPORTED_EXTENSIONS)}")
+                return
+            # Самые большие файлы — первыми
+            self.file_path.set("; ".join(str(f) for f in files))
+
+    # === Связь фонового потока с интерфейсом ===
+    def post(self, func, *args):
+        """Выполнить func(*args) в главном потоке Tk"""
+        self.ui_queue.put((func, args))
+
+    def poll_ui_queue(self):
+        try:
+            while True:
+                func, args = self.ui_queue.get_nowait()
+                func(*args)
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_ui_queue)
 
     def log(self, message):
+        if threading.current_thread() is not threading.main_thread():
+            logger.info(message)
+            self.post(self.append_log, message)
+            return
+        logger.info(message)
+        self.append_log(message)
+
+    def append_log(self, message):
         self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END)
-        self.root.update_idletasks()
-        logger.info(message)
 
+    def set_progress(self, percent: float, status: str):
+        self.progress['value'] = percent
+        self.status.config(text=status)
+
+    def set_job_state(self, index: int, text: str):
+        self.job_list.delete(index)
+        self.job_list.insert(index, text)
+
+    # === Постановка в очередь ===
     def start_processing(self):
         # === Проверки ===
         file_path_str = self.file_path.get()
-        if not file_path_str:
+        if not file_path_str.strip():
             messagebox.showerror("Ошибка", "Пожалуйста, выберите файл.")
             return
 
-        file = Path(file_path_str)
-        if not file.exists():
-            messagebox.showerror("Ошибка", f"Файл не найден: {file}")
-            return
+        files = [Path(p.strip()) for p in file_path_str.split(";") if p.strip()]
+        for file in files:
+            if not file.exists():
+                messagebox.showerror("Ошибка", f"Файл не найден: {file}")
+                return
 
-        if file.suffix.lower() not in ['.txt', '.docx', '.doc']:
-            messagebox.showerror("Ошибка", f"Неподдерживаемый формат: {file.suffix}")
-            return
+            if file.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                messagebox.showerror("Ошибка", f"Неподдерживаемый формат: {file.suffix}")
+                return
 
         # Проверка ffmpeg
-        if FFMPEG_PATH != shutil.which("ffmpeg"):
-            if not Path(FFMPEG_PATH).exists():
-                messagebox.showerror("Ошибка", f"ffmpeg не найден по пути: {FFMPEG_PATH}")
-                return
-        else:
-            self.log(f"✅ ffmpeg найден в PATH: {FFMPEG_PATH}")
+        try:
+            self.log(f"✅ ffmpeg: {get_ffmpeg_path()}")
+        except RuntimeError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
 
-        # === Запуск процесса ===
-        self.status.config(text="Запуск...")
-        self.progress['value'] = 0
+        # === Постановка в очередь ===
+        speaker = self.get_selected_speaker_key()  # ✅ Извлекаем ключ голоса
+        preset = self.selected_preset.get().split(" — ")[0]
+        for file in files:
+            index = self.job_count
+            self.job_count += 1
+            self.job_list.insert(tk.END, f"⏳ {file.name} ({speaker})")
+            self.jobs.put((index, file, speaker, preset))
+            self.log(f"В очередь: {file.name} ({speaker})")
+        self.file_path.set("")
 
-        try:
-            self.process_file(file)
-        except Exception as e:
-            logger.error(f"КРИТИЧЕСКАЯ ОШИБКА: {e}")
-            messagebox.showerror("Ошибка", f"Произошла ошибка: {e}")
+    def toggle_pause(self):
+        control = self.current_control
+        if control is None:
+            return
+        if control.paused:
+            control.resume()
+            self.pause_button.config(text="Пауза")
+            self.log("▶ Продолжаем")
+        else:
+            control.pause()
+            self.pause_button.config(text="Продолжить")
+            self.status.config(text="Пауза")
+            self.log("⏸ Пауза")
 
-    def process_file(self, file: Path):
-        import torch
+    def cancel_current(self):
+        control = self.current_control
+        if control is not None:
+            control.cancel()
+            self.pause_button.config(text="Пауза")
+            self.log("Отмена текущей озвучки...")
+
+    def on_close(self):
+        if self.current_control is not None:
+            self.current_control.cancel()
+        self.root.destroy()
 
-        self.log(f"Чтение файла: {file.name}")
-        text = read_text_file(file)
+    # === Фоновый поток ===
+    def worker_loop(self):
+        while True:
+            index, file, speaker, preset = self.jobs.get()
+            control = JobControl()
+            self.current_control = control
+            self.post(self.set_job_state, index, f"▶ {file.name} ({speaker})")
+            self.post(self.set_progress, 0, "Запуск...")
+            try:
+                output_mp3 = self.process_file(file, speaker, control, preset)
+            except JobCancelled:
+                self.post(self.set_job_state, index, f"✖ {file.name} — отменено")
+                self.post(self.set_progress, 0, "Отменено")
+                self.log(f"Озвучка отменена: {file.name}")
+            except Exception as e:
+                logger.error(f"КРИТИЧЕСКАЯ ОШИБКА: {e}")
+                self.post(self.set_job_state, index, f"❌ {file.name} — ошибка")
+                self.post(messagebox.showerror, "Ошибка", f"Произошла ошибка ({file.name}): {e}")
+            else:
+                self.finished_jobs.append(output_mp3)
+                self.post(self.set_job_state, index, f"✅ {file.name} → {output_mp3.name}")
+            finally:
+                self.current_control = None
 
-        if not text.strip():
-            raise ValueError("Файл пуст или не содержит текста!")
+            if self.jobs.empty() and self.finished_jobs:
+                names = "\n".join(p.name for p in self.finished_jobs)
+                self.finished_jobs = []
+                self.post(messagebox.showinfo, "Успех", f"Аудиофайлы успешно созданы:\n{names}")
 
-        self.log(f"Прочитано символов: {len(text)}")
-        sentences = split_into_sentences(text)
-        # Изменено: теперь чанки — это по 1 предложению
-        chunks = [s for s in sentences if s]  # Просто каждое предложение — отдельный чанк
-        self.log(f"Текст разбит на {len(chunks)} чанков (по одному предложению)")
-
-        # === Загрузка модели ===
-        self.log("Загрузка модели Silero...")
-        model = load_silero_model()
-        sample_rate = 48000
-        self.log("✅ Модель загружена")
-
-        # === Временная папка ===
-        temp_dir = file.parent / "temp_tts_chunks"
-        temp_dir.mkdir(exist_ok=True)
-        wav_files = []
-
-        # === Генерация аудио ===
-        # Считаем только те чанки, которые содержат текст
-        valid_chunks = [c for c in chunks if re.search(r'[а-яА-ЯёЁa-zA-Z0-9]', c)]
-        total = len(valid_chunks)
-        self.log(f"Найдено {total} валидных чанков для озвучки (остальные пропущены).")
-
-        for i, chunk in enumerate(valid_chunks):
-            # ЛОГИРУЕМ текст предложения перед обработкой
-            logger.info(f"Обрабатывается предложение: {chunk}")
-            wav_path = temp_dir / f"audio_{i+1:03d}.wav"
-            speaker_key = self.get_selected_speaker_key()  # ✅ Извлекаем ключ голоса
-            generate_audio_chunk(model, chunk, speaker_key, sample_rate, wav_path)
-            wav_files.append(wav_path)
-
-            # Обновляем прогресс
-            self.progress['value'] = (i + 1) / total * 100
-            self.status.config(text=f"Озвучка... {i+1}/{total}")
-            self.log(f"Обработан чанк {i+1}/{total}")
-            self.root.update_idletasks()
-
-        self.log("✅ Озвучка завершена")
-
-        # === Конвертация в MP3 ===
-        self.status.config(text="Конвертация в MP3...")
-        # Изменено: формат имени файла
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        speaker_name = self.get_selected_speaker_key()
-        output_mp3 = file.parent / f"{file.stem}_{speaker_name}_{timestamp}.mp3"  # Формат: имя_файла_голос_дата_время.mp3
-        convert_and_concatenate(wav_files, output_mp3)
-        self.log(f"✅ Аудио сохранено: {output_mp3.name}")
-
-        # === Удаление временных файлов ===
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        self.log("✅ Временные файлы удалены")
-
-        self.status.config(text="Готово!")
-        self.progress['value'] = 100
-        messagebox.showinfo("Успех", f"Аудиофайл успешно создан:\n{output_mp3.name}")
+    def process_file(self, file: Path, speaker: str, control: JobControl, preset: str = None) -> Path:
+        sample_rate, formats = resolve_output_profile(preset)
+        return synthesize_file(
+            file,
+            speaker,
+            sample_rate=sample_rate,
+            formats=formats,
+            resume=True,  # Если окно закроют посреди озвучки, следующий запуск продолжит с места остановки
+            log=self.log,
+            on_progress=lambda percent, status: self.post(self.set_progress, percent, status),
+            control=control,
+        )
 
 # === Основной процесс (для обратной совместимости, если запускается как консольный скрипт) ===
 def main():
+    setup_logging()
+    logger.info("=" * 60)
+    logger.info("ЗАПУСК ПРОГРАММЫ")
+    logger.info("=" * 60)
+    ensure_ffmpeg_or_exit()
+    ensure_dependencies_or_exit()
+    import_tkinter()
+
     print("\n" + "=" * 60)
     print("  🎙️  SILERO TTS: Преобразование текста в речь")
     print("=" * 60 + "\n")
@@ -606,7 +4975,291 @@ def main():
     app = TTSApp(root)
     root.mainloop()
 
+# === Командная строка ===
+def build_arg_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="text_to_vois",
+        description="Озвучка текста через Silero TTS (v5_ru). Без аргументов запускается GUI.",
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("gui", help="запустить графический интерфейс")
+
+    p = sub.add_parser("synth", help="озвучить файл без GUI")
+    p.add_argument("file", type=Path, help="файл .txt, .docx, .doc, .rtf или .odt")
+    p.add_argument("-s", "--speaker", default=DEFAULT_SPEAKER, choices=sorted(SPEAKERS_INFO), help="голос")
+    p.add_argument("-o", "--output", type=Path, help="путь к MP3 (по умолчанию рядом с исходником)")
+    p.add_argument("--sample-rate", type=int, choices=SUPPORTED_SAMPLE_RATES, help="частота синтеза (важнее пресета)")
+    p.add_argument("--preset", choices=sorted(OUTPUT_PRESETS), help="частота и форматы вывода (по умолчанию studio)")
+    p.add_argument("--formats", help="форматы через запятую, например mp3,opus:24k (важнее пресета)")
+    p.add_argument("--timings", help="индекс времени чанков: json,vtt,srt через запятую или none (по умолчанию json)")
+    p.add_argument("--workers", type=int, default=SYNTH_WORKERS, help="число процессов синтеза")
+    p.add_argument("--threads", type=int, help="потоков torch на процесс")
+    p.add_argument("--no-cache", action="store_true", help="не использовать кэш фраз")
+    p.add_argument("--no-stream", action="store_true", help="собрать аудио в памяти и закодировать целиком")
+    p.add_argument("--resume", action="store_true", help="вести журнал и продолжать прерванную озвучку")
+    p.add_argument("--incremental", action="store_true",
+                   help="озвучить только изменённые чанки, остальные взять из прошлой озвучки")
+    p.add_argument("--metrics", type=Path, help="писать время каждого этапа строками JSON в этот файл")
+    p.add_argument("--metrics-prom", type=Path, help="сохранить итоговые метрики в формате Prometheus")
+    p.add_argument("--profile", choices=["cprofile", "torch"], help="сохранить профиль задачи рядом с MP3")
+    p.add_argument("--inference", choices=sorted(INFERENCE_PROFILES), help="профиль инференса (см. tune)")
+    p.add_argument("--no-normalize", action="store_true", help="не разворачивать числа, сокращения и латиницу в слова")
+
+    p = sub.add_parser("batch", help="озвучить все файлы в папке (с продолжением после прерывания)")
+    p.add_argument("folder", type=Path)
+    p.add_argument("-s", "--speaker", default=DEFAULT_SPEAKER, choices=sorted(SPEAKERS_INFO), help="голос")
+    p.add_argument("--sample-rate", type=int, choices=SUPPORTED_SAMPLE_RATES, help="частота синтеза (важнее пресета)")
+    p.add_argument("--preset", choices=sorted(OUTPUT_PRESETS), help="частота и форматы вывода (по умолчанию studio)")
+    p.add_argument("--formats", help="форматы через запятую, например mp3,opus:24k (важнее пресета)")
+    p.add_argument("--timings", help="индекс времени чанков: json,vtt,srt через запятую или none (по умолчанию json)")
+    p.add_argument("--jobs", type=int, default=1, help="сколько файлов озвучивать параллельно")
+    p.add_argument("--threads", type=int, help="потоков torch на файл")
+    p.add_argument("--no-cache", action="store_true", help="не использовать кэш фраз")
+    p.add_argument("--no-recursive", action="store_true", help="не заходить во вложенные папки")
+    p.add_argument("--incremental", action="store_true",
+                   help="в изменённых файлах озвучить только изменённые чанки")
+    p.add_argument("--inference", choices=sorted(INFERENCE_PROFILES), help="профиль инференса (см. tune)")
+    p.add_argument("--no-normalize", action="store_true", help="не разворачивать числа, сокращения и латиницу в слова")
+    p.add_argument("--metrics", type=Path, help="писать время каждого этапа строками JSON в этот файл")
+
+    p = sub.add_parser("split", help="только разбить текст на предложения (без модели и ffmpeg)")
+    p.add_argument("file", type=Path)
+    p.add_argument("--chunks", action="store_true", help="показать чанки, которые пойдут в синтез")
+
+    p = sub.add_parser("normalize", help="показать текст после нормализации (числа, сокращения, латиница → слова)")
+    p.add_argument("file", type=Path)
+
+    p = sub.add_parser("bench-chunks", help="сравнить скорость синтеза при разном размере чанка")
+    p.add_argument("file", type=Path)
+    p.add_argument("-s", "--speaker", default=DEFAULT_SPEAKER, choices=sorted(SPEAKERS_INFO), help="голос")
+    p.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE, choices=SUPPORTED_SAMPLE_RATES)
+    p.add_argument("--targets", default="0,100,200,400,800", help="размеры чанков через запятую")
+
+    p = sub.add_parser("play", help="озвучивать и отдавать звук сразу, не дожидаясь конца документа")
+    p.add_argument("file", type=Path, help="файл .txt, .docx, .doc, .rtf или .odt")
+    p.add_argument("-s", "--speaker", default=DEFAULT_SPEAKER, choices=sorted(SPEAKERS_INFO), help="голос")
+    p.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE, choices=SUPPORTED_SAMPLE_RATES)
+    p.add_argument("--prefetch", type=int, default=PLAYBACK_PREFETCH, help="сколько чанков озвучивать наперёд")
+    p.add_argument("--inference", choices=sorted(INFERENCE_PROFILES), help="профиль инференса (см. tune)")
+    p.add_argument("--no-normalize", action="store_true", help="не разворачивать числа, сокращения и латиницу в слова")
+    p.add_argument("--no-cache", action="store_true", help="не использовать кэш фраз")
+    sink = p.add_mutually_exclusive_group()
+    sink.add_argument("--wav", type=Path, help="писать в WAV-файл (растёт по мере озвучки)")
+    sink.add_argument("--pcm", help="сырой PCM 16 бит в файл или '-' для stdout (по умолчанию — звуковая карта)")
+
+    p = sub.add_parser("serve", help="локальный HTTP-сервер озвучки с прогретой моделью")
+    p.add_argument("--host", default=SERVER_HOST, help="адрес (по умолчанию только localhost)")
+    p.add_argument("--port", type=int, default=SERVER_PORT)
+    p.add_argument("--window-ms", type=int, default=SERVER_BATCH_WINDOW_MS, help="окно сбора пакета, мс")
+    p.add_argument("--inference", choices=sorted(INFERENCE_PROFILES), help="профиль инференса (см. tune)")
+    p.add_argument("--no-normalize", action="store_true", help="не разворачивать числа, сокращения и латиницу в слова")
+    p.add_argument("--no-cache", action="store_true", help="не использовать кэш фраз")
+
+    p = sub.add_parser("tune", help="сравнить профили инференса по скорости и качеству звука")
+    p.add_argument("-o", "--output", type=Path, default=Path("tts_inference_profiles.json"), help="файл отчёта")
+    p.add_argument("--model", type=Path, help="локальный файл v5_ru.pt (по умолчанию — из кэша)")
+    p.add_argument("--profiles", default=",".join(INFERENCE_PROFILES), help="профили через запятую")
+    p.add_argument("-s", "--speaker", default=DEFAULT_SPEAKER, choices=sorted(SPEAKERS_INFO), help="голос")
+    p.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE, choices=SUPPORTED_SAMPLE_RATES)
+
+    p = sub.add_parser("bench", help="замерить этапы конвейера и сохранить отчёт в JSON")
+    p.add_argument("-o", "--output", type=Path, default=Path("tts_benchmark.json"), help="файл отчёта")
+    p.add_argument("--model", type=Path, help="локальный файл v5_ru.pt (по умолчанию — из кэша)")
+    p.add_argument("--stub", action="store_true", help="заглушка вместо модели: замер всего, кроме нейросети")
+    p.add_argument("--speakers", default=DEFAULT_SPEAKER, help="голоса через запятую или all")
+    p.add_argument("--sample-rates", default=",".join(map(str, SUPPORTED_SAMPLE_RATES)), help="частоты через запятую")
+    p.add_argument("--sizes", default=",".join(map(str, BENCH_CORPUS_SIZES)),
+                   help="размеры текста для этапов разбивки, символов")
+    p.add_argument("--synth-chars", type=int, default=BENCH_SYNTH_CHARS, help="сколько символов озвучивать")
+    p.add_argument("--repeat", type=int, default=BENCH_REPEAT, help="повторы этапов разбивки")
+    p.add_argument("--no-legacy", action="store_true", help="не замерять старую склейку WAV через ffmpeg")
+    p.add_argument("--batching", action="store_true", help="сравнить синтез по одному предложению и пакетами")
+
+    p = sub.add_parser("bench-formats", help="время синтеза и размер файла по частотам и форматам")
+    p.add_argument("-o", "--output", type=Path, default=Path("tts_formats.json"), help="файл отчёта")
+    p.add_argument("--model", type=Path, help="локальный файл v5_ru.pt (по умолчанию — из кэша)")
+    p.add_argument("--stub", action="store_true", help="заглушка вместо модели")
+    p.add_argument("-s", "--speaker", default=DEFAULT_SPEAKER, choices=sorted(SPEAKERS_INFO), help="голос")
+    p.add_argument("--sample-rates", default=",".join(map(str, SUPPORTED_SAMPLE_RATES)), help="частоты через запятую")
+    p.add_argument("--formats", default=",".join(OUTPUT_FORMATS), help="форматы через запятую (можно с битрейтом)")
+    p.add_argument("--synth-chars", type=int, default=BENCH_SYNTH_CHARS, help="сколько символов озвучивать")
+
+    return parser
+
+def cli(argv: List[str] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+
+    if args.command in (None, "gui"):
+        main()
+        return 0
+
+    if args.command == "split":
+        if args.chunks:
+            for chunk, _, voice in DocumentStream(args.file).voiced_chunks():
+                print(f"[{voice}] {chunk}" if voice else chunk)
+        else:
+            for sentence in split_into_sentences(read_text_file(args.file)):
+                print(sentence)
+        return 0
+
+    if args.command == "normalize":
+        document = DocumentStream(args.file, normalize=False)
+        characters = 0
+        start = time.perf_counter()
+        for paragraph in document.iter_paragraphs():
+            characters += len(paragraph)
+            print(normalize_text(paragraph).strip(), end="\n\n")
+        seconds = time.perf_counter() - start
+        print(f"{characters} символов за {seconds:.2f} с ({characters / max(seconds, 1e-9):.0f} символов/сек)",
+              file=sys.stderr)
+        return 0
+
+    setup_logging()
+    if getattr(args, "no_normalize", False):
+        set_text_normalization(False)
+    if getattr(args, "metrics", None):
+        enable_metrics_jsonl(args.metrics)
+    if getattr(args, "inference", None):
+        set_inference_profile(args.inference)
+
+    if args.command == "tune":
+        report = tune_inference(args.profiles.split(","), speaker=args.speaker,
+                                sample_rate=args.sample_rate, model_path=args.model)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Отчёт сохранён: {args.output}")
+        return 0
+
+    if args.command == "bench-chunks":
+        targets = [int(t) for t in args.targets.split(",") if t.strip()]
+        rows = benchmark_chunk_sizes(read_text_file(args.file), args.speaker, args.sample_rate, targets)
+        print(f"{'чанк':>10} {'чанков':>8} {'ср.длина':>9} {'время, с':>9} {'аудио, с':>9} {'RTF':>7}")
+        for row in rows:
+            print(f"{row['target_chars']:>10} {row['chunks']:>8} {row['avg_chars']:>9.0f} "
+                  f"{row['seconds']:>9.2f} {row['audio_seconds']:>9.1f} {row['rtf']:>7.3f}")
+        return 0
+
+    if args.command == "play":
+        if args.pcm == "-":
+            # stdout занят звуком — лог оставляем в файле и stderr
+            for handler in logging.getLogger().handlers:
+                if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                    handler.setStream(sys.stderr)
+        try:
+            if args.wav:
+                sink = WavFileSink(args.wav, args.sample_rate)
+            elif args.pcm:
+                sink = PcmStreamSink(sys.stdout.buffer if args.pcm == "-" else open(args.pcm, 'wb'))
+            else:
+                sink = SoundDeviceSink(args.sample_rate)
+            play_file(args.file, sink, args.speaker, args.sample_rate, args.prefetch, use_cache=not args.no_cache)
+        except Exception as e:
+            logger.error(f"❌ {e}")
+            return 1
+        return 0
+
+    if args.command == "serve":
+        serve(args.host, args.port, use_cache=not args.no_cache, window_ms=args.window_ms)
+        return 0
+
+    if args.command == "bench":
+        if args.stub:
+            model = StubTTSModel()
+        elif args.model:
+            model = load_silero_model(args.model)
+        else:
+            model = model_manager.get()
+        speakers = sorted(SPEAKERS_INFO) if args.speakers == "all" else args.speakers.split(",")
+        report = run_benchmark(
+            model,
+            speakers=speakers,
+            sample_rates=[int(sr) for sr in args.sample_rates.split(",")],
+            sizes=[int(size) for size in args.sizes.split(",")],
+            synth_chars=args.synth_chars,
+            repeat=args.repeat,
+            legacy_concat=not args.no_legacy,
+            batching=args.batching,
+        )
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"Отчёт сохранён: {args.output}")
+        return 0
+
+    if args.command == "bench-formats":
+        if args.stub:
+            model = StubTTSModel()
+        elif args.model:
+            model = load_silero_model(args.model)
+        else:
+            model = model_manager.get()
+        report = run_format_report(model, args.speaker, [int(sr) for sr in args.sample_rates.split(",")],
+                                   args.formats.split(","), args.synth_chars)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"{'частота':>8} {'формат':>7} {'битрейт':>8} {'синтез, с':>10} {'кодир., с':>10} "
+              f"{'размер, КБ':>11} {'кбит/с':>7} {'МБ/час':>7}")
+        for row in report['profiles']:
+            print(f"{row['sample_rate']:>8} {row['format']:>7} {row['bitrate']:>8} {row['synth_seconds']:>10.2f} "
+                  f"{row['encode_seconds']:>10.2f} {row['bytes'] / 1024:>11.1f} {row['kbps']:>7.1f} "
+                  f"{row['mb_per_hour']:>7.1f}")
+        print(f"Отчёт сохранён: {args.output}")
+        return 0
+
+    if args.command in ("synth", "batch"):
+        try:
+            args.sample_rate, args.formats = resolve_output_profile(
+                args.preset, args.sample_rate, args.formats.split(",") if args.formats else None)
+            if args.timings:
+                args.timings = [] if args.timings == "none" else args.timings.split(",")
+        except ValueError as e:
+            logger.error(f"❌ {e}")
+            return 1
+
+    if args.command == "batch":
+        try:
+            synthesize_directory(
+                args.folder, args.speaker,
+                jobs=args.jobs,
+                threads=args.threads,
+                recursive=not args.no_recursive,
+                sample_rate=args.sample_rate,
+                formats=args.formats,
+                timings=args.timings,
+                use_cache=not args.no_cache,
+                incremental=args.incremental,
+            )
+        except Exception as e:
+            logger.error(f"❌ {e}")
+            return 1
+        return 0
+
+    try:
+        output = synthesize_file(
+            args.file, args.speaker, args.output,
+            sample_rate=args.sample_rate,
+            workers=args.workers,
+            threads=args.threads,
+            use_cache=not args.no_cache,
+            stream=not args.no_stream,
+            resume=args.resume,
+            incremental=args.incremental,
+            profile=args.profile,
+            formats=args.formats,
+            timings=args.timings,
+        )
+    except Exception as e:
+        logger.error(f"❌ {e}")
+        return 1
+    finally:
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+    print(output)
+    return 0
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Нужно для пула процессов в собранном .exe
+    if len(sys.argv) > 1:
+        sys.exit(cli())
     try:
         main()
     except KeyboardInterrupt:
@@ -616,4 +5269,4 @@ if __name__ == "__main__":
         logger.exception("КРИТИЧЕСКАЯ ОШИБКА:")
         print(f"\n❌ КРИТИЧЕСКАЯ ОШИБКА: {e}")
         print("\nПодробности в файле text_to_vois.log")
-        input("\nНажмите Enter для выхода...")
\ No newline at end of file
+        input("\nНажмите Enter для выхода...")